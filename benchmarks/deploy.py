@@ -0,0 +1,188 @@
+'''
+Measures deploy() end to end against an in-process fake Splunk (see
+fakeSplunk.py), reporting requests per search, wall time and peak memory
+for each size of content. Each size is deployed twice: first to an
+instance without the content, creating every search, then again with
+nothing changed.
+
+Content is built in memory, so the numbers cover the deploy itself and
+not loading content from disk.
+
+Usage: python benchmarks/deploy.py [--searches 10 1000 10000]
+           [--latency 0.002] [--error-rate 0.01] [--existing 1000]
+'''
+import argparse
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+from contextlib import ExitStack
+from unittest.mock import patch
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+)
+
+import render  # noqa: E402
+import sadface  # noqa: E402
+
+from fakeSplunk import HOST, FakeSplunk  # noqa: E402
+
+SEVERITIES = ['Info', 'Low', 'Medium', 'High', 'Critical']
+ACTIONS = [
+    [{'Add to Triggered Alerts': None}],
+    [{'Add to Triggered Alerts': None}, {'OpsGenie': None}],
+    [{
+        'Send email': {
+            'To': 'soc@example.com',
+            'Priority': 'High',
+            'Include': ['Link to Alert', 'Search String', 'Inline Table']
+        }
+    }]
+]
+
+
+def config(workers, backoff):
+    return {
+        'general': {
+            'warn_unmanaged': False,
+            'remove_unmanaged': [],
+            'concurrency': workers
+        },
+        'splunk': {
+            'host': HOST,
+            'port': 8089,
+            'verify': False,
+            'username': 'admin',
+            'password': 'benchmark',
+            'retry': {'backoff': backoff}
+        }
+    }
+
+
+def content(searches, apps):
+    '''
+    Returns: list of (app, search name, config to deploy)
+    '''
+    return [
+        (
+            'app{}'.format(n % apps),
+            'Search {}'.format(n),
+            render.renderSearch('Search {}'.format(n), {
+                'description': 'Benchmark search number {}.'.format(n),
+                'search': 'index=main sourcetype=b{} | stats count'.format(n),
+                'severity': SEVERITIES[n % len(SEVERITIES)],
+                'lookback': '-1h',
+                'cron_schedule': '*/15 * * * *',
+                'actions': ACTIONS[n % len(ACTIONS)],
+                'cyber': {'tactic': 'Discovery', 'technique': 'T1046'}
+            })
+        )
+        for n in range(searches)
+    ]
+
+
+def run(fake, searches, settings, memory):
+    '''
+    Deploys the searches to the fake.
+
+    Returns: (summary, requests sent, seconds taken, peak bytes allocated)
+    '''
+    apps = sorted(set(app for app, _, _ in searches))
+    sent = fake.total()
+    peak = None
+
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+
+    with ExitStack() as stack:
+        stack.enter_context(fake.install())
+        stack.enter_context(
+            patch.object(sadface, 'loadConfig', return_value=settings)
+        )
+        stack.enter_context(patch.object(
+            sadface,
+            'selectContent',
+            return_value=(apps, searches, {}, {})
+        ))
+        summary = sadface.deploy()
+
+    elapsed = time.perf_counter() - start
+    if memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return summary, fake.total() - sent, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--searches', type=int, nargs='+', default=[10, 1000, 10000]
+    )
+    parser.add_argument('--apps', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=10)
+    parser.add_argument(
+        '--latency', type=float, default=0.002,
+        help='Seconds the fake Splunk takes to answer each request.'
+    )
+    parser.add_argument(
+        '--error-rate', type=float, default=0,
+        help='Share of requests the fake Splunk turns away with a 503.'
+    )
+    parser.add_argument(
+        '--existing', type=int, default=0,
+        help='Unmanaged searches already in each app.'
+    )
+    parser.add_argument(
+        '--backoff', type=float, default=0.01,
+        help='Seconds to back off before the first retry.'
+    )
+    parser.add_argument(
+        '--no-memory', action='store_true',
+        help="Don't trace memory, which slows the deploy."
+    )
+    args = parser.parse_args()
+
+    logging.getLogger('sad').setLevel(logging.WARNING)
+    settings = config(args.workers, args.backoff)
+
+    print('{:>8} {:<8} {:>8} {:>10} {:>9} {:>10} {:>9}'.format(
+        'searches', 'pass', 'requests', 'req/search', 'retries',
+        'seconds', 'peak MB'
+    ))
+
+    for size in args.searches:
+        searches = content(size, args.apps)
+        fake = FakeSplunk(
+            latency=args.latency,
+            errorRate=args.error_rate,
+            searches={
+                'app{}'.format(n): args.existing for n in range(args.apps)
+            }
+        )
+
+        for label in ('initial', 'repeat'):
+            summary, sent, elapsed, peak = run(
+                fake,
+                searches,
+                settings,
+                not args.no_memory
+            )
+            print('{:>8} {:<8} {:>8} {:>10.2f} {:>9} {:>10.3f} {:>9}'.format(
+                size,
+                label,
+                sent,
+                sent / size,
+                summary['retries'],
+                elapsed,
+                '-' if peak is None else '{:.1f}'.format(peak / 2 ** 20)
+            ))
+
+
+if __name__ == '__main__':
+    main()
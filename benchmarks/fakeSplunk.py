@@ -0,0 +1,213 @@
+'''
+An in-process stand-in for the Splunk REST endpoints SADFACE calls, for
+benchmarking deploys without a Splunk instance.
+
+Requests to the fake's host are answered in place of the network, beneath
+SplunkClient's retry adapter, so logins, retries and throttling all run
+as they would against Splunk. Each request can be slowed by a fixed
+latency, and a share of them turned away as if Splunk were overloaded.
+'''
+import io
+import json
+import random
+import re
+import threading
+import time
+
+from collections import Counter
+from unittest.mock import patch
+from urllib.parse import parse_qs, parse_qsl, unquote, urlsplit
+
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+HOST = 'splunk.fake'
+LOGIN_PATH = '/services/auth/login'
+SERVER_INFO_PATH = '/services/server/info'
+INVENTORY_PATH = '/servicesNS/-/-/saved/searches'
+SEARCH_PREFIX = '/servicesNS/admin/'
+SEARCH_SUFFIX = '/saved/searches'
+SESSION_KEY = 'fake-session-key'
+# The only search filter SADFACE sends: the apps whose searches to list.
+APP_FILTER = re.compile(r'eai:acl\.app="([^"]*)"')
+
+
+class FakeSplunk(object):
+    '''
+    Saved searches held in memory, by app, served over a fake REST API.
+
+    latency: seconds each request takes to answer
+    errorRate: share of requests, from 0 to 1, answered with a 503
+    searches: dict of app to number of existing searches to start with,
+              for an instance of a given size
+    '''
+
+    def __init__(self, latency=0, errorRate=0, searches=None, seed=0):
+        self.latency = latency
+        self.errorRate = errorRate
+        self.requests = Counter()
+        self.searches = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._clock = 0
+
+        for app, count in (searches or {}).items():
+            for n in range(count):
+                self._store(app, 'Existing {}'.format(n), {
+                    'search': 'index=main',
+                    'is_scheduled': '1'
+                })
+
+    def install(self):
+        '''
+        Returns: context manager that routes requests for the fake's host
+                 to it, rather than over the network
+        '''
+        fake = self
+        send = HTTPAdapter.send
+
+        def fakeSend(adapter, request, **kwargs):
+            if urlsplit(request.url).hostname != HOST:
+                return send(adapter, request, **kwargs)
+            return fake.handle(request)
+
+        return patch.object(HTTPAdapter, 'send', fakeSend)
+
+    def total(self):
+        '''
+        Returns: number of requests answered, including errors
+        '''
+        return sum(self.requests.values())
+
+    def _store(self, app, name, content):
+        self._clock += 1
+        self.searches.setdefault(app, {})[name] = {
+            'name': name,
+            'updated': str(self._clock),
+            'acl': {'app': app, 'sharing': 'app', 'owner': 'admin'},
+            'content': content
+        }
+        return self.searches[app][name]
+
+    def _response(self, request, status, body=None, headers=None):
+        r = Response()
+        r.request = request
+        r.url = request.url
+        r.status_code = status
+        r.headers = CaseInsensitiveDict(headers or {})
+        r.raw = io.BytesIO()
+        r._content = json.dumps(body or {}).encode('utf-8')
+        return r
+
+    def _error(self, request, status, text):
+        return self._response(request, status, {
+            'messages': [{'type': 'ERROR', 'text': text}]
+        })
+
+    def _route(self, method, path):
+        '''
+        Returns: (kind of request, app, search name) for a request path
+        '''
+        if path == LOGIN_PATH:
+            return 'login', None, None
+        if path == SERVER_INFO_PATH:
+            return 'info', None, None
+        if path == INVENTORY_PATH:
+            return 'list', None, None
+        if not path.startswith(SEARCH_PREFIX):
+            return None, None, None
+
+        app, _, rest = path[len(SEARCH_PREFIX):].partition('/')
+        if not ('/' + rest).startswith(SEARCH_SUFFIX):
+            return None, None, None
+
+        name = unquote(rest[len(SEARCH_SUFFIX):].lstrip('/')) or None
+        if name is None:
+            return ('list' if method == 'GET' else 'create'), app, None
+        if method == 'POST':
+            return 'update', app, name
+        return method.lower(), app, name
+
+    def handle(self, request):
+        '''
+        Answers a request as Splunk would.
+
+        Returns: requests Response
+        '''
+        if self.latency:
+            time.sleep(self.latency)
+
+        url = urlsplit(request.url)
+        kind, app, name = self._route(request.method, url.path)
+
+        with self._lock:
+            self.requests[kind] += 1
+
+            if kind != 'login' and self._random.random() < self.errorRate:
+                self.requests['errors'] += 1
+                return self._error(request, 503, 'Too many requests')
+
+            if kind is None:
+                return self._error(request, 404, 'Not found')
+            if kind == 'login':
+                return self._response(request, 200, {
+                    'sessionKey': SESSION_KEY
+                })
+            if request.headers.get('Authorization') is None:
+                return self._error(request, 401, 'Not authenticated')
+            if kind == 'info':
+                return self._response(request, 200, {'entry': [{
+                    'content': {'serverName': HOST, 'version': 'fake'}
+                }]})
+            if kind == 'list':
+                return self._list(request, app, parse_qs(url.query))
+
+            return self._change(request, kind, app, name)
+
+    def _list(self, request, app, query):
+        if app is None:
+            apps = APP_FILTER.findall(query.get('search', [''])[0])
+            entries = [
+                entry for owner, searches in self.searches.items()
+                if not apps or owner in apps
+                for entry in searches.values()
+            ]
+        else:
+            entries = list(self.searches.get(app, {}).values())
+
+        offset = int(query.get('offset', ['0'])[0])
+        count = int(query.get('count', ['30'])[0])
+
+        return self._response(request, 200, {
+            'entry': entries[offset:offset + count],
+            'paging': {'total': len(entries), 'offset': offset}
+        })
+
+    def _change(self, request, kind, app, name):
+        searches = self.searches.get(app, {})
+        body = request.body or ''
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        fields = dict(parse_qsl(body))
+
+        if kind == 'create':
+            name = fields.pop('name')
+            if name in searches:
+                return self._error(request, 409, 'Already exists')
+            entry = self._store(app, name, fields)
+            return self._response(request, 201, {'entry': [entry]})
+
+        if name not in searches:
+            return self._error(request, 404, 'Not found')
+
+        if kind == 'get':
+            return self._response(request, 200, {'entry': [searches[name]]})
+        if kind == 'delete':
+            del searches[name]
+            return self._response(request, 200)
+
+        content = dict(searches[name]['content'])
+        content.update(fields)
+        entry = self._store(app, name, content)
+        return self._response(request, 200, {'entry': [entry]})
@@ -0,0 +1,185 @@
+'''
+Generates a synthetic content corpus, laid out as content/<app>/searches/
+*.yaml, for benchmarking SADFACE at sizes beyond any real content repo.
+Searches vary in severity, schedule, lookback, actions and cyber blocks,
+and some share the app's action profiles. The same seed always gives the
+same corpus.
+
+Usage: python benchmarks/generate.py OUTPUT [--searches 10000] [--apps 10]
+           [--per-file 50] [--seed 0]
+'''
+import argparse
+import os
+import random
+
+import yaml
+
+SEVERITIES = ['Info', 'Low', 'Medium', 'High', 'Critical']
+LOOKBACKS = ['-15m', '-1h', '-4h@h', '-24h', '-7d@d']
+CRON_SCHEDULES = [
+    '*/5 * * * *',
+    '*/15 * * * *',
+    '0 * * * *',
+    '30 */4 * * *',
+    '0 23 * * *',
+    '0 9 1 * *'
+]
+TACTICS = [
+    'Reconnaissance', 'Resource Development', 'Initial Access', 'Execution',
+    'Persistence', 'Privilege Escalation', 'Defense Evasion',
+    'Credential Access', 'Discovery', 'Lateral Movement', 'Collection',
+    'Command and Control', 'Exfiltration', 'Impact'
+]
+INCLUDES = [
+    'Link to Alert', 'Link to Results', 'Search String', 'Inline Table',
+    'Inline Raw', 'Inline CSV', 'Trigger Condition', 'Attach CSV',
+    'Trigger Time', 'Attach PDF', 'Allow Empty Attachment'
+]
+PRIORITIES = ['Highest', 'High', 'Normal', 'Low', 'Lowest']
+SOURCETYPES = [
+    'access_combined', 'linux_secure', 'WinEventLog:Security',
+    'aws:cloudtrail', 'pan:traffic', 'o365:management:activity'
+]
+PROFILES = ['Page on call', 'Notify SOC', 'Track only']
+
+
+def email(rng):
+    return {
+        'Send email': {
+            'To': 'team{}@example.com'.format(rng.randrange(20)),
+            'Priority': rng.choice(PRIORITIES),
+            'Subject': 'Alert: $name$',
+            'Message': 'The alert $name$ has fired.',
+            'Include': rng.sample(INCLUDES, rng.randint(1, 5)),
+            'Type': rng.choice(['HTML', 'Plain'])
+        }
+    }
+
+
+def actions(rng):
+    '''
+    Returns: a random, valid list of alert actions
+    '''
+    chosen = []
+    if rng.random() < 0.8:
+        chosen.append({'Add to Triggered Alerts': None})
+    if rng.random() < 0.4:
+        chosen.append({'OpsGenie': None})
+    if rng.random() < 0.5 or not chosen:
+        chosen.append(email(rng))
+    return chosen
+
+
+def profiles(rng):
+    '''
+    Returns: dict of action profile name to actions, for an actions.yaml
+    '''
+    return {name: actions(rng) for name in PROFILES}
+
+
+def search(rng, n, profileShare):
+    '''
+    Returns: (search name, a random, valid search definition)
+    '''
+    sourcetype = rng.choice(SOURCETYPES)
+    definition = {
+        'description': 'Synthetic search {} over {}.'.format(n, sourcetype),
+        'disabled': rng.random() < 0.1,
+        'lookback': rng.choice(LOOKBACKS),
+        'search': (
+            'index=main sourcetype="{}" user!="svc_{}" '
+            '| stats count by host, user | where count > {}'.format(
+                sourcetype,
+                n,
+                rng.randint(1, 100)
+            )
+        ),
+        'cron_schedule': rng.choice(CRON_SCHEDULES),
+        'severity': rng.choice(SEVERITIES)
+    }
+
+    if rng.random() < profileShare:
+        definition['action_profile'] = rng.choice(PROFILES)
+    else:
+        definition['actions'] = actions(rng)
+
+    if rng.random() < 0.7:
+        definition['cyber'] = {
+            'tactic': rng.choice(TACTICS),
+            'technique': 'T{:04d}'.format(rng.randint(1000, 1600))
+        }
+
+    return 'Synthetic Search {}'.format(n), definition
+
+
+def writeYaml(path, data):
+    with open(path, 'w') as f:
+        yaml.safe_dump(data, f, sort_keys=False, default_flow_style=False)
+
+
+def writeCorpus(output, searches, apps=10, perFile=50, profileShare=0.3,
+                seed=0):
+    '''
+    Writes a corpus of searches, spread evenly across apps and files, with
+    an actions.yaml of profiles in each app.
+
+    Returns: list of search files written
+    '''
+    rng = random.Random(seed)
+    files = []
+    perApp = [searches // apps + (n < searches % apps) for n in range(apps)]
+    count = 0
+
+    for a, total in enumerate(perApp):
+        app = os.path.join(output, 'app{:03d}'.format(a))
+        os.makedirs(os.path.join(app, 'searches'), exist_ok=True)
+        writeYaml(os.path.join(app, 'actions.yaml'), profiles(rng))
+
+        for start in range(0, total, perFile):
+            content = dict(
+                search(rng, count + n, profileShare)
+                for n in range(min(perFile, total - start))
+            )
+            count += len(content)
+
+            path = os.path.join(
+                app,
+                'searches',
+                'searches{:04d}.yaml'.format(start // perFile)
+            )
+            writeYaml(path, content)
+            files.append(path)
+
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('output', help='Directory to write content to.')
+    parser.add_argument('--searches', type=int, default=10000)
+    parser.add_argument('--apps', type=int, default=10)
+    parser.add_argument('--per-file', type=int, default=50)
+    parser.add_argument(
+        '--profile-share', type=float, default=0.3,
+        help='Share of searches using an action profile.'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    files = writeCorpus(
+        args.output,
+        args.searches,
+        args.apps,
+        args.per_file,
+        args.profile_share,
+        args.seed
+    )
+    print('Wrote {} searches in {} files to {}'.format(
+        args.searches,
+        len(files),
+        args.output
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+'''
+Measures each offline stage of the deploy pipeline on its own, with no
+Splunk involved: parsing YAML, validating searches against the schema,
+rendering the cyber eval into each search, and building the action.*
+fields and full REST payload. Shows where non-network time goes as
+content grows.
+
+Content is generated for each size (see generate.py), unless a content
+directory is given.
+
+Usage: python benchmarks/pipeline.py [--searches 1000 10000]
+           [--content DIR]
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+)
+
+import loader  # noqa: E402
+import render  # noqa: E402
+import validator  # noqa: E402
+import yaml  # noqa: E402
+
+from generate import writeCorpus  # noqa: E402
+from splunkClient import SplunkClient  # noqa: E402
+
+
+def timed(function, items):
+    '''
+    Returns: (list of results of the function for each item, seconds taken)
+    '''
+    start = time.perf_counter()
+    results = [function(item) for item in items]
+    return results, time.perf_counter() - start
+
+
+def parseFile(file):
+    with open(file) as f:
+        return yaml.load(f, Loader=loader.YamlLoader)
+
+
+def validateSearch(search):
+    app, file, searchname, definition = search
+    validated = validator.getValidSearch({searchname: definition})
+    return app, file, searchname, validated[searchname]
+
+
+def renderSearch(search):
+    _, _, searchname, definition = search
+    return render.renderSearch(searchname, definition)
+
+
+def mapActions(searchconfig):
+    return SplunkClient._mapActions(
+        searchconfig['actions'],
+        searchconfig.get('action_profile')
+    )
+
+
+def stages(contentDir):
+    '''
+    Runs each stage over all the content in a directory, in turn.
+
+    Returns: (number of searches, list of (stage, seconds taken))
+    '''
+    loader.CONTENT_DIR = contentDir
+    apps = loader.listApps()
+    files = loader.contentFiles(apps)
+    results = []
+
+    parsed, elapsed = timed(parseFile, [file for _, file in files])
+    results.append(('yaml', elapsed))
+
+    searches = [
+        (app, file, searchname, definition)
+        for (app, file), source in zip(files, parsed)
+        for searchname, definition in source.items()
+    ]
+
+    validator.getValidator.cache_clear()
+    validated, elapsed = timed(validateSearch, searches)
+    results.append(('validate', elapsed))
+
+    # Profiles are resolved as by loadContent, outside of any stage.
+    profiles = {app: loader.loadProfiles(app)[0] for app in apps}
+    for app, file, searchname, definition in validated:
+        loader._useProfile(file, searchname, definition, profiles[app])
+
+    render.renderSpl.cache_clear()
+    rendered, elapsed = timed(renderSearch, validated)
+    results.append(('render', elapsed))
+    _, elapsed = timed(renderSearch, validated)
+    results.append(('render (cached)', elapsed))
+
+    SplunkClient._renderedProfiles.clear()
+    _, elapsed = timed(mapActions, rendered)
+    results.append(('actions', elapsed))
+
+    SplunkClient._renderedProfiles.clear()
+    _, elapsed = timed(SplunkClient.renderPayload, rendered)
+    results.append(('payload', elapsed))
+
+    return len(searches), results
+
+
+def report(searches, results):
+    total = sum(elapsed for _, elapsed in results)
+
+    for stage, elapsed in results:
+        print('{:>8} {:<16} {:>9.3f}s {:>10.1f}us/search {:>5.1f}%'.format(
+            searches,
+            stage,
+            elapsed,
+            elapsed / searches * 1e6,
+            elapsed / total * 100
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--searches', type=int, nargs='+', default=[1000, 10000]
+    )
+    parser.add_argument('--apps', type=int, default=10)
+    parser.add_argument('--per-file', type=int, default=50)
+    parser.add_argument(
+        '--content',
+        help='Measure the content in this directory, rather than '
+             'generating it.'
+    )
+    args = parser.parse_args()
+
+    if args.content:
+        report(*stages(args.content))
+        return
+
+    for size in args.searches:
+        with tempfile.TemporaryDirectory() as output:
+            writeCorpus(output, size, args.apps, args.per_file)
+            report(*stages(output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+'''
+Measures the per-search cost of validating content against the search
+schema. Compares the original approach (benedict schema and a new
+validator per file), a plain dict validator per file, and the validator
+cached once per process.
+
+Usage: python benchmarks/validation.py [--searches 10000]
+'''
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+)
+
+import validator  # noqa: E402
+
+from benedict import benedict  # noqa: E402
+from cerberus import Validator  # noqa: E402
+
+SEARCH = {
+    'description': 'Benchmark search used to time validation.',
+    'search': 'index=main sourcetype=access_combined | stats count by host',
+    'severity': 'High',
+    'disabled': False,
+    'lookback': '-24h@h',
+    'cron_schedule': '*/15 * * * *',
+    'actions': [
+        {'Add to Triggered Alerts': None},
+        {
+            'Send email': {
+                'To': 'soc@example.com',
+                'Priority': 'High',
+                'Include': ['Link to Alert', 'Search String']
+            }
+        }
+    ],
+    'cyber': {
+        'tactic': 'Discovery',
+        'technique': 'T1046'
+    }
+}
+
+
+def validateOriginal(config):
+    schema = benedict.from_json(validator.SEARCH_SCHEMA)
+    v = Validator(schema, purge_unknown=True)
+    for searchname, search in config.items():
+        v.validate(search)
+
+
+def validatePerFile(config):
+    validator.getValidator.cache_clear()
+    validator.getValidSearch(config)
+
+
+MODES = (
+    ('original', validateOriginal),
+    ('per file', validatePerFile),
+    ('cached', validator.getValidSearch)
+)
+
+
+def run(searches, validate):
+    '''
+    Validates `searches` single-search files with the given function.
+
+    Returns: seconds taken
+    '''
+    validator.getValidator.cache_clear()
+    start = time.perf_counter()
+
+    for n in range(searches):
+        validate({'Search {}'.format(n): dict(SEARCH)})
+
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--searches', type=int, default=10000)
+    args = parser.parse_args()
+
+    for label, validate in MODES:
+        elapsed = run(args.searches, validate)
+        print('{:<10} {:>8.3f}s total {:>8.1f}us/search'.format(
+            label,
+            elapsed,
+            elapsed / args.searches * 1e6
+        ))
+
+
+if __name__ == '__main__':
+    main()
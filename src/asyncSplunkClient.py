@@ -0,0 +1,488 @@
+import aiohttp
+import asyncio
+import json
+
+from exceptions import SplunkUpdateFailed, SplunkGetFailed
+from exceptions import SplunkConnectFailed, SplunkValidateFailed
+from exceptions import DeadlineExceeded
+
+from deadline import Deadline
+from splunkClient import SplunkClient, SEARCH_API, DEFAULT_POOL, LOGIN_API
+from splunkClient import SERVER_INFO_API, DEFAULT_TIMEOUT, isIdempotent
+from throttle import AsyncAdaptiveLimiter, RetryPolicy
+from splunkClient import PAGE_SIZE, INDEX_FIELDS, NAME_FIELDS
+
+
+class AsyncSplunkClient(SplunkClient):
+    '''
+    asyncio counterpart to SplunkClient. Payload rendering and validation
+    rules are shared, but every call to Splunk is a coroutine.
+
+    Create with the connect() coroutine rather than directly, and close()
+    the client once finished with it.
+    '''
+
+    def __init__(self, host, port, username=None, password=None,
+                 verify=True, pool=None, token=None, retry=None,
+                 timeout=None):
+        self._host = host
+        self._port = port
+        self._creds = (username, password)
+        self._token = token
+        self._baseUrl = 'https://{}:{}'.format(host, port)
+        self._verify = verify
+        self._pool = pool
+        self._retry = retry
+        self._timeout = timeout or DEFAULT_TIMEOUT
+        self._deadline = Deadline()
+        self._session = None
+        self._authorization = None
+        self._authLock = None
+
+    @classmethod
+    async def connect(cls, *args, deadline=None, **kwargs):
+        client = cls(*args, **kwargs)
+        client._session = client._createSession(client._pool, client._retry)
+        client._authLock = asyncio.Lock()
+        # Bound logging in by the run's deadline too.
+        if deadline is not None:
+            client.setDeadline(deadline)
+        try:
+            await client._authenticate()
+            await client._testConnection()
+        except (SplunkConnectFailed, DeadlineExceeded):
+            await client.close()
+            raise
+        return client
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    def _createSession(self, pool, retry=None):
+        '''
+        Creates a pooled HTTP session shared by all calls to Splunk, so
+        that TCP connections and their TLS sessions are reused. Must be
+        called from the event loop the client will be used in.
+        '''
+        poolConfig = dict(DEFAULT_POOL)
+        poolConfig.update(pool or {})
+
+        self._limiter = AsyncAdaptiveLimiter(poolConfig['size'])
+        self._retryPolicy = RetryPolicy(**(retry or {}))
+
+        connector = aiohttp.TCPConnector(
+            limit=poolConfig['size'],
+            force_close=not poolConfig['keep_alive'],
+            ssl=None if self._verify else False
+        )
+
+        return aiohttp.ClientSession(connector=connector)
+
+    async def _login(self):
+        try:
+            status, text = await self._send(
+                'POST',
+                '{}{}'.format(self._baseUrl, LOGIN_API),
+                data={
+                    'username': self._creds[0],
+                    'password': self._creds[1],
+                    'output_mode': 'json'
+                }
+            )
+        except aiohttp.ClientError as e:
+            raise SplunkConnectFailed(
+                'Could not log in to Splunk! {}'.format(repr(e))
+            )
+
+        return self._sessionKey(status, text)
+
+    async def _authenticate(self):
+        if self._token:
+            self._authorization = 'Bearer {}'.format(self._token)
+        else:
+            self._authorization = 'Splunk {}'.format(await self._login())
+
+    def setDeadline(self, deadline):
+        self._deadline = deadline
+
+    async def _sendOnce(self, method, url, headers, **kwargs):
+        '''
+        Returns: (HTTP status, response body, Retry-After header, number
+            the limiter gave the request)
+        '''
+        timeout = aiohttp.ClientTimeout(
+            total=self._deadline.timeout(self._timeout)
+        )
+
+        try:
+            async with self._limiter as sent:
+                async with self._session.request(
+                    method,
+                    url,
+                    headers=headers,
+                    timeout=timeout,
+                    **kwargs
+                ) as r:
+                    return (
+                        r.status,
+                        await r.text(),
+                        r.headers.get('Retry-After'),
+                        sent
+                    )
+        except asyncio.TimeoutError:
+            if self._deadline.expired():
+                raise DeadlineExceeded(
+                    'Deadline reached waiting on {}!'.format(url)
+                )
+            raise
+
+    async def _send(self, method, url, **kwargs):
+        '''
+        Sends a request to Splunk, retrying while Splunk is too busy to
+        answer, within the bounds of the adaptive limiter and the deadline.
+
+        Returns: (HTTP status, response body)
+        '''
+        headers = {}
+        if self._authorization:
+            headers['Authorization'] = self._authorization
+
+        idempotent = isIdempotent(method, url)
+        attempt = 0
+
+        while True:
+            status, text, retryAfter, sent = await self._sendOnce(
+                method,
+                url,
+                headers,
+                **kwargs
+            )
+
+            retrying = self._retryPolicy.shouldRetry(
+                status,
+                attempt,
+                idempotent
+            )
+            if retrying:
+                delay = self._retryPolicy.delay(attempt, retryAfter)
+                retrying = self._deadline.allows(delay)
+
+            await self._limiter.record(status, retrying, sent)
+
+            if not retrying:
+                return status, text
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _request(self, method, url, **kwargs):
+        '''
+        Makes a call to Splunk, logging in again and retrying once if
+        Splunk rejects an expired session key.
+
+        Returns: (HTTP status, response body)
+        '''
+        stale = self._authorization
+        status, text = await self._send(method, url, **kwargs)
+
+        if status == 401 and not self._token:
+            async with self._authLock:
+                # Another call may have already logged in again.
+                if self._authorization == stale:
+                    await self._authenticate()
+            status, text = await self._send(method, url, **kwargs)
+
+        return status, text
+
+    async def getServerInfo(self):
+        '''
+        Fetch basic details of the Splunk server.
+
+        Returns: dict of server details, e.g. serverName and version
+        '''
+        status, text = await self._request(
+            'GET',
+            '{}{}'.format(self._baseUrl, SERVER_INFO_API),
+            params={'output_mode': 'json'}
+        )
+
+        if status != 200:
+            details = json.loads(text)['messages'][0]
+            raise SplunkGetFailed('{}: {}'.format(
+                details['type'],
+                details['text']
+            ))
+
+        return json.loads(text)['entry'][0]['content']
+
+    async def _testConnection(self):
+        try:
+            await self.getServerInfo()
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            raise SplunkConnectFailed('Error: {} '.format(
+                getattr(e, 'message', repr(e))
+            ))
+
+    async def _searchExists(self, app, searchName):
+        url = '{}{}/{}'.format(
+            self._baseUrl,
+            SEARCH_API.format(app=app),
+            searchName
+        )
+        status, _ = await self._request('GET', url)
+
+        return True if status == 200 else False
+
+    async def deploySearch(self, app, searchName, searchConfig, index=None):
+        '''
+        Updates a Splunk saved search, creating if it does not already exist.
+        '''
+        return await self.deployPayload(
+            app,
+            searchName,
+            self.renderPayload(searchConfig),
+            index=index
+        )
+
+    async def deployPayload(self, app, searchName, payload, index=None):
+        '''
+        Sends an already rendered payload (see renderPayload) to Splunk,
+        creating the search if it does not already exist.
+        '''
+        payload = dict(payload)
+        url = '{}{}'.format(self._baseUrl, SEARCH_API.format(app=app))
+
+        if index is not None:
+            exists = searchName in index
+        else:
+            exists = await self._searchExists(app, searchName)
+
+        if exists:
+            url = '{}/{}'.format(url, searchName)
+        else:
+            payload['name'] = searchName
+
+        url = url + '?output_mode=json'
+
+        # Fields without a value are left out, as requests does for the
+        # synchronous client, rather than sent as 'None'.
+        status, text = await self._request(
+            'POST',
+            url,
+            data={k: str(v) for k, v in payload.items() if v is not None}
+        )
+
+        if status == 200 or status == 201:
+            validated, error = await self._validateSearch(
+                app,
+                searchName,
+                payload,
+                response=text
+            )
+            if not validated:
+                raise SplunkValidateFailed(
+                    'Search seemed to deploy, but validation failed! \n'
+                    'Error message: {}\n'
+                    'Check Splunk and fix as required.'.format(error)
+                )
+            return status
+
+        else:
+            details = json.loads(text)['messages'][0]
+            raise SplunkUpdateFailed('{}: {}'.format(
+                details['type'],
+                details['text']
+            ))
+
+    async def _validateSearch(self, app, searchName, searchConfig,
+                              response=None):
+        '''
+        Validates a Splunk saved search exists matching the specified config.
+
+        If the body of Splunk's response to the deploy is given, and holds
+        the search's content, that is validated directly. Otherwise the
+        search is fetched from Splunk.
+
+        Returns: True if search on Splunk matches the expected config
+                 False if not.
+        '''
+        entries = self._responseEntries(response)
+
+        if not entries:
+            url = '{}{}/{}?output_mode=json'.format(
+                self._baseUrl,
+                SEARCH_API.format(app=app),
+                searchName
+            )
+
+            status, text = await self._request('GET', url)
+
+            if status == 404:
+                return False, 'Search does not exist!'
+
+            elif status != 200:
+                details = json.loads(text)['messages'][0]
+                raise SplunkGetFailed('{}: {}'.format(
+                    details['type'],
+                    details['text']
+                ))
+
+            entries = json.loads(text)['entry']
+
+        for search in entries:
+            if search['name'] != searchName:
+                return False, 'Search name does not match!'
+
+            return self._compareContent(
+                app,
+                searchName,
+                searchConfig,
+                search['content']
+            )
+
+    async def _searchPages(self, app, fields=None, pageSize=None,
+                           search=None):
+        url = '{}{}'.format(self._baseUrl, self._listingApi(app))
+        pageSize = pageSize or PAGE_SIZE
+        offset = 0
+
+        while offset is not None:
+            status, text = await self._request(
+                'GET',
+                url,
+                params=self._pageParams(offset, pageSize, fields, search)
+            )
+
+            if status != 200:
+                details = json.loads(text)['messages'][0]
+                raise SplunkGetFailed('{}: {}'.format(
+                    details['type'],
+                    details['text']
+                ))
+
+            entries, offset = self._nextPage(
+                json.loads(text),
+                offset,
+                pageSize
+            )
+            yield entries
+
+    async def iterSearches(self, app, fields=None, pageSize=None,
+                           search=None):
+        '''
+        Iterate over every search in a given app, fetching them from
+        Splunk a page at a time as needed.
+        '''
+        async for page in self._searchPages(
+            app,
+            fields=fields,
+            pageSize=pageSize,
+            search=search
+        ):
+            for entry in page:
+                yield entry
+
+    async def listSearches(self, app, pageSize=None):
+        '''
+        List all searches in a given app
+        '''
+        async for search in self.iterSearches(
+            app,
+            fields=NAME_FIELDS,
+            pageSize=pageSize
+        ):
+            yield search['name']
+
+    async def getSearchIndex(self, app):
+        '''
+        Fetch the current state of all searches in a given app, with only
+        the content needed to compare them against rendered payloads.
+
+        Returns: dict of search name to its Splunk entry (incl. content)
+        '''
+        index = {}
+
+        async for search in self.iterSearches(app, fields=INDEX_FIELDS):
+            index[search['name']] = search
+        return index
+
+    async def getSearch(self, app, searchName):
+        '''
+        Fetch a single search, with the same content as getSearchIndex.
+
+        Returns: the search's Splunk entry, or None if it does not exist
+        '''
+        url = '{}{}/{}'.format(
+            self._baseUrl,
+            SEARCH_API.format(app=app),
+            searchName
+        )
+        status, text = await self._request(
+            'GET',
+            url,
+            params=[('output_mode', 'json')] + [
+                ('f', field) for field in INDEX_FIELDS
+            ]
+        )
+
+        if status == 404:
+            return None
+
+        if status != 200:
+            details = json.loads(text)['messages'][0]
+            raise SplunkGetFailed('{}: {}'.format(
+                details['type'],
+                details['text']
+            ))
+
+        return json.loads(text)['entry'][0]
+
+    async def getInventory(self, apps, fields=INDEX_FIELDS):
+        '''
+        Fetch the current state of all searches in the given apps, with a
+        single listing across every app, filtered by Splunk to the given
+        apps. Given NAME_FIELDS, content is left out, as for
+        SplunkClient.getInventory.
+
+        Returns: dict of app to its search index, as from getSearchIndex
+        '''
+        inventory = {app: {} for app in apps}
+
+        if not inventory:
+            return inventory
+
+        async for search in self.iterSearches(
+            None,
+            fields=fields,
+            search=self._inventoryFilter(inventory)
+        ):
+            app = self._inventoryApp(search)
+            if app in inventory:
+                inventory[app][search['name']] = search
+        return inventory
+
+    async def deleteSearch(self, app, searchName):
+        '''
+        Delete a search in a given app
+        '''
+        url = '{}{}/{}'.format(
+            self._baseUrl,
+            SEARCH_API.format(app=app),
+            searchName
+        )
+
+        status, text = await self._request('DELETE', url)
+
+        if status != 200:
+            details = json.loads(text)['messages'][0]
+            raise SplunkUpdateFailed(
+                'Failed to delete search {} in app {}! {}: {}'.format(
+                    searchName,
+                    app,
+                    details['type'],
+                    details['text']
+                )
+            )
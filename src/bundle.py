@@ -0,0 +1,108 @@
+import json
+import logging
+
+from splunkClient import SplunkClient
+from stateStore import fingerprint
+
+LOGGER = logging.getLogger("sad")
+# Written by the compile command next to config.yaml, so that it ships
+# with the Lambda function.
+BUNDLE_FILE = 'bundle.json'
+# Bump whenever the layout of the bundle changes, so that bundles built
+# by older versions are not used.
+BUNDLE_VERSION = 1
+# Key under which a compiled search config holds its source fingerprint
+# and rendered payload.
+COMPILED = '_compiled'
+
+
+def compileSearch(searchconfig):
+    '''
+    Returns: copy of a search config to deploy, carrying its fingerprint
+             and the payload rendered for it
+    '''
+    compiled = dict(searchconfig)
+    compiled[COMPILED] = {
+        'source': fingerprint(searchconfig),
+        'payload': SplunkClient.renderPayload(searchconfig)
+    }
+    return compiled
+
+
+def compileBundle(apps, searches, path, digest=None):
+    '''
+    Writes already validated content, as from sadface.loadSearches, to a
+    single JSON artifact that can be deployed without loading any YAML.
+    The digest of the content files it was compiled from (see
+    loader.contentDigest) is kept with it, to tell when it is stale.
+
+    Returns: the number of searches written
+    '''
+    with open(path, 'w') as f:
+        json.dump(
+            {
+                'version': BUNDLE_VERSION,
+                'content': digest,
+                'apps': apps,
+                'searches': [
+                    [app, searchname, compileSearch(searchconfig)]
+                    for app, searchname, searchconfig in searches
+                ]
+            },
+            f,
+            sort_keys=True,
+            separators=(',', ':')
+        )
+
+    return len(searches)
+
+
+def loadBundle(path, digest=None):
+    '''
+    Loads compiled content, as written by compileBundle. Given the digest
+    of the content files, a bundle compiled from other content is not
+    used.
+
+    Returns: (apps, list of (app, search name, compiled search config)),
+             or None if there is no usable bundle
+    '''
+    try:
+        with open(path) as f:
+            bundle = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    if bundle.get('version') != BUNDLE_VERSION:
+        LOGGER.warning('Ignoring bundle {} from another version.'.format(
+            path
+        ))
+        return None
+
+    if digest is not None and bundle.get('content') != digest:
+        LOGGER.warning(
+            'Ignoring bundle {} as the content has changed since it was '
+            'compiled. Run compile again.'.format(path)
+        )
+        return None
+
+    return bundle['apps'], [tuple(search) for search in bundle['searches']]
+
+
+def searchSource(searchconfig):
+    '''
+    Returns: fingerprint of a search config, as recorded in deploy state
+    '''
+    compiled = searchconfig.get(COMPILED)
+    if compiled is not None:
+        return compiled['source']
+    return fingerprint(searchconfig)
+
+
+def searchPayload(splunk, searchconfig):
+    '''
+    Returns: the REST payload to deploy for a search config
+    '''
+    compiled = searchconfig.get(COMPILED)
+    if compiled is not None:
+        return compiled['payload']
+    return splunk.renderPayload(searchconfig)
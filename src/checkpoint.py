@@ -0,0 +1,94 @@
+import logging
+
+from stateStore import fingerprint
+
+LOGGER = logging.getLogger("sad")
+# Completed searches between each write of the journal. Searches completed
+# since the last write are redone if a run is killed outright.
+CHECKPOINT_INTERVAL = 50
+
+
+def contentRevision(searches):
+    '''
+    Returns: hash identifying a revision of the content to deploy, given
+             as a list of (app, search name, search config)
+    '''
+    return fingerprint(searches)
+
+
+class Checkpoint(object):
+    '''
+    Journal of the searches completed so far in deploying one revision of
+    the content, kept in a state store. A deploy cut short by a deadline,
+    timeout or outage is resumed by the next run of the same revision
+    without redoing completed searches. A journal for any other revision
+    is ignored.
+
+    Must only be marked from a single thread.
+    '''
+
+    def __init__(self, store=None, revision=None,
+                 interval=CHECKPOINT_INTERVAL):
+        self._store = store
+        self._revision = revision
+        self._interval = interval
+        self._completed = set()
+        self._pending = 0
+
+        if store is not None:
+            journal = store.load()
+            if journal.get('revision') == revision:
+                self._completed = set(journal.get('completed', []))
+
+        # Searches completed by earlier runs.
+        self.resumed = len(self._completed)
+
+    def _key(self, app, searchName):
+        return '{}/{}'.format(app, searchName)
+
+    def isCompleted(self, app, searchName):
+        return self._key(app, searchName) in self._completed
+
+    def complete(self, app, searchName):
+        '''
+        Marks a search as completed, writing the journal every interval
+        searches.
+        '''
+        self._completed.add(self._key(app, searchName))
+        self._pending += 1
+
+        if self._pending >= self._interval:
+            self.flush()
+
+    def flush(self):
+        '''
+        Writes searches completed since the last write to the journal.
+        Failing to do so only costs a resumed run some repeated work, so
+        is not fatal.
+        '''
+        if self._store is None or not self._pending:
+            return
+
+        try:
+            self._store.save({
+                'revision': self._revision,
+                'completed': sorted(self._completed)
+            })
+            self._pending = 0
+        except Exception as e:
+            LOGGER.warning('Could not write checkpoint! {}'.format(e))
+
+    def clear(self):
+        '''
+        Empties the journal, once every search in the revision is done.
+        '''
+        self._completed = set()
+        self._pending = 0
+
+        if self._store is None:
+            return
+
+        try:
+            self._store.save({})
+        except Exception as e:
+            LOGGER.warning('Could not clear checkpoint! {}'.format(e))
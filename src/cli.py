@@ -39,5 +39,30 @@ def parseArgs(commands):
         help='Disable JSON logging. Easier to read from the CLI!',
         action='store_true'
     )
+    parser.add_argument(
+        '--workers',
+        help='Number of searches to deploy in parallel. Overrides the '
+             'concurrency set in config.',
+        type=int
+    )
+    parser.add_argument(
+        '--since',
+        help='Only validate or deploy content changed since this git ref. '
+             "Use 'auto' for changes since the merge base with the "
+             "remote's default branch, as for a CI branch build.",
+        type=str
+    )
+    parser.add_argument(
+        '--deadline',
+        help='Seconds the deploy may run for. Searches not reached in '
+             'time are skipped and reported, most important first.',
+        type=float
+    )
+    parser.add_argument(
+        '--shards',
+        help='Number of shards to split the content into, each deployed by '
+             'its own worker process. Overrides the shards set in config.',
+        type=int
+    )
 
     return parser.parse_args()
@@ -0,0 +1,50 @@
+import time
+
+from exceptions import DeadlineExceeded
+
+
+class Deadline(object):
+    '''
+    A point in time by which a run must be finished, such as the end of
+    a Lambda invocation. A deadline of None never passes.
+    '''
+
+    def __init__(self, seconds=None):
+        self._end = None
+        if seconds is not None:
+            self._end = time.monotonic() + seconds
+
+    def remaining(self):
+        '''
+        Returns: seconds left before the deadline, or None if there is none
+        '''
+        if self._end is None:
+            return None
+        return max(0, self._end - time.monotonic())
+
+    def expired(self):
+        return self._end is not None and self.remaining() <= 0
+
+    def timeout(self, default):
+        '''
+        Works out how long a single request may take, so that it can't
+        run past the deadline.
+
+        Returns: seconds to allow, at most default
+        '''
+        remaining = self.remaining()
+
+        if remaining is None:
+            return default
+        if remaining <= 0:
+            raise DeadlineExceeded('Deadline reached!')
+        return min(default, remaining)
+
+    def allows(self, seconds):
+        '''
+        Returns: True if there is time to wait the given seconds before
+                 the deadline
+                 False if not.
+        '''
+        remaining = self.remaining()
+        return remaining is None or seconds < remaining
@@ -20,3 +20,15 @@ class ConfigValidateFailed(Exception):
 
 class ConfigLoadSecretsFailed(Exception):
     pass
+
+
+class GitChangesFailed(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class ShardDeployFailed(Exception):
+    pass
@@ -0,0 +1,144 @@
+import glob
+import os
+import subprocess
+import yaml
+
+from exceptions import GitChangesFailed
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+AUTO = 'auto'
+DEFAULT_BASE = 'origin/main'
+
+
+def _git(*args):
+    try:
+        result = subprocess.run(
+            ['git'] + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise GitChangesFailed('git {} failed! {}'.format(
+            ' '.join(args),
+            getattr(e, 'stderr', None) or e
+        ))
+    return result.stdout
+
+
+def baseBranch():
+    '''
+    Returns: the remote's default branch, e.g. origin/main
+    '''
+    try:
+        return _git(
+            'symbolic-ref',
+            '--short',
+            'refs/remotes/origin/HEAD'
+        ).strip()
+    except GitChangesFailed:
+        return DEFAULT_BASE
+
+
+def resolveRef(since):
+    '''
+    Resolves --since to a git ref. 'auto' means the merge base of HEAD
+    and the remote's default branch, as wanted by CI for a branch build.
+    '''
+    if since == AUTO:
+        return _git('merge-base', 'HEAD', baseBranch()).strip()
+    return since
+
+
+def _searchFile(contentPath, path):
+    '''
+    Returns: (app, path under the content dir) for a search file in git,
+             or None if the path is not a search file
+    '''
+    relative = os.path.relpath(path, contentPath)
+    parts = relative.split(os.sep)
+
+    if len(parts) != 3 or parts[0] == '..':
+        return None
+    if parts[1] != 'searches' or not parts[2].endswith('.yaml'):
+        return None
+    return parts[0], relative
+
+
+def _profileFile(contentPath, path):
+    '''
+    Returns: the app whose action profiles are held in a file in git,
+             or None if the path is not an action profile file
+    '''
+    parts = os.path.relpath(path, contentPath).split(os.sep)
+
+    if len(parts) != 2 or parts[0] == '..' or parts[1] != 'actions.yaml':
+        return None
+    return parts[0]
+
+
+def changedContent(since, contentDir='content'):
+    '''
+    Finds the search files changed between a git ref and the working
+    tree, including uncommitted and untracked files. A change to an app's
+    action profiles counts as a change to every search file in the app.
+
+    Returns: (set of apps touched,
+              set of added or modified files, as paths under contentDir,
+              dict of app to search names the changed files held at ref)
+    '''
+    ref = resolveRef(since)
+    top = _git('rev-parse', '--show-toplevel').strip()
+    # content may be a symlink, so find where git actually tracks it.
+    contentPath = os.path.relpath(os.path.realpath(contentDir), top)
+
+    changes = []
+    for line in _git(
+        'diff', '--name-status', '--no-renames', ref, '--', contentPath
+    ).splitlines():
+        status, path = line.split('\t', 1)
+        changes.append((status[0], path))
+
+    for path in _git(
+        'ls-files', '--others', '--exclude-standard', '--full-name',
+        '--', os.path.join(top, contentPath)
+    ).splitlines():
+        changes.append(('A', path))
+
+    apps = set()
+    files = set()
+    previous = {}
+
+    for status, path in changes:
+        profileApp = _profileFile(contentPath, path)
+        if profileApp is not None:
+            apps.add(profileApp)
+            files.update(glob.glob(
+                os.path.join(contentDir, profileApp, 'searches', '*.yaml')
+            ))
+            continue
+
+        searchFile = _searchFile(contentPath, path)
+        if searchFile is None:
+            continue
+
+        app, relative = searchFile
+        apps.add(app)
+
+        if status != 'D':
+            files.add(os.path.join(contentDir, relative))
+
+        if status != 'A':
+            source = yaml.load(
+                _git('show', '{}:{}'.format(ref, path)),
+                Loader=YamlLoader
+            )
+            if isinstance(source, dict):
+                previous.setdefault(app, set()).update(source)
+
+    return apps, files, previous
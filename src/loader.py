@@ -0,0 +1,260 @@
+import glob
+import hashlib
+import logging
+import os
+import validator
+import yaml
+
+from concurrent.futures import ProcessPoolExecutor
+
+from exceptions import ConfigValidateFailed
+from stateStore import fingerprint
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+LOGGER = logging.getLogger("sad")
+CONTENT_DIR = 'content'
+SEARCH_GLOB = '{}/{}/searches/*.yaml'
+# Named action profiles, shared by the searches in an app.
+PROFILE_FILE = '{}/{}/actions.yaml'
+# Below this many files, starting worker processes costs more than it saves.
+MIN_PARALLEL_FILES = 50
+
+
+def listApps():
+    return sorted(os.listdir(CONTENT_DIR))
+
+
+def contentFiles(apps):
+    '''
+    Returns: sorted list of (app, file) for every search file in the apps
+    '''
+    files = []
+    for app in apps:
+        for file in sorted(glob.glob(SEARCH_GLOB.format(CONTENT_DIR, app))):
+            files.append((app, file))
+    return files
+
+
+def contentDigest():
+    '''
+    Hashes the raw bytes of every search and action profile file, without
+    parsing any of them, so that compiled content can be checked against
+    the content it was compiled from.
+
+    Returns: hex digest of the content, or None if there is no content
+             directory
+    '''
+    try:
+        apps = listApps()
+    except FileNotFoundError:
+        return None
+
+    digest = hashlib.sha256()
+    for app in apps:
+        files = [PROFILE_FILE.format(CONTENT_DIR, app)]
+        files += [file for _, file in contentFiles([app])]
+
+        for file in files:
+            try:
+                with open(file, 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+
+            # Paths are hashed too, so that moving or renaming a file
+            # changes the digest.
+            name = os.path.relpath(file, CONTENT_DIR).encode('utf-8')
+            digest.update(name + b'\0')
+            digest.update(str(len(data)).encode('utf-8') + b'\0' + data)
+
+    return digest.hexdigest()
+
+
+def loadFile(file):
+    '''
+    Parses and validates every search in a content file.
+
+    Returns: (dict of search name to validated search, list of errors)
+    '''
+    searches = {}
+    errors = []
+
+    try:
+        with open(file) as f:
+            source = yaml.load(f, Loader=YamlLoader)
+    except (OSError, yaml.YAMLError) as e:
+        return searches, ['{}: Could not load file! {}'.format(file, e)]
+
+    if not isinstance(source, dict):
+        return searches, ['{}: No searches defined!'.format(file)]
+
+    for searchname, search in source.items():
+        if not isinstance(search, dict):
+            errors.append(
+                "{}: Search '{}' must be a mapping of its settings!".format(
+                    file,
+                    searchname
+                )
+            )
+            continue
+        try:
+            searches.update(validator.getValidSearch({searchname: search}))
+        except ConfigValidateFailed as e:
+            errors.append('{}: {}'.format(file, e))
+
+    return searches, errors
+
+
+def loadProfiles(app):
+    '''
+    Parses and validates an app's action profiles, if it has any. Each
+    profile is given a key naming it and its content, under which its
+    rendered actions are cached (see SplunkClient._mapActions).
+
+    Returns: (dict of profile name to (key, validated actions),
+              list of errors)
+    '''
+    file = PROFILE_FILE.format(CONTENT_DIR, app)
+    profiles = {}
+    errors = []
+
+    try:
+        with open(file) as f:
+            source = yaml.load(f, Loader=YamlLoader)
+    except FileNotFoundError:
+        return profiles, errors
+    except (OSError, yaml.YAMLError) as e:
+        return profiles, ['{}: Could not load file! {}'.format(file, e)]
+
+    if not isinstance(source, dict):
+        return profiles, ['{}: No action profiles defined!'.format(file)]
+
+    for name, actions in source.items():
+        try:
+            actions = validator.getValidProfile(name, actions)
+        except ConfigValidateFailed as e:
+            errors.append('{}: {}'.format(file, e))
+            continue
+        profiles[name] = (
+            '{}/{}@{}'.format(app, name, fingerprint(actions)),
+            actions
+        )
+
+    return profiles, errors
+
+
+def _useProfile(file, searchname, search, profiles):
+    '''
+    Swaps a search's action profile for the profile's actions.
+
+    Returns: error, or None if the profile was found
+    '''
+    name = search.get('action_profile')
+
+    if name is None:
+        return None
+    if name not in profiles:
+        return "{}: Search '{}' uses unknown action profile '{}'!".format(
+            file,
+            searchname,
+            name
+        )
+
+    search['action_profile'], search['actions'] = profiles[name]
+    return None
+
+
+def _loadFiles(files, workers):
+    paths = [file for _, file in files]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(paths) < MIN_PARALLEL_FILES:
+        return list(map(loadFile, paths))
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(
+                loadFile,
+                paths,
+                chunksize=max(1, len(paths) // (4 * workers))
+            ))
+    except (OSError, NotImplementedError) as e:
+        # Some platforms, such as Lambda, can't run process pools.
+        LOGGER.debug(
+            'Could not load content in parallel, falling back to '
+            'serial. {}'.format(e)
+        )
+        return list(map(loadFile, paths))
+
+
+def searchNames(apps):
+    '''
+    Parses, without validating, every search file in the apps.
+
+    Returns: dict of app to set of search names defined for it
+    '''
+    names = {app: set() for app in apps}
+
+    for app, file in contentFiles(apps):
+        with open(file) as f:
+            source = yaml.load(f, Loader=YamlLoader)
+        if isinstance(source, dict):
+            names[app].update(source)
+
+    return names
+
+
+def loadContent(apps=None, workers=None, files=None):
+    '''
+    Loads and validates all search content, across a pool of processes
+    for larger corpora. Every file is checked before any error is raised,
+    so all problems are reported at once. If a collection of files is
+    given, only those files are loaded.
+
+    Searches using an action profile have it resolved to the profile's
+    actions, shared with every other search using that profile.
+
+    Returns: list of (app, file, search name, validated search), ordered
+             by app, then file, then position in the file
+    '''
+    if apps is None:
+        apps = listApps()
+
+    files = [
+        (app, file) for app, file in contentFiles(apps)
+        if files is None or file in files
+    ]
+    content = []
+    errors = []
+    profiles = {}
+
+    for app in sorted(set(app for app, _ in files)):
+        profiles[app], profileErrors = loadProfiles(app)
+        errors.extend(profileErrors)
+
+    for (app, file), (searches, fileErrors) in zip(
+        files,
+        _loadFiles(files, workers)
+    ):
+        LOGGER.debug('Loaded {}.'.format(file))
+        errors.extend(fileErrors)
+        for searchname, search in searches.items():
+            error = _useProfile(file, searchname, search, profiles[app])
+            if error:
+                errors.append(error)
+                continue
+            content.append((app, file, searchname, search))
+
+    if errors:
+        raise ConfigValidateFailed(
+            '{} invalid search definition(s)!\n{}'.format(
+                len(errors),
+                '\n'.join(errors)
+            )
+        )
+
+    return content
@@ -0,0 +1,167 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from exceptions import DeadlineExceeded
+
+# Outcomes of each deletion in a plan.
+DELETED = 'deleted'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+class AppPlan(object):
+    '''
+    What it takes to bring one app in Splunk in line with code, worked out
+    as set differences between the searches managed by code (desired) and
+    those in Splunk (actual).
+
+    create: managed searches missing from Splunk
+    update: managed searches already in Splunk, updated if they differ
+    unmanaged: searches in Splunk that code doesn't know about, other
+               than those whose definitions were removed from code if
+               they are being deleted
+    delete: searches in Splunk to delete, being every search code doesn't
+            know about (including those whose definitions were removed
+            from code) if the app is configured to remove them, and
+            none otherwise
+    '''
+
+    def __init__(self, desired, actual, removed=(), removeUnmanaged=False):
+        desired = set(desired)
+        actual = set(actual)
+        extra = actual - desired
+
+        self.create = desired - actual
+        self.update = desired & actual
+
+        if removeUnmanaged:
+            self.unmanaged = extra - set(removed)
+            self.delete = extra
+        else:
+            self.unmanaged = extra
+            self.delete = set()
+
+
+def byApp(searches):
+    '''
+    Returns: dict of app to set of search names, from (app, search name)
+    '''
+    apps = {}
+    for app, searchName in searches:
+        apps.setdefault(app, set()).add(searchName)
+    return apps
+
+
+def plan(managed, indexes, removed=None, removeUnmanaged=()):
+    '''
+    Plans every app in Splunk's inventory, given the (app, search name)
+    pairs managed by code, a dict of app to searches removed from code,
+    and the apps to remove unmanaged searches from.
+
+    Returns: dict of app to AppPlan
+    '''
+    desired = byApp(managed)
+    removed = removed or {}
+
+    return {
+        app: AppPlan(
+            desired.get(app, ()),
+            indexes[app],
+            removed.get(app, ()),
+            app in removeUnmanaged
+        )
+        for app in indexes
+    }
+
+
+def deletions(plans):
+    '''
+    Returns: sorted list of (app, search name) to delete across every plan
+    '''
+    return sorted(
+        (app, searchName)
+        for app, appPlan in plans.items()
+        for searchName in appPlan.delete
+    )
+
+
+def outcome(app, searchName, result, error=None):
+    '''
+    Returns: dict describing what happened to one search in a plan
+    '''
+    return {
+        'app': app,
+        'search': searchName,
+        'action': 'delete',
+        'outcome': result,
+        'error': None if error is None else repr(error)
+    }
+
+
+def deleteSearch(splunk, app, searchName, deadline):
+    '''
+    Deletes a search, unless the deadline has passed.
+
+    Returns: the outcome of the deletion
+    '''
+    if deadline.expired():
+        return outcome(app, searchName, SKIPPED)
+
+    try:
+        splunk.deleteSearch(app=app, searchName=searchName)
+    except DeadlineExceeded:
+        return outcome(app, searchName, SKIPPED)
+    except Exception as e:
+        return outcome(app, searchName, FAILED, e)
+
+    return outcome(app, searchName, DELETED)
+
+
+def executeDeletions(splunk, searches, workers, deadline):
+    '''
+    Deletes searches, given as (app, search name), across a pool of at most
+    workers threads. One search failing to delete doesn't stop the rest.
+
+    Returns: list of outcomes, in the order the searches were given
+    '''
+    if not searches:
+        return []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(
+            lambda search: deleteSearch(splunk, *search, deadline),
+            searches
+        ))
+
+
+async def deleteSearchAsync(splunk, app, searchName, deadline, limit):
+    '''
+    Coroutine version of deleteSearch, for use with AsyncSplunkClient.
+    '''
+    if deadline.expired():
+        return outcome(app, searchName, SKIPPED)
+
+    try:
+        async with limit:
+            await splunk.deleteSearch(app=app, searchName=searchName)
+    except DeadlineExceeded:
+        return outcome(app, searchName, SKIPPED)
+    except Exception as e:
+        return outcome(app, searchName, FAILED, e)
+
+    return outcome(app, searchName, DELETED)
+
+
+async def executeDeletionsAsync(splunk, searches, limit, deadline):
+    '''
+    Coroutine version of executeDeletions, with at most `limit` deletions
+    in flight at once.
+
+    Returns: list of outcomes, in the order the searches were given
+    '''
+    # Imported here so the sync deploy doesn't pay for asyncio.
+    import asyncio
+
+    return list(await asyncio.gather(*[
+        deleteSearchAsync(splunk, app, searchName, deadline, limit)
+        for app, searchName in searches
+    ]))
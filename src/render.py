@@ -0,0 +1,77 @@
+import re
+
+from functools import lru_cache
+
+# Field names that can be used in SPL without quoting.
+FIELD_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+# Rendered SPL kept per process, so warm Lambda invocations and repeated
+# runs don't rebuild the same searches.
+CACHE_SIZE = 4096
+
+
+def quoteValue(value):
+    '''
+    Returns: value as an SPL string literal, in double quotes
+    '''
+    return '"{}"'.format(
+        str(value).replace('\\', '\\\\').replace('"', '\\"')
+    )
+
+
+def quoteField(name):
+    '''
+    Returns: name as an SPL field name, in single quotes if need be
+    '''
+    if FIELD_NAME.match(name):
+        return name
+    return "'{}'".format(name.replace('\\', '\\\\').replace("'", "\\'"))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def renderSpl(search, fields=()):
+    '''
+    Appends a single eval to a search, setting each of the given fields.
+
+    Returns: the SPL to deploy
+    '''
+    if not fields:
+        return search
+
+    return '{} | eval {}'.format(search, ', '.join(
+        '{}={}'.format(quoteField(name), quoteValue(value))
+        for name, value in fields
+    ))
+
+
+def cyberFields(searchname, details):
+    '''
+    Returns: tuple of (field, value) to set on a search's results, mapping
+             it to Mitre ATT&CK, or an empty tuple if it has no cyber section
+    '''
+    if 'cyber' not in details:
+        return ()
+
+    return tuple(details['cyber'].items()) + (
+        ('Detection', searchname),
+        ('Severity', details['severity'])
+    )
+
+
+def renderSearch(searchname, details):
+    '''
+    Builds the config to deploy for a validated search definition, leaving
+    the definition itself untouched.
+
+    Returns: config to deploy
+    '''
+    # We only support alerts, not reports
+    searchconfig = {'is_scheduled': 'True'}
+    searchconfig.update(
+        (key, value) for key, value in details.items() if key != 'cyber'
+    )
+    searchconfig['search'] = renderSpl(
+        details['search'],
+        cyberFields(searchname, details)
+    )
+
+    return searchconfig
@@ -1,36 +1,113 @@
-import boto3
+import bundle
 import cli
-import glob
+import gitChanges
 import json
-import json_logging
+import loader
 import logging
 import os
+import reconcile
+import render
 import sys
+import time
 import validator
 
-from exceptions import ConfigLoadSecretsFailed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import as_completed
+from itertools import chain
 
-from splunkClient import SplunkClient
+from checkpoint import Checkpoint, contentRevision
+from deadline import Deadline
+from exceptions import ConfigLoadSecretsFailed, DeadlineExceeded
+from exceptions import ShardDeployFailed
 
-from benedict import benedict
+from shards import DEFAULT_SHARDS, invokeShard, partition
+from splunkClient import NAME_FIELDS, SplunkClient
+from stateStore import DeployState, fingerprint, getStateStore
 
+# Heavier dependencies (boto3, benedict, json_logging, asyncio and
+# aiohttp) are imported where they are used, so that Lambda cold starts
+# only pay for the code paths they run.
 
 LOGGER = logging.getLogger("sad")
 LOGGER.setLevel(logging.INFO)
 LOGGER.addHandler(logging.StreamHandler(sys.stdout))
-VALID_COMMANDS = ['deploy', 'validate']
+VALID_COMMANDS = ['deploy', 'validate', 'compile']
 CONFIG_FILE = 'config.yaml'
+EMPTY_SUMMARY = {
+    'unchanged': 0,
+    'updated': 0,
+    'created': 0,
+    'deleted': 0,
+    'retries': 0,
+    'throttled': 0,
+    'skipped': 0,
+    'resumed': 0
+}
+# Up to this many searches whose content is needed are fetched one at a
+# time; beyond that, the inventory is listed again with content.
+MAX_CONTENT_FETCHES = 50
+# Seconds of a Lambda invocation kept back to report on a deploy cut short.
+LAMBDA_DEADLINE_MARGIN = 2
+# Seconds before secrets are fetched again in a warm Lambda container.
+DEFAULT_SECRETS_TTL = 900
+# Config, secrets and the Splunk client, kept between invocations of a
+# warm Lambda container.
+WARM = {
+    'config': None,
+    'expires': 0,
+    'settings': None,
+    'client': None
+}
 
 
-def validate():
-    for app in os.listdir('content'):
-        for file in glob.glob('content/{}/searches/*.yaml'.format(app)):
-            LOGGER.debug('Validating {}.'.format(file))
-            sourcefile = benedict.from_yaml(file)
-            validator.getValidSearch(sourcefile)
+def validate(since=None):
+    if since:
+        apps, files, _ = gitChanges.changedContent(since, loader.CONTENT_DIR)
+        content = loader.loadContent(sorted(apps), files=files)
+    else:
+        content = loader.loadContent()
+
+    LOGGER.debug('Validated {} searches.'.format(len(content)))
     print("Valid")
     return True
 
+
+def compileContent(path):
+    '''
+    Validates and renders all content into a bundle, for Lambda to deploy
+    without parsing or validating any of it.
+    '''
+    apps = loader.listApps()
+    count = bundle.compileBundle(
+        apps,
+        loadSearches(apps),
+        path,
+        loader.contentDigest()
+    )
+
+    LOGGER.debug('Compiled {} searches.'.format(count))
+    print('Compiled {} searches to {}'.format(count, path))
+    return True
+
+
+def setCredentials(splunkConfig, secretConfig, lookup):
+    '''
+    Fills in the Splunk credentials named by a secrets location, using
+    lookup to fetch each one. A token is used instead of a username and
+    password if the location names one.
+
+    Returns: True if all the credentials were found
+             False if not.
+    '''
+    if secretConfig.get('token'):
+        splunkConfig['token'] = lookup(secretConfig['token'])
+        return bool(splunkConfig['token'])
+
+    splunkConfig['username'] = lookup(secretConfig['username'])
+    splunkConfig['password'] = lookup(secretConfig['password'])
+    return bool(splunkConfig['username'] and splunkConfig['password'])
+
+
 def loadConfig():
 
     # Account for difference in pwd for CLI and
@@ -42,6 +119,8 @@ def loadConfig():
     else:
         configFile = CONFIG_FILE
 
+    from benedict import benedict
+
     cfg = benedict.from_yaml(configFile)
 
     validator.validateConfig(
@@ -54,16 +133,19 @@ def loadConfig():
         secretConfig = cfg['splunk']['secrets'][location]
         if location == 'secrets_manager':
             try:
+                import boto3
+
                 client = boto3.client('secretsmanager')
                 secretRaw = client.get_secret_value(
                     SecretId=secretConfig['secret']
                 )
                 secret = json.loads(secretRaw['SecretString'])
 
-                cfg['splunk']['username'] = secret[secretConfig['username']]
-                cfg['splunk']['password'] = secret[secretConfig['password']]
-
-                if cfg['splunk']['username'] and cfg['splunk']['password']:
+                if setCredentials(
+                    cfg['splunk'],
+                    secretConfig,
+                    lambda name: secret[name]
+                ):
                     LOGGER.debug(
                         'Successfully loaded secrets from Secrets Manager.'
                     )
@@ -74,9 +156,7 @@ def loadConfig():
 
         elif location == 'env_vars':
             try:
-                cfg['splunk']['username'] = os.getenv(secretConfig['username'])
-                cfg['splunk']['password'] = os.getenv(secretConfig['password'])
-                if cfg['splunk']['username'] and cfg['splunk']['password']:
+                if setCredentials(cfg['splunk'], secretConfig, os.getenv):
                     LOGGER.debug('Successfully loaded secrets from env vars.')
                     return cfg
             except Exception as e:
@@ -86,106 +166,1188 @@ def loadConfig():
     raise ConfigLoadSecretsFailed('Could not find secrets!')
 
 
-def deploy():
-    config = loadConfig()
+def warmConfig():
+    '''
+    Loads SAD config, reusing the config and secrets loaded by an earlier
+    invocation in the same Lambda container until their TTL runs out.
+    '''
+    now = time.monotonic()
+
+    if WARM['config'] is None or now >= WARM['expires']:
+        config = loadConfig()
+        WARM['config'] = config
+        WARM['expires'] = now + config['splunk']['secrets'].get(
+            'ttl',
+            DEFAULT_SECRETS_TTL
+        )
+        # Secrets may have changed, so the client must log in again.
+        WARM['client'] = None
+
+    return WARM['config']
+
+
+def warmClient(settings, deadline=None):
+    '''
+    Returns: a SplunkClient for the settings, reusing the one created by an
+             earlier invocation in the same Lambda container if its
+             settings are unchanged
+    '''
+    if WARM['client'] is None or WARM['settings'] != settings:
+        WARM['client'] = SplunkClient(**settings, deadline=deadline)
+        WARM['settings'] = settings
+
+    return WARM['client']
+
+
+def resetWarm():
+    '''
+    Drops everything kept between invocations, so the next one starts
+    from scratch.
+    '''
+    WARM.update(config=None, expires=0, settings=None, client=None)
+
+
+def loadSearches(apps, files=None):
+    '''
+    Loads and validates every search defined for the given apps, or just
+    those in the given files, and renders each for deploying.
+
+    Returns: list of (app, search name, config to deploy)
+    '''
+    return [
+        (app, searchname, render.renderSearch(searchname, details))
+        for app, _, searchname, details in loader.loadContent(
+            apps,
+            files=files
+        )
+    ]
+
+
+def selectContent(since=None, compiled=False):
+    '''
+    Works out what content to deploy. Given a git ref (or 'auto'), only
+    apps with search files changed since then are touched, and only the
+    changed files are validated and pushed. If compiled, all content is
+    taken from the bundle built by the compile command, when there is one
+    and it was compiled from the content as it is now.
+
+    Returns: (apps, searches to deploy as from loadSearches,
+              dict of app to managed searches that are not being deployed,
+              dict of app to searches whose definitions were removed)
+    '''
+    if not since:
+        if compiled:
+            content = bundle.loadBundle(
+                bundle.BUNDLE_FILE,
+                loader.contentDigest()
+            )
+            if content is not None:
+                apps, searches = content
+                LOGGER.debug('Loaded {} compiled searches.'.format(
+                    len(searches)
+                ))
+                return apps, searches, {}, {}
+
+        apps = loader.listApps()
+        return apps, loadSearches(apps), {}, {}
+
+    touched, files, previous = gitChanges.changedContent(
+        since,
+        loader.CONTENT_DIR
+    )
+    apps = sorted(touched)
+    searches = loadSearches(apps, files=files)
+    managed = loader.searchNames(apps)
+
+    untouched = {app: set(managed[app]) for app in apps}
+    for app, searchname, _ in searches:
+        untouched[app].discard(searchname)
+
+    removed = {
+        app: previous.get(app, set()) - managed[app] for app in apps
+    }
+
+    LOGGER.info('{} search(es) changed in {} app(s) since {}.'.format(
+        len(searches),
+        len(apps),
+        since
+    ))
+
+    return apps, searches, untouched, removed
+
 
-    splunkConfig = {
+def splunkSettings(config, workers):
+    '''
+    Builds SplunkClient arguments from SAD config, making sure every
+    worker can hold a connection to Splunk.
+    '''
+    settings = {
         k: config['splunk'][k] for k in config['splunk'] if k != 'secrets'
     }
-    splunk = SplunkClient(
-        **splunkConfig
+    pool = dict(settings.get('pool') or {})
+    pool['size'] = max(pool.get('size', 1), workers)
+    settings['pool'] = pool
+
+    return settings
+
+
+def logResult(app, searchname, prefix):
+    LOGGER.debug("Search '{}' in app '{}' {}.".format(
+        searchname,
+        app,
+        prefix
+    ))
+
+
+def prioritise(searches, state):
+    '''
+    Orders searches so that, if the deadline cuts a deploy short, the
+    most important are done first: Critical searches, then those changed
+    in code since the last recorded deploy, then by severity.
+
+    Returns: list of (app, search name, search config)
+    '''
+    def priority(search):
+        app, searchname, searchconfig = search
+        severity = SplunkClient.Severity[searchconfig['severity']]
+        changed = state.hasChanged(
+            app,
+            searchname,
+            bundle.searchSource(searchconfig)
+        )
+
+        return (
+            severity != SplunkClient.Severity.Critical,
+            not changed,
+            -severity.value
+        )
+
+    return sorted(searches, key=priority)
+
+
+def matchSearch(splunk, app, searchname, searchconfig, index, state):
+    '''
+    Checks, without sending any requests, whether Splunk already has a
+    search as configured: either unchanged in both code and Splunk since
+    the last recorded deploy, or with content matching its payload. A
+    search found to match its payload is recorded in deploy state.
+
+    Returns: (True if the search needs no deploy, its payload, or None if
+              it was not rendered)
+    '''
+    source = bundle.searchSource(searchconfig)
+    entry = index.get(searchname)
+
+    if state.isUnchanged(app, searchname, source, entry):
+        return True, None
+
+    payload = bundle.searchPayload(splunk, searchconfig)
+
+    if splunk.searchMatches(app, searchname, payload, index):
+        state.record(app, searchname, source, entry.get('updated'))
+        return True, payload
+
+    return False, payload
+
+
+def deploySearch(splunk, app, searchname, searchconfig, index, state,
+                 deadline=None):
+    '''
+    Deploys a single search, unless Splunk already has it as configured.
+    Searches unchanged in both code and Splunk since the last recorded
+    deploy are skipped without comparing their content. Searches not
+    reached before the deadline are skipped.
+
+    Returns: 'unchanged', 'updated', 'created' or 'skipped'
+    '''
+    if deadline is not None and deadline.expired():
+        logResult(app, searchname, 'skipped')
+        return 'skipped'
+
+    matched, payload = matchSearch(
+        splunk,
+        app,
+        searchname,
+        searchconfig,
+        index,
+        state
     )
 
+    if matched:
+        prefix = 'unchanged'
+    else:
+        try:
+            result = splunk.deployPayload(
+                app,
+                searchname,
+                payload,
+                index=index
+            )
+        except DeadlineExceeded:
+            logResult(app, searchname, 'skipped')
+            return 'skipped'
+        state.record(app, searchname, bundle.searchSource(searchconfig))
+
+        if result == 200:
+            prefix = 'updated'
+        else:
+            prefix = 'created'
+
+    logResult(app, searchname, prefix)
+
+    return prefix
+
+
+def tallyResults(summary, apps, results):
+    '''
+    Adds deploy results, given as (app, search name, outcome), to the run
+    summary. Must only be called from a single thread.
+    '''
+    processed = {app: 0 for app in apps}
+
+    for app, searchname, prefix in results:
+        summary[prefix] += 1
+        processed[app] += 1
+
+    for app in apps:
+        LOGGER.info("{} searches processed for app '{}'.".format(
+            processed[app],
+            app
+        ))
+
+
+def contentMisses(searches, indexes, state):
+    '''
+    Returns: list of (app, search name) for the searches to deploy that
+             exist in Splunk but that deploy state can't vouch for, so
+             whose content must be compared
+    '''
+    return [
+        (app, searchname)
+        for app, searchname, searchconfig in searches
+        if searchname in indexes[app] and not state.isUnchanged(
+            app,
+            searchname,
+            bundle.searchSource(searchconfig),
+            indexes[app][searchname]
+        )
+    ]
+
+
+def fillContent(indexes, misses, entries):
+    '''
+    Puts the entries fetched for searches missing their content into the
+    inventory, dropping any deleted from Splunk since it was listed.
+    '''
+    for (app, searchname), entry in zip(misses, entries):
+        if entry is None:
+            indexes[app].pop(searchname, None)
+        else:
+            indexes[app][searchname] = entry
+
+
+def fetchInventory(splunk, apps, searches, state, workers):
+    '''
+    Lists the searches in Splunk for the apps. With deploy state to go
+    on, only names and update times are listed at first, and content is
+    then fetched just for the searches state can't vouch for: one at a
+    time if there are few enough, otherwise by listing again in full.
+
+    Returns: dict of app to search index, as from getInventory
+    '''
+    if state.isEmpty():
+        return splunk.getInventory(apps)
+
+    indexes = splunk.getInventory(apps, fields=NAME_FIELDS)
+    misses = contentMisses(searches, indexes, state)
+
+    if len(misses) > MAX_CONTENT_FETCHES:
+        return splunk.getInventory(apps)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        fillContent(indexes, misses, list(executor.map(
+            lambda miss: splunk.getSearch(*miss),
+            misses
+        )))
+
+    return indexes
+
+
+async def fetchInventoryAsync(splunk, apps, searches, state, limit):
+    '''
+    Coroutine version of fetchInventory, for use with AsyncSplunkClient.
+    At most `limit` searches are fetched at once.
+
+    Returns: dict of app to search index, as from getInventory
+    '''
+    import asyncio
+
+    if state.isEmpty():
+        return await splunk.getInventory(apps)
+
+    indexes = await splunk.getInventory(apps, fields=NAME_FIELDS)
+    misses = contentMisses(searches, indexes, state)
+
+    if len(misses) > MAX_CONTENT_FETCHES:
+        return await splunk.getInventory(apps)
+
+    async def fetch(app, searchname):
+        async with limit:
+            return await splunk.getSearch(app, searchname)
+
+    fillContent(indexes, misses, await asyncio.gather(*(
+        fetch(app, searchname) for app, searchname in misses
+    )))
+
+    return indexes
+
+
+def planDeploy(config, managed, indexes, removed):
+    '''
+    Plans what to create, update and delete in each app, given the
+    (app, search name) pairs managed by code.
+
+    Returns: dict of app to reconcile.AppPlan
+    '''
+    plans = reconcile.plan(
+        managed,
+        indexes,
+        removed,
+        config['general']['remove_unmanaged']
+    )
+
+    for app, appPlan in plans.items():
+        LOGGER.info(
+            "Plan for app '{}': {} to create, {} to update if changed, "
+            "{} to delete.".format(
+                app,
+                len(appPlan.create),
+                len(appPlan.update),
+                len(appPlan.delete)
+            )
+        )
+
+    return plans
+
+
+def warnUnmanaged(config, plans):
+    '''
+    Warns about unmanaged searches in each app, if configured to.
+    '''
+    if not config['general']['warn_unmanaged']:
+        return
+
+    for app, appPlan in plans.items():
+        if appPlan.unmanaged:
+            LOGGER.warning(
+                "{} searches in app '{}' not being managed! "
+                "Offending search list: {}".format(
+                    len(appPlan.unmanaged),
+                    app,
+                    sorted(appPlan.unmanaged)
+                )
+            )
+
+
+def managedSearches(jobs, untouched):
+    '''
+    Returns: list of (app, search name) for every search managed by code,
+             from the deployed jobs plus those left untouched
+    '''
+    managed = [(job[0], job[1]) for job in jobs]
+    for app, searchnames in untouched.items():
+        managed.extend((app, searchname) for searchname in searchnames)
+
+    return managed
+
+
+def journal(checkpoint, app, searchname, prefix):
+    '''
+    Marks a search as completed in the checkpoint, unless it was skipped.
+    '''
+    if prefix != 'skipped':
+        checkpoint.complete(app, searchname)
+
+
+def journalled(checkpoint, results):
+    '''
+    Journals deploy results, given as (app, search name, outcome), as they
+    are passed on.
+    '''
+    for app, searchname, prefix in results:
+        journal(checkpoint, app, searchname, prefix)
+        yield app, searchname, prefix
+
+
+def cancelAll(futures):
+    '''
+    Cancels every future that has not started running yet.
+    '''
+    for future in futures:
+        future.cancel()
+
+
+def deployed(executor, splunk, searches, indexes, state, deadline):
+    '''
+    Deploys searches on a pool of threads. If any search fails, the
+    searches still queued are cancelled rather than left for the pool to
+    work through, and the error is raised once those already running
+    have finished and been passed on, so that every search completed is
+    journalled.
+
+    Returns: generator of (app, search name, outcome), in the order the
+             searches finish
+    '''
+    futures = {
+        executor.submit(
+            deploySearch,
+            splunk,
+            app,
+            searchname,
+            searchconfig,
+            indexes[app],
+            state,
+            deadline
+        ): (app, searchname)
+        for app, searchname, searchconfig in searches
+    }
+
+    error = None
+
+    try:
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+
+            try:
+                result = future.result()
+            except Exception as e:
+                if error is None:
+                    error = e
+                    cancelAll(futures)
+                continue
+
+            app, searchname = futures[future]
+            yield app, searchname, result
+    finally:
+        # Also stops the pool working through the queue if the results
+        # stop being read.
+        cancelAll(futures)
+
+    if error is not None:
+        raise error
+
+
+def shardSettings(config, shards=None):
+    '''
+    Returns: general.shards from SAD config with defaults filled in, and
+             the shard count overridden if given
+    '''
+    settings = dict(DEFAULT_SHARDS)
+    settings.update(config['general'].get('shards') or {})
+
+    if shards:
+        settings['count'] = shards
+
+    return settings
+
+
+def deployShard(config, searches, indexes, workers=1, deadline=None,
+                reuse=False):
+    '''
+    Deploys one shard of the content for a deploy() split into shards, in
+    a worker process or Lambda invocation of its own. The coordinator
+    hands over the shard's slice of its inventory (see shardIndexes), so
+    the shard lists nothing itself. Nothing is deleted and deploy state is
+    handed back rather than saved, so that deploy() can merge every
+    shard's results before working out what is unmanaged.
+
+    Returns: dict of the 'results' as (app, search name, outcome), the
+             'state' recorded for the shard's searches, and request 'stats'
+    '''
+    deadline = Deadline(deadline)
+
+    try:
+        if reuse:
+            splunk = warmClient(splunkSettings(config, workers), deadline)
+        else:
+            splunk = SplunkClient(
+                **splunkSettings(config, workers),
+                deadline=deadline
+            )
+    except DeadlineExceeded:
+        return {
+            'results': [
+                (app, searchname, 'skipped')
+                for app, searchname, _ in searches
+            ],
+            'state': {},
+            'stats': {}
+        }
+    splunk.setDeadline(deadline)
+
+    start = splunk.requestStats()
+    state = DeployState(getStateStore(config))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(deployed(
+            executor, splunk, searches, indexes, state, deadline
+        ))
+
+    LOGGER.info('Deployed shard of {} search(es).'.format(len(results)))
+
+    return {
+        'results': results,
+        'state': state.export(
+            (app, searchname) for app, searchname, _ in results
+        ),
+        'stats': requestCounts(splunk, start)
+    }
+
+
+def triage(splunk, searches, indexes, state):
+    '''
+    Sorts out, on the coordinator and without sending any requests, which
+    searches Splunk already has as configured, so that shards are only
+    handed searches that need deploying.
+
+    Returns: (list of (app, search name, 'unchanged'),
+              list of searches still to deploy)
+    '''
+    unchanged = []
+    changed = []
+
+    for search in searches:
+        app, searchname, searchconfig = search
+        matched, _ = matchSearch(
+            splunk,
+            app,
+            searchname,
+            searchconfig,
+            indexes[app],
+            state
+        )
+
+        if matched:
+            logResult(app, searchname, 'unchanged')
+            unchanged.append((app, searchname, 'unchanged'))
+        else:
+            changed.append(search)
+
+    return unchanged, changed
+
+
+def shardIndexes(shard, indexes):
+    '''
+    Cuts the coordinator's inventory down to what a shard needs once its
+    searches have been triaged: which of them already exist in Splunk.
+
+    Returns: dict of app to search index, holding only the shard's
+             searches, each by name alone
+    '''
+    slices = {}
+
+    for app, searchname, _ in shard:
+        index = slices.setdefault(app, {})
+        if searchname in indexes[app]:
+            index[searchname] = {'name': searchname}
+
+    return slices
+
+
+def shardRevision(searches):
+    '''
+    Returns: hash identifying the content a Lambda shard's positions refer
+             to, cheap to work out from a compiled bundle
+    '''
+    return fingerprint([
+        (app, searchname, bundle.searchSource(searchconfig))
+        for app, searchname, searchconfig in searches
+    ])
+
+
+def shardSearches(shard):
+    '''
+    Picks out a Lambda shard's searches, given by their positions in the
+    coordinator's content, from this invocation's own copy of it.
+
+    Returns: list of (app, search name, search config)
+    '''
+    _, searches, _, _ = selectContent(compiled=True)
+
+    if shardRevision(searches) != shard['revision']:
+        raise ShardDeployFailed(
+            'Shard content differs from the coordinator\'s! Deploy the '
+            'same compiled content to both.'
+        )
+
+    return [tuple(searches[position]) for position in shard['searches']]
+
+
+def submitShards(executor, config, settings, shards, indexes, content,
+                 workers, deadline):
+    '''
+    Starts deploying each shard, in a worker process with the 'process'
+    dispatch, or by invoking a Lambda function with 'lambda'. Lambda
+    shards are sent the positions of their searches in the content
+    rather than the searches themselves, to keep each event well within
+    Lambda's payload limit.
+
+    Returns: list of futures, one for each shard's outcome
+    '''
+    remaining = deadline.remaining()
+
+    if settings['dispatch'] != 'lambda':
+        return [
+            executor.submit(
+                deployShard,
+                config,
+                shard,
+                shardIndexes(shard, indexes),
+                workers,
+                remaining
+            )
+            for shard in shards
+        ]
+
+    import boto3
+
+    client = boto3.client('lambda')
+    function = settings.get('function') or os.environ[
+        'AWS_LAMBDA_FUNCTION_NAME'
+    ]
+    revision = shardRevision(content)
+    positions = {
+        (app, searchname): position
+        for position, (app, searchname, _) in enumerate(content)
+    }
+
+    return [
+        executor.submit(invokeShard, client, function, {
+            'shard': {
+                'revision': revision,
+                'searches': [
+                    positions[(app, searchname)]
+                    for app, searchname, _ in shard
+                ],
+                'indexes': shardIndexes(shard, indexes),
+                'workers': workers,
+                'deadline': remaining
+            }
+        })
+        for shard in shards
+    ]
+
+
+def shardResults(config, settings, splunk, searches, indexes, content,
+                 workers, deadline, state, summary):
+    '''
+    Deploys searches split into shards, all at once. Searches Splunk
+    already has as configured are found by the coordinator, and only the
+    rest are handed out. Each shard's deploy state and request counts are
+    merged in as it finishes.
+
+    Returns: generator of (app, search name, outcome), a shard at a time
+    '''
+    unchanged, changed = triage(splunk, searches, indexes, state)
+    yield from unchanged
+
+    shards = partition(changed, settings['count'], settings['by'])
+    LOGGER.info('Deploying {} search(es) across {} shard(s).'.format(
+        len(changed),
+        len(shards)
+    ))
+
+    if settings['dispatch'] == 'lambda':
+        executor = ThreadPoolExecutor(max_workers=max(1, len(shards)))
+    else:
+        executor = ProcessPoolExecutor(max_workers=max(1, len(shards)))
+
+    with executor:
+        for future in as_completed(submitShards(
+            executor,
+            config,
+            settings,
+            shards,
+            indexes,
+            content,
+            workers,
+            deadline
+        )):
+            outcome = future.result()
+            state.merge(outcome['state'])
+            for key, value in outcome['stats'].items():
+                summary[key] += value
+
+            for app, searchname, prefix in outcome['results']:
+                yield app, searchname, prefix
+
+
+def loadCheckpoint(config, searches):
+    '''
+    Returns: the checkpoint for this revision of the searches to deploy,
+             holding any progress made on it by earlier runs
+    '''
+    checkpoint = Checkpoint(
+        getStateStore(config, 'checkpoint'),
+        contentRevision(searches)
+    )
+
+    if checkpoint.resumed:
+        LOGGER.info(
+            'Resuming deploy, {} search(es) already completed by an '
+            'earlier run.'.format(checkpoint.resumed)
+        )
+
+    return checkpoint
+
+
+def finishCheckpoint(checkpoint, summary):
+    '''
+    Keeps the checkpoint for the next run to resume from if any work was
+    skipped, otherwise clears it.
+    '''
+    if summary['skipped']:
+        checkpoint.flush()
+    else:
+        checkpoint.clear()
+
+
+def logDeleted(app, search, error=None):
+    if error is None:
+        LOGGER.info(
+            "Search '{}' in app '{}' "
+            "deleted successfully.".format(
+                search,
+                app
+            )
+        )
+    else:
+        LOGGER.error(
+            "Search '{}' in app '{}' could not "
+            "be deleted! {}".format(
+                search,
+                app,
+                error
+            )
+        )
+
+
+def tallyDeletions(summary, outcomes):
+    '''
+    Adds the outcomes of deletions, as from reconcile, to the run summary.
+    '''
+    for item in outcomes:
+        if item['outcome'] == reconcile.DELETED:
+            summary['deleted'] += 1
+            logDeleted(item['app'], item['search'])
+        elif item['outcome'] == reconcile.SKIPPED:
+            summary['skipped'] += 1
+        else:
+            logDeleted(item['app'], item['search'], item['error'])
+
+
+def saveState(state, managed):
+    '''
+    Persists deploy state. Failing to do so only costs the next run
+    some extra comparisons, so is not fatal.
+    '''
+    try:
+        state.save(managed)
+    except Exception as e:
+        LOGGER.warning('Could not save deploy state! {}'.format(e))
+
+
+def requestCounts(splunk, start):
+    '''
+    Returns: how many requests to Splunk were retried, and how many times
+             Splunk said it was overloaded, since the client's requestStats
+             were start
+    '''
+    return {
+        key: value - start[key]
+        for key, value in splunk.requestStats().items()
+    }
+
+
+def logSummary(summary):
+    if summary['skipped']:
+        LOGGER.warning(
+            'Deadline reached before the deploy finished! {skipped} '
+            'search(es) skipped.'.format(**summary)
+        )
+
+    LOGGER.info(
+        'Deploy complete. {unchanged} unchanged, {updated} updated, '
+        '{created} created, {deleted} deleted, {resumed} resumed from an '
+        'earlier run. {retries} request(s) '
+        'retried, {throttled} throttled by Splunk.'.format(**summary)
+    )
+
+
+def skippedSummary(searches, counts=None):
+    '''
+    Reports on a deploy that reached its deadline before it could deploy
+    anything, such as while connecting to Splunk.
+
+    Returns: summary, with every search counted as skipped
+    '''
+    summary = dict(EMPTY_SUMMARY)
+    summary['skipped'] = len(searches)
+    summary.update(counts or {})
+    logSummary(summary)
+
+    return summary
+
+
+def deploy(workers=None, since=None, reuse=False, deadline=None,
+           shards=None, compiled=False):
+    '''
+    Deploys content to Splunk. With reuse, config, secrets and the Splunk
+    client are kept for later calls in the same process, as in a warm
+    Lambda container.
+
+    Given a deadline in seconds, no request to Splunk runs past it. The
+    most important searches are deployed first, and any not reached in
+    time are skipped and counted in the summary.
+
+    With more than one shard (from general.shards, or given), searches are
+    split between workers that each deploy their shard, with this process
+    coordinating them and deleting searches once all have finished.
+
+    If compiled, content is taken from the bundle when there is one (see
+    selectContent).
+    '''
+    deadline = Deadline(deadline)
+
+    if reuse:
+        config = warmConfig()
+    else:
+        config = loadConfig()
+
+    if not workers:
+        workers = config['general'].get('concurrency', 1)
+
+    apps, searches, untouched, removed = selectContent(since, compiled)
+
+    try:
+        if reuse:
+            splunk = warmClient(splunkSettings(config, workers), deadline)
+        else:
+            splunk = SplunkClient(
+                **splunkSettings(config, workers),
+                deadline=deadline
+            )
+    except DeadlineExceeded:
+        return skippedSummary(searches)
+    splunk.setDeadline(deadline)
+
     LOGGER.info('Connected to Splunk instance.')
-    LOGGER.info('Starting deploy.')
-
-    for app in os.listdir('content'):
-        LOGGER.info("Deploying saved search content for app '{}'".format(app))
-        searchlist = splunk.listSearches(app=app)
-        processed = 0
-        for file in glob.glob('content/{}/searches/*.yaml'.format(app)):
-            LOGGER.debug('Processing {}.'.format(file))
-            sourcefile = benedict.from_yaml(file)
-            searches = validator.getValidSearch(sourcefile)
-
-            searchconfig = {}
-            for searchname, details in searches.items():
-                # We only support alerts, not reports
-                searchconfig['is_scheduled'] = 'True'
-
-                if 'cyber' in details:
-                    details['cyber']['Detection'] = searchname
-                    details['cyber']['Severity'] = details['severity']
-                    for variable, value in details['cyber'].items():
-                        details['search'] = '{} | eval {}="{}"'.format(
-                            details['search'],
-                            variable,
-                            value
-                        )
-                    details.pop('cyber', None)
-
-                searchconfig.update(details)
-                result = splunk.deploySearch(app, searchname, searchconfig)
-
-                if result == 200:
-                    prefix = 'updated'
-                else:
-                    prefix = 'created'
-
-                LOGGER.debug("Search '{}' in app '{}' {} successfully.".format(
+    LOGGER.info('Starting deploy with {} worker(s).'.format(workers))
+
+    summary = dict(EMPTY_SUMMARY)
+    # A client reused from an earlier run has already counted requests.
+    start = splunk.requestStats()
+    state = DeployState(getStateStore(config))
+    checkpoint = loadCheckpoint(config, searches)
+
+    settings = shardSettings(config, shards)
+
+    jobs = []
+    resumed = []
+    pending = []
+    for app, searchname, searchconfig in prioritise(searches, state):
+        jobs.append((app, searchname))
+
+        if checkpoint.isCompleted(app, searchname):
+            resumed.append((app, searchname, 'resumed'))
+        else:
+            pending.append((app, searchname, searchconfig))
+
+    try:
+        indexes = fetchInventory(splunk, apps, pending, state, workers)
+    except DeadlineExceeded:
+        return skippedSummary(searches, requestCounts(splunk, start))
+
+    managed = managedSearches(jobs, untouched)
+    plans = planDeploy(config, managed, indexes, removed)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            if settings['count'] > 1:
+                results = shardResults(
+                    config,
+                    settings,
+                    splunk,
+                    pending,
+                    indexes,
+                    searches,
+                    workers,
+                    deadline,
+                    state,
+                    summary
+                )
+            else:
+                results = deployed(
+                    executor,
+                    splunk,
+                    pending,
+                    indexes,
+                    state,
+                    deadline
+                )
+
+            # Results are gathered here, on the main thread, so the
+            # bookkeeping needs no locking.
+            tallyResults(
+                summary,
+                apps,
+                chain(resumed, journalled(checkpoint, results))
+            )
+    except Exception:
+        # Keep what was done for the next run to resume from.
+        checkpoint.flush()
+        raise
+
+    saveState(state, managed)
+    warnUnmanaged(config, plans)
+    tallyDeletions(summary, reconcile.executeDeletions(
+        splunk,
+        reconcile.deletions(plans),
+        workers,
+        deadline
+    ))
+
+    finishCheckpoint(checkpoint, summary)
+    for key, value in requestCounts(splunk, start).items():
+        summary[key] += value
+    logSummary(summary)
+
+    return summary
+
+
+async def deploySearchAsync(splunk, app, searchname, searchconfig, index,
+                            state, limit, deadline=None):
+    '''
+    Coroutine version of deploySearch, for use with AsyncSplunkClient.
+    At most `limit` searches are sent to Splunk at once.
+
+    Returns: 'unchanged', 'updated', 'created' or 'skipped'
+    '''
+    if deadline is not None and deadline.expired():
+        logResult(app, searchname, 'skipped')
+        return 'skipped'
+
+    matched, payload = matchSearch(
+        splunk,
+        app,
+        searchname,
+        searchconfig,
+        index,
+        state
+    )
+
+    if matched:
+        prefix = 'unchanged'
+    else:
+        try:
+            async with limit:
+                result = await splunk.deployPayload(
+                    app,
                     searchname,
+                    payload,
+                    index=index
+                )
+        except DeadlineExceeded:
+            logResult(app, searchname, 'skipped')
+            return 'skipped'
+        state.record(app, searchname, bundle.searchSource(searchconfig))
+
+        if result == 200:
+            prefix = 'updated'
+        else:
+            prefix = 'created'
+
+    logResult(app, searchname, prefix)
+
+    return prefix
+
+
+async def deployAsync(workers=None, since=None, reuse=False,
+                      deadline=None, compiled=False):
+    '''
+    asyncio version of deploy(), driving an AsyncSplunkClient. Run it
+    with asyncio.run(), or await it from an existing event loop.
+
+    With reuse, config and secrets are kept for later calls. The client
+    is not, as its session belongs to the current event loop.
+    '''
+    deadline = Deadline(deadline)
+
+    if reuse:
+        config = warmConfig()
+    else:
+        config = loadConfig()
+
+    if not workers:
+        workers = config['general'].get('concurrency', 1)
+
+    apps, searches, untouched, removed = selectContent(since, compiled)
+
+    import asyncio
+    from asyncSplunkClient import AsyncSplunkClient
+
+    try:
+        splunk = await AsyncSplunkClient.connect(
+            **splunkSettings(config, workers),
+            deadline=deadline
+        )
+    except DeadlineExceeded:
+        return skippedSummary(searches)
+
+    LOGGER.info('Connected to Splunk instance.')
+    LOGGER.info('Starting async deploy with {} worker(s).'.format(workers))
+
+    summary = dict(EMPTY_SUMMARY)
+    state = DeployState(getStateStore(config))
+    checkpoint = loadCheckpoint(config, searches)
+    start = splunk.requestStats()
+    limit = asyncio.Semaphore(workers)
+
+    async def deployJob(app, searchname, coro):
+        return app, searchname, await coro
+
+    try:
+        jobs = []
+        results = []
+        pending = []
+        for app, searchname, searchconfig in prioritise(searches, state):
+            jobs.append((app, searchname))
+
+            if checkpoint.isCompleted(app, searchname):
+                results.append((app, searchname, 'resumed'))
+            else:
+                pending.append((app, searchname, searchconfig))
+
+        try:
+            indexes = await fetchInventoryAsync(
+                splunk,
+                apps,
+                pending,
+                state,
+                limit
+            )
+        except DeadlineExceeded:
+            return skippedSummary(searches, requestCounts(splunk, start))
+
+        tasks = []
+        # Tasks start in order, and the semaphore wakes waiters in order,
+        # so priority is kept.
+        for app, searchname, searchconfig in pending:
+            tasks.append(asyncio.ensure_future(deployJob(
+                app,
+                searchname,
+                deploySearchAsync(
+                    splunk,
                     app,
-                    prefix
-                ))
-                processed += 1
+                    searchname,
+                    searchconfig,
+                    indexes[app],
+                    state,
+                    limit,
+                    deadline
+                )
+            )))
+
+        managed = managedSearches(jobs, untouched)
+        plans = planDeploy(config, managed, indexes, removed)
 
-                if searchname in searchlist:
-                    searchlist.remove(searchname)
+        try:
+            for task in asyncio.as_completed(tasks):
+                results.append(await task)
+                journal(checkpoint, *results[-1])
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            # Keep what was done for the next run to resume from,
+            # including searches that finished but were not yet read.
+            for outcome in await asyncio.gather(
+                *tasks,
+                return_exceptions=True
+            ):
+                if not isinstance(outcome, BaseException):
+                    journal(checkpoint, *outcome)
+            checkpoint.flush()
+            raise
 
-        LOGGER.info('{} searches processed.'.format(
-            processed
+        tallyResults(summary, apps, results)
+        saveState(state, managed)
+        warnUnmanaged(config, plans)
+        tallyDeletions(summary, await reconcile.executeDeletionsAsync(
+            splunk,
+            reconcile.deletions(plans),
+            limit,
+            deadline
         ))
 
-        if len(searchlist) > 0:
-            if config['general']['warn_unmanaged']:
-                LOGGER.warning(
-                    "{} searches in app '{}' not being managed! "
-                    "Offending search list: {}".format(
-                        len(searchlist),
-                        app,
-                        searchlist
-                    )
-                )
+        finishCheckpoint(checkpoint, summary)
+        summary.update(requestCounts(splunk, start))
+
+    finally:
+        await splunk.close()
+
+    logSummary(summary)
+
+    return summary
+
+
+def remainingTime(context):
+    '''
+    Returns: seconds a deploy may run for in this Lambda invocation,
+             keeping back time to report, or None if there is no limit
+    '''
+    getRemaining = getattr(context, 'get_remaining_time_in_millis', None)
+    if getRemaining is None:
+        return None
 
-            if app in config['general']['remove_unmanaged']:
-                for search in searchlist:
-                    try:
-                        splunk.deleteSearch(app=app, searchName=search)
-                        LOGGER.info(
-                            "Search '{}' in app '{}' "
-                            "deleted successfully.".format(
-                                search,
-                                app
-                            )
-                        )
-                    except Exception as e:
-                        LOGGER.error(
-                            "Search '{}' in app '{}' could not "
-                            "be deleted! {}".format(
-                                search,
-                                app,
-                                e
-                            )
-                        )
+    return max(0, getRemaining() / 1000 - LAMBDA_DEADLINE_MARGIN)
 
 
 def lambda_handler(event, context):
     if event.get('debug'):
         LOGGER.setLevel(logging.DEBUG)
 
+    deadline = remainingTime(context)
+
     try:
-        deploy()
-        responseBody = {}
+        if event.get('shard'):
+            shard = event['shard']
+            if deadline is None:
+                deadline = shard.get('deadline')
+            elif shard.get('deadline') is not None:
+                # The coordinator's deadline may outlast this invocation.
+                deadline = min(deadline, shard['deadline'])
+
+            responseBody = deployShard(
+                warmConfig(),
+                shardSearches(shard),
+                shard['indexes'],
+                shard.get('workers') or 1,
+                deadline=deadline,
+                reuse=True
+            )
+        elif event.get('async'):
+            import asyncio
+
+            responseBody = asyncio.run(
+                deployAsync(reuse=True, deadline=deadline, compiled=True)
+            )
+        else:
+            responseBody = deploy(
+                reuse=True,
+                deadline=deadline,
+                compiled=True
+            )
 
         response = {
             'statusCode': 200,
@@ -193,6 +1355,8 @@ def lambda_handler(event, context):
         }
 
     except Exception as error:
+        # Don't let a bad config or broken client outlive this invocation.
+        resetWarm()
         LOGGER.error('error: {} '.format(
             getattr(error, 'message', repr(error))
         ))
@@ -211,16 +1375,29 @@ def lambda_handler(event, context):
 
 
 def main():
-    cli.banner()
+    if sys.stdout.isatty():
+        cli.banner()
     args = cli.parseArgs(VALID_COMMANDS)
 
     if args.debug:
         LOGGER.setLevel(logging.DEBUG)
 
     if not args.nojson:
+        import json_logging
+
         json_logging.init_non_web(enable_json=True)
 
-    globals()[args.command]()
+    if args.command == 'deploy':
+        deploy(
+            workers=args.workers,
+            since=args.since,
+            deadline=args.deadline,
+            shards=args.shards
+        )
+    elif args.command == 'compile':
+        compileContent('src/' + bundle.BUNDLE_FILE)
+    else:
+        validate(since=args.since)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,60 @@
+import json
+import zlib
+
+from exceptions import ShardDeployFailed
+
+# Content is split into shards either by app, so that each shard owns
+# whole apps, or by search, which spreads large apps evenly. The config
+# schema limits 'by' to those two.
+DEFAULT_SHARDS = {
+    'count': 1,
+    'by': 'app',
+    'dispatch': 'process'
+}
+
+
+def shardIndex(app, searchName, count, by='app'):
+    '''
+    Returns: the shard, from 0 to count - 1, that a search belongs to.
+             Stable across processes and runs, unlike hash().
+    '''
+    key = app if by == 'app' else '{}/{}'.format(app, searchName)
+    return zlib.crc32(key.encode('utf-8')) % count
+
+
+def partition(searches, count, by='app'):
+    '''
+    Splits searches, given as (app, search name, search config), into
+    shards, keeping their order within each shard.
+
+    Returns: list of non-empty shards, each a list of searches
+    '''
+    shards = [[] for _ in range(count)]
+
+    for search in searches:
+        shards[shardIndex(search[0], search[1], count, by)].append(search)
+
+    return [shard for shard in shards if shard]
+
+
+def invokeShard(client, function, payload):
+    '''
+    Deploys a shard by invoking a Lambda function, usually this one, and
+    waiting for it to finish.
+
+    Returns: the shard's outcome, as from deployShard()
+    '''
+    response = client.invoke(
+        FunctionName=function,
+        InvocationType='RequestResponse',
+        Payload=json.dumps(payload).encode('utf-8')
+    )
+    result = json.loads(response['Payload'].read())
+
+    if response.get('FunctionError') or result.get('statusCode') != 200:
+        raise ShardDeployFailed('Shard failed in {}! {}'.format(
+            function,
+            result.get('body', result)
+        ))
+
+    return json.loads(result['body'])
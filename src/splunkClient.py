@@ -1,18 +1,170 @@
 import requests
 import json
+import threading
+import time
 
 from enum import Enum
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
 
 from exceptions import SplunkUpdateFailed, SplunkGetFailed
 from exceptions import SplunkConnectFailed, SplunkValidateFailed
 from exceptions import ConfigValidateFailed
 
+from deadline import Deadline
+from exceptions import DeadlineExceeded
+from throttle import AdaptiveLimiter, RetryPolicy
+
 requests.packages.urllib3.disable_warnings()
 
+LOGIN_API = '/services/auth/login'
+SERVER_INFO_API = '/services/server/info'
 SEARCH_API = '/servicesNS/admin/{app}/saved/searches'
+# Every user's searches, across every app, in one listing.
+INVENTORY_API = '/servicesNS/-/-/saved/searches'
+DEFAULT_POOL = {
+    'size': 10,
+    'keep_alive': True
+}
+# Seconds to wait on any one request to Splunk, unless the run's deadline
+# is sooner.
+DEFAULT_TIMEOUT = 30
+
+# Searches fetched per request when listing an app, bounding how much of
+# Splunk's response is held in memory at once.
+PAGE_SIZE = 500
+# Content fields needed to compare a search against its rendered payload.
+INDEX_FIELDS = [
+    'search',
+    'description',
+    'cron_schedule',
+    'is_scheduled',
+    'actions',
+    'action.*',
+    'alert.*',
+    'dispatch.*'
+]
+# Entry names are always returned, so ask for as little content as possible.
+NAME_FIELDS = ['name']
+# Alert actions as named in content, to the name Splunk lists them under
+# in 'actions' (if any) and the fields that switch them on.
+ALERT_ACTIONS = {
+    'Add to Triggered Alerts': (None, {'alert.track': 1}),
+    'OpsGenie': ('opsgenie', {'action.opsgenie': 1}),
+    'Send email': ('email', {'action.email': 1})
+}
+# What an email alert can include, to the fields that turn each on.
+# Applied in this order, so the last inline format listed here wins.
+EMAIL_INCLUDES = {
+    'Link to Alert': {'action.email.include.view_link': 1},
+    'Link to Results': {'action.email.include.results_link': 1},
+    'Search String': {'action.email.include.search': 1},
+    'Inline Table': {
+        'action.email.inline': 1,
+        'action.email.include.inline': 1,
+        'action.email.include.format': 'table'
+    },
+    'Inline Raw': {
+        'action.email.inline': 1,
+        'action.email.include.inline': 1,
+        'action.email.include.format': 'raw'
+    },
+    'Inline CSV': {
+        'action.email.inline': 1,
+        'action.email.include.inline': 1,
+        'action.email.include.format': 'csv'
+    },
+    'Trigger Condition': {'action.email.include.trigger': 1},
+    'Trigger Time': {'action.email.include.trigger_time': 1},
+    'Attach CSV': {'action.email.sendcsv': 1},
+    'Attach PDF': {'action.email.sendpdf': 1},
+    'Allow Empty Attachment': {'action.email.allow_empty_attachment': 1}
+}
+
+
+def isIdempotent(method, url):
+    '''
+    Returns: False if the request creates a search, by POSTing to a
+             saved searches collection, which fails with a 409 if sent
+             again after it succeeded
+             True if not.
+    '''
+    if method != 'POST':
+        return True
+    return not urlsplit(url).path.rstrip('/').endswith('/saved/searches')
+
+
+class RetryAdapter(HTTPAdapter):
+    '''
+    Transport adapter that retries requests Splunk turns away while busy,
+    and bounds how many are in flight with an adaptive limiter. Every
+    request is given a timeout that doesn't run past the deadline, and
+    retries that would wait past it are given up. Sits under every call
+    made through the session.
+    '''
+
+    def __init__(self, limiter, policy, timeout=None, **kwargs):
+        self._limiter = limiter
+        self._policy = policy
+        self._timeout = timeout or DEFAULT_TIMEOUT
+        self.deadline = Deadline()
+        super().__init__(**kwargs)
+
+    def _send(self, request, **kwargs):
+        '''
+        Returns: the response, and the number the limiter gave the request
+        '''
+        kwargs['timeout'] = self.deadline.timeout(
+            kwargs.get('timeout') or self._timeout
+        )
+
+        try:
+            with self._limiter as sent:
+                return super().send(request, **kwargs), sent
+        except requests.Timeout:
+            if self.deadline.expired():
+                raise DeadlineExceeded(
+                    'Deadline reached waiting on {}!'.format(request.url)
+                )
+            raise
+
+    def send(self, request, **kwargs):
+        attempt = 0
+
+        while True:
+            r, sent = self._send(request, **kwargs)
+
+            retrying = self._policy.shouldRetry(
+                r.status_code,
+                attempt,
+                isIdempotent(request.method, request.url)
+            )
+            if retrying:
+                delay = self._policy.delay(
+                    attempt,
+                    r.headers.get('Retry-After')
+                )
+                retrying = self.deadline.allows(delay)
+
+            self._limiter.record(r.status_code, retrying, sent)
+
+            if not retrying:
+                return r
+
+            # Release the connection back to the pool while we wait.
+            r.content
+            r.close()
+
+            time.sleep(delay)
+            attempt += 1
 
 
 class SplunkClient(object):
+    # Rendered action.* fields for each action profile, shared by every
+    # client in the process. Keyed by profile and a hash of its actions,
+    # so an edited profile is rendered afresh.
+    _renderedProfiles = {}
+
     class Severity(Enum):
         DEBUG = 1
         INFO = 2
@@ -33,17 +185,169 @@ class SplunkClient(object):
         Low = 4
         Lowest = 5
 
-    def __init__(self, host, port, username, password, verify=True):
+    def __init__(self, host, port, username=None, password=None,
+                 verify=True, pool=None, token=None, retry=None,
+                 timeout=None, deadline=None):
         self._host = host
         self._port = port
         self._creds = (username, password)
+        self._token = token
         self._baseUrl = 'https://{}:{}'.format(host, port)
         self._verify = verify
+        self._authLock = threading.Lock()
+        self._session = self._createSession(pool, retry, timeout)
+        # Bound logging in by the run's deadline too.
+        if deadline is not None:
+            self.setDeadline(deadline)
+        self._authenticate()
         self._testConnection()
 
+    def _createSession(self, pool, retry=None, timeout=None):
+        '''
+        Creates a pooled HTTP session shared by all calls to Splunk, so
+        that TCP connections and their TLS sessions are reused. Requests
+        Splunk turns away while busy are retried as set out in retry, and
+        each request waits at most timeout seconds.
+        '''
+        poolConfig = dict(DEFAULT_POOL)
+        poolConfig.update(pool or {})
+
+        session = requests.Session()
+        session.verify = self._verify
+        session.hooks['response'].append(self._reauthenticate)
+
+        self._limiter = AdaptiveLimiter(poolConfig['size'])
+        self._adapter = RetryAdapter(
+            self._limiter,
+            RetryPolicy(**(retry or {})),
+            timeout,
+            pool_connections=1,
+            pool_maxsize=poolConfig['size']
+        )
+        session.mount('https://', self._adapter)
+
+        if not poolConfig['keep_alive']:
+            session.headers['Connection'] = 'close'
+
+        return session
+
+    def _sessionKey(self, status, text):
+        '''
+        Returns: the session key from Splunk's response to a login
+        '''
+        if status != 200:
+            details = json.loads(text)['messages'][0]
+            raise SplunkConnectFailed(
+                'Could not log in to Splunk! {}: {}'.format(
+                    details['type'],
+                    details['text']
+                )
+            )
+
+        return json.loads(text)['sessionKey']
+
+    def _login(self):
+        '''
+        Logs in to Splunk with the configured username and password.
+
+        Returns: a session key for use in later calls
+        '''
+        try:
+            r = self._session.post(
+                '{}{}'.format(self._baseUrl, LOGIN_API),
+                data={
+                    'username': self._creds[0],
+                    'password': self._creds[1],
+                    'output_mode': 'json'
+                }
+            )
+        except requests.RequestException as e:
+            raise SplunkConnectFailed(
+                'Could not log in to Splunk! {}'.format(repr(e))
+            )
+
+        return self._sessionKey(r.status_code, r.text)
+
+    def _authenticate(self):
+        '''
+        Authenticates every later call made through the session, with the
+        pre-issued token if there is one, otherwise with a session key
+        from logging in once.
+        '''
+        if self._token:
+            authorization = 'Bearer {}'.format(self._token)
+        else:
+            authorization = 'Splunk {}'.format(self._login())
+
+        self._session.headers['Authorization'] = authorization
+
+    def _reauthenticate(self, r, **kwargs):
+        '''
+        Response hook that logs in again when Splunk rejects an expired
+        session key, then retries the request once with the new key.
+        '''
+        if r.status_code != 401 or self._token:
+            return r
+        if r.request.url.endswith(LOGIN_API):
+            return r
+
+        stale = r.request.headers.get('Authorization')
+        with self._authLock:
+            # Another thread may have already logged in again.
+            if self._session.headers.get('Authorization') == stale:
+                self._authenticate()
+
+        # Release the rejected response's connection back to the pool.
+        r.content
+        r.close()
+
+        request = r.request.copy()
+        request.headers['Authorization'] = self._session.headers[
+            'Authorization'
+        ]
+        request.hooks = {'response': []}
+
+        return self._session.send(request, **kwargs)
+
+    def setDeadline(self, deadline):
+        '''
+        Bounds every later request by the deadline of the current run.
+        '''
+        self._adapter.deadline = deadline
+
+    def requestStats(self):
+        '''
+        Returns: dict of how many requests to Splunk have been retried,
+                 and how many responses said Splunk was overloaded
+        '''
+        return self._limiter.stats()
+
+    def getServerInfo(self):
+        '''
+        Fetch basic details of the Splunk server, a cheap call that proves
+        it can be reached with our credentials.
+
+        Returns: dict of server details, e.g. serverName and version
+        '''
+        r = self._session.get(
+            '{}{}'.format(self._baseUrl, SERVER_INFO_API),
+            params={'output_mode': 'json'}
+        )
+
+        if r.status_code != 200:
+            details = json.loads(r.text)['messages'][0]
+            raise SplunkGetFailed('{}: {}'.format(
+                details['type'],
+                details['text']
+            ))
+
+        return json.loads(r.text)['entry'][0]['content']
+
     def _testConnection(self):
         try:
-            self.listSearches('search')
+            self.getServerInfo()
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             raise SplunkConnectFailed('Error: {} '.format(
                 getattr(e, 'message', repr(e))
@@ -55,97 +359,97 @@ class SplunkClient(object):
             SEARCH_API.format(app=app),
             searchName
         )
-        r = requests.get(url, auth=self._creds, verify=self._verify)
+        r = self._session.get(url)
 
         return True if r.status_code == 200 else False
 
-    def _mapActions(self, actionList):
+    @classmethod
+    def _renderActions(cls, actionList):
+        '''
+        Renders a list of alert actions into the action.* fields of a
+        search payload, as driven by ALERT_ACTIONS and EMAIL_INCLUDES.
+
+        Returns: dict of payload fields for the actions
+        '''
         extra = {}
+        actions = []
 
         for action in actionList:
             for name, config in action.items():
+                if name not in ALERT_ACTIONS:
+                    continue
+                if name == 'Send email' and not config:
+                    continue
 
-                if name == 'Add to Triggered Alerts':
-                    extra['alert.track'] = 1
-
-                if name == 'OpsGenie':
-                    if extra.get('actions'):
-                        extra['actions'] = extra['actions'] + ', opsgenie'
-                    else:
-                        extra['actions'] = 'opsgenie'
-                    extra['action.opsgenie'] = 1
-
-                if name == 'Send email' and config:
-                    if extra.get('actions'):
-                        extra['actions'] = extra['actions'] + ', email'
-                    else:
-                        extra['actions'] = 'email'
-
-                    extra['action.email'] = 1
-                    extra['action.email.to'] = config.get('To')
-
-                    if config.get('Priority'):
-                        extra['action.email.priority'] = getattr(
-                            self.Priority,
-                            config['Priority']
-                        ).value
-                    if config.get('Subject'):
-                        extra['action.email.subject'] = config['Subject']
+                actionName, fields = ALERT_ACTIONS[name]
+                if actionName:
+                    actions.append(actionName)
+                extra.update(fields)
 
-                    if config.get('Message'):
-                        extra['action.email.message'] = config['Message']
+                if name == 'Send email':
+                    extra.update(cls._emailFields(config))
 
-                    if 'Link to Alert' in config['Include']:
-                        extra['action.email.include.view_link'] = 1
+        if actions:
+            extra['actions'] = ', '.join(actions)
 
-                    if 'Link to Results' in config['Include']:
-                        extra['action.email.include.results_link'] = 1
+        if extra != {}:
+            return extra
+        else:
+            raise ConfigValidateFailed(
+                'No valid action specified! {}'.format(actionList)
+            )
 
-                    if 'Search String' in config['Include']:
-                        extra['action.email.include.search'] = 1
+    @classmethod
+    def _emailFields(cls, config):
+        extra = {'action.email.to': config.get('To')}
 
-                    if 'Inline Table' in config['Include']:
-                        extra['action.email.inline'] = 1
-                        extra['action.email.include.inline'] = 1
-                        extra['action.email.include.format'] = 'table'
+        if config.get('Priority'):
+            extra['action.email.priority'] = getattr(
+                cls.Priority,
+                config['Priority']
+            ).value
+        if config.get('Subject'):
+            extra['action.email.subject'] = config['Subject']
 
-                    if 'Inline Raw' in config['Include']:
-                        extra['action.email.inline'] = 1
-                        extra['action.email.include.inline'] = 1
-                        extra['action.email.include.format'] = 'raw'
+        if config.get('Message'):
+            extra['action.email.message'] = config['Message']
 
-                    if 'Inline CSV' in config['Include']:
-                        extra['action.email.inline'] = 1
-                        extra['action.email.include.inline'] = 1
-                        extra['action.email.include.format'] = 'csv'
+        include = set(config.get('Include') or ())
+        for option, fields in EMAIL_INCLUDES.items():
+            if option in include:
+                extra.update(fields)
 
-                    if 'Trigger Condition' in config['Include']:
-                        extra['action.email.include.trigger'] = 1
+        if config.get('Type') == 'Plain':
+            extra['action.email.content_type'] = 'plain'
 
-                    if 'Trigger Time' in config['Include']:
-                        extra['action.email.include.trigger_time'] = 1
+        return extra
 
-                    if 'Attach CSV' in config['Include']:
-                        extra['action.email.sendcsv'] = 1
+    @classmethod
+    def _mapActions(cls, actionList, profile=None):
+        '''
+        Renders the action.* fields for a search's actions. Actions taken
+        from a named action profile (see loader.loadProfiles) are rendered
+        once per distinct profile, then shared by every search using it,
+        so must not be modified.
 
-                    if 'Attach PDF' in config['Include']:
-                        extra['action.email.sendpdf'] = 1
+        Returns: dict of payload fields for the actions
+        '''
+        if profile is None:
+            return cls._renderActions(actionList)
 
-                    if 'Allow Empty Attachment' in config['Include']:
-                        extra['action.email.allow_empty_attachment'] = 1
+        rendered = cls._renderedProfiles.get(profile)
+        if rendered is None:
+            rendered = cls._renderActions(actionList)
+            cls._renderedProfiles[profile] = rendered
 
-                    if config.get('Type') and config.get('Type') == 'Plain':
-                        extra['action.email.content_type'] = 'plain'
-        if extra != {}:
-            return extra
-        else:
-            raise ConfigValidateFailed(
-                'No valid action specified! {}'.format(actionList)
-            )
+        return rendered
 
-    def deploySearch(self, app, searchName, searchConfig):
+    @classmethod
+    def renderPayload(cls, searchConfig):
         '''
-        Updates a Splunk saved search, creating if it does not already exist.
+        Renders the REST payload for a search config, as sent to Splunk
+        by deploySearch. Needs no connection to Splunk, so content can be
+        rendered ahead of time (see bundle.compileBundle).
         '''
         payload = {
             'search': searchConfig['search'],
@@ -153,33 +457,65 @@ class SplunkClient(object):
             'cron_schedule': searchConfig['cron_schedule'],
             'is_scheduled': searchConfig['is_scheduled'],
             'alert.severity': getattr(
-                self.Severity,
+                cls.Severity,
                 searchConfig['severity']
             ).value,
             'dispatch.earliest_time': searchConfig['lookback'],
             'dispatch.latest_time': 'now'
         }
         payload.update(
-            self._mapActions(searchConfig['actions'])
+            cls._mapActions(
+                searchConfig['actions'],
+                searchConfig.get('action_profile')
+            )
         )
+
+        return payload
+
+    def deploySearch(self, app, searchName, searchConfig, index=None):
+        '''
+        Updates a Splunk saved search, creating if it does not already exist.
+
+        If an index of the app's current searches (from getSearchIndex) is
+        given, it is used to decide whether the search exists, rather than
+        asking Splunk.
+        '''
+        return self.deployPayload(
+            app,
+            searchName,
+            self.renderPayload(searchConfig),
+            index=index
+        )
+
+    def deployPayload(self, app, searchName, payload, index=None):
+        '''
+        Sends an already rendered payload (see renderPayload) to Splunk,
+        creating the search if it does not already exist.
+        '''
+        payload = dict(payload)
         url = '{}{}'.format(self._baseUrl, SEARCH_API.format(app=app))
 
-        if self._searchExists(app, searchName):
+        if index is not None:
+            exists = searchName in index
+        else:
+            exists = self._searchExists(app, searchName)
+
+        if exists:
             url = '{}/{}'.format(url, searchName)
         else:
             payload['name'] = searchName
 
         url = url + '?output_mode=json'
 
-        r = requests.post(
-            url,
-            auth=self._creds,
-            data=payload,
-            verify=self._verify
-        )
+        r = self._session.post(url, data=payload)
 
         if r.status_code == 200 or r.status_code == 201:
-            validated, error = self._validateSearch(app, searchName, payload)
+            validated, error = self._validateSearch(
+                app,
+                searchName,
+                payload,
+                response=r.text
+            )
             if not validated:
                 raise SplunkValidateFailed(
                     'Search seemed to deploy, but validation failed! \n'
@@ -204,25 +540,183 @@ class SplunkClient(object):
 
         return sorted(actions1) == sorted(actions2)
 
-    def _validateSearch(self, app, searchName, searchConfig):
+    def _compareContent(self, app, searchName, payload, content):
+        '''
+        Compares a rendered payload against a search's content in Splunk.
+
+        Returns: True, '' if every value in the payload matches
+                 False, error message if not.
+        '''
+        # Check each value in our config and ensure it matches
+        # what is configured in Splunk.
+        for key, value in payload.items():
+            if key == 'name':
+                continue
+
+            current = content.get(key)
+
+            if not (
+                (
+                    key in content and str(current) == str(value)
+                ) or (
+                    current == value
+                )
+            ):
+                if (
+                    (key != 'actions') or (
+                        key == 'actions' and not self._compareActions(
+                            payload['actions'],
+                            current or ''
+                        )
+                    )
+                ):
+                    error = (
+                        "Validation of search '{}' in app '{}' "
+                        'failed! Field {} has unexpected value {} '
+                        '(expected {}).'.format(
+                            searchName,
+                            app,
+                            key,
+                            current,
+                            value
+                        ))
+                    return False, error
+        return True, ''
+
+    def searchMatches(self, app, searchName, payload, index):
+        '''
+        Checks whether a search already exists in Splunk exactly as the
+        rendered payload would configure it, using an index from
+        getSearchIndex.
+
+        Returns: True if deploying the payload would change nothing
+                 False if not.
+        '''
+        if searchName not in index:
+            return False
+
+        matches, _ = self._compareContent(
+            app,
+            searchName,
+            payload,
+            index[searchName].get('content', {})
+        )
+        return matches
+
+    def _responseEntries(self, response):
+        '''
+        Extracts the search entries, with their content, from the body of
+        a Splunk response.
+
+        Returns: list of entries, empty if the body holds no content
+        '''
+        try:
+            body = json.loads(response)
+        except (TypeError, ValueError):
+            return []
+
+        return [
+            search for search in body.get('entry') or []
+            if search.get('content')
+        ]
+
+    def _validateSearch(self, app, searchName, searchConfig, response=None):
         '''
         Validates a Splunk saved search exists matching the specified config.
 
+        If the body of Splunk's response to the deploy is given, and holds
+        the search's content, that is validated directly. Otherwise the
+        search is fetched from Splunk.
+
         Returns: True if search on Splunk matches the expected config
                  False if not.
         '''
+        entries = self._responseEntries(response)
 
-        url = '{}{}/{}?output_mode=json'.format(
-            self._baseUrl,
-            SEARCH_API.format(app=app),
-            searchName
-        )
+        if not entries:
+            url = '{}{}/{}?output_mode=json'.format(
+                self._baseUrl,
+                SEARCH_API.format(app=app),
+                searchName
+            )
 
-        if not self._searchExists(app, searchName):
-            return False, 'Search does not exist!'
+            r = self._session.get(url)
 
-        else:
-            r = requests.get(url, auth=self._creds, verify=self._verify)
+            if r.status_code == 404:
+                return False, 'Search does not exist!'
+
+            elif r.status_code != 200:
+                details = json.loads(r.text)['messages'][0]
+                raise SplunkGetFailed('{}: {}'.format(
+                    details['type'],
+                    details['text']
+                ))
+
+            entries = json.loads(r.text)['entry']
+
+        for search in entries:
+            # Search name does not match. Shouldn't ever be
+            # possible as we've fetched the current config
+            # using this name, but let's be paranoid and check!
+            if search['name'] != searchName:
+                return False, 'Search name does not match!'
+
+            return self._compareContent(
+                app,
+                searchName,
+                searchConfig,
+                search['content']
+            )
+
+    def _listingApi(self, app):
+        if app is None:
+            return INVENTORY_API
+        return SEARCH_API.format(app=app)
+
+    def _pageParams(self, offset, pageSize, fields, search=None):
+        params = [
+            ('output_mode', 'json'),
+            ('count', pageSize),
+            ('offset', offset)
+        ]
+        params.extend(('f', field) for field in fields or [])
+        if search:
+            params.append(('search', search))
+        return params
+
+    def _nextPage(self, body, offset, pageSize):
+        '''
+        Works out where the page after a listing response starts.
+
+        Returns: (entries in this page, offset of the next page or None
+                  if this was the last)
+        '''
+        entries = body.get('entry') or []
+        offset += len(entries)
+        total = (body.get('paging') or {}).get('total')
+
+        if len(entries) < pageSize or (total is not None and offset >= total):
+            return entries, None
+        return entries, offset
+
+    def _searchPages(self, app, fields=None, pageSize=None, search=None):
+        '''
+        Fetches the searches in an app a page at a time, optionally only
+        the given content fields (wildcards allowed), and only those
+        matching a Splunk search filter. If app is None, the searches in
+        every app are fetched.
+
+        Returns: generator of lists of search entries
+        '''
+        url = '{}{}'.format(self._baseUrl, self._listingApi(app))
+        pageSize = pageSize or PAGE_SIZE
+        offset = 0
+
+        while offset is not None:
+            r = self._session.get(
+                url,
+                params=self._pageParams(offset, pageSize, fields, search)
+            )
 
             if r.status_code != 200:
                 details = json.loads(r.text)['messages'][0]
@@ -231,58 +725,93 @@ class SplunkClient(object):
                     details['text']
                 ))
 
-            response = json.loads(r.text)
-
-            for search in response['entry']:
-                # Search name does not match. Shouldn't ever be
-                # possible as we've fetched the current config
-                # using this name, but let's be paranoid and check!
-                if search['name'] != searchName:
-                    return False, 'Search name does not match!'
-
-                searchConfig.pop('name', None)
-
-                # Check each value in our config and ensure it matches
-                # what is configured in Splunk.
-                for key, value in searchConfig.items():
-                    if not (
-                        (
-                            str(search['content'][key]) == str(value)
-                        ) or (
-                            search['content'][key] == value
-                        )
-                    ):
-                        if (
-                            ( key != 'actions') or (
-                                key == 'actions' and not self._compareActions(
-                                    searchConfig['actions'],
-                                    search['content']['actions']
-                                )
-                            )
-                        ):
-                            error = (
-                                "Validation of search '{}' in app '{}' "
-                                'failed! Field {} has unexpected value {} '
-                                '(expected {}).'.format(
-                                    searchName,
-                                    app,
-                                    key,
-                                    search['content'][key],
-                                    value
-                                ))
-                            return False, error
-                return True, ''
-
-    def listSearches(self, app):
+            entries, offset = self._nextPage(
+                json.loads(r.text),
+                offset,
+                pageSize
+            )
+            yield entries
+
+    def iterSearches(self, app, fields=None, pageSize=None, search=None):
+        '''
+        Iterate over every search in a given app, fetching them from
+        Splunk a page at a time as needed.
+        '''
+        for page in self._searchPages(
+            app,
+            fields=fields,
+            pageSize=pageSize,
+            search=search
+        ):
+            yield from page
+
+    def listSearches(self, app, pageSize=None):
         '''
         List all searches in a given app
+
+        Returns: generator of search names
+        '''
+        for search in self.iterSearches(
+            app,
+            fields=NAME_FIELDS,
+            pageSize=pageSize
+        ):
+            yield search['name']
+
+    def getSearchIndex(self, app):
         '''
-        url = '{}{}?output_mode=json'.format(
+        Fetch the current state of all searches in a given app, with only
+        the content needed to compare them against rendered payloads.
+
+        Returns: dict of search name to its Splunk entry (incl. content)
+        '''
+        index = {}
+
+        for search in self.iterSearches(app, fields=INDEX_FIELDS):
+            index[search['name']] = search
+        return index
+
+    def _inventoryFilter(self, apps):
+        '''
+        Returns: Splunk search filter matching only the searches owned by
+                 the given apps
+        '''
+        return ' OR '.join(
+            'eai:acl.app="{}"'.format(app) for app in sorted(apps)
+        )
+
+    def _inventoryApp(self, search):
+        '''
+        Returns: the app a search from the inventory belongs to, or None
+                 if it is another user's private search, which the admin
+                 namespace used for deploys cannot see
+        '''
+        acl = search.get('acl') or {}
+
+        if acl.get('sharing') == 'user' and acl.get('owner') != 'admin':
+            return None
+        return acl.get('app')
+
+    def getSearch(self, app, searchName):
+        '''
+        Fetch a single search, with the same content as getSearchIndex.
+
+        Returns: the search's Splunk entry, or None if it does not exist
+        '''
+        url = '{}{}/{}'.format(
             self._baseUrl,
-            SEARCH_API.format(app=app)
+            SEARCH_API.format(app=app),
+            searchName
+        )
+        r = self._session.get(
+            url,
+            params=[('output_mode', 'json')] + [
+                ('f', field) for field in INDEX_FIELDS
+            ]
         )
 
-        r = requests.get(url, auth=self._creds, verify=self._verify)
+        if r.status_code == 404:
+            return None
 
         if r.status_code != 200:
             details = json.loads(r.text)['messages'][0]
@@ -291,12 +820,35 @@ class SplunkClient(object):
                 details['text']
             ))
 
-        response = json.loads(r.text)
-        searchlist = []
+        return json.loads(r.text)['entry'][0]
 
-        for search in response.get('entry'):
-            searchlist.append(search['name'])
-        return searchlist
+    def getInventory(self, apps, fields=INDEX_FIELDS):
+        '''
+        Fetch the current state of all searches in the given apps, with a
+        single listing across every app rather than one listing per app.
+        Searches are grouped by the app that owns them (eai:acl.app), and
+        Splunk is asked to leave out other apps' searches. Given
+        NAME_FIELDS, only each search's name and update time are listed,
+        without its content.
+
+        Returns: dict of app to its search index, as from getSearchIndex
+        '''
+        inventory = {app: {} for app in apps}
+
+        if not inventory:
+            return inventory
+
+        for search in self.iterSearches(
+            None,
+            fields=fields,
+            search=self._inventoryFilter(inventory)
+        ):
+            # Splunk's filter is also checked here, as it can't leave out
+            # other users' private searches.
+            app = self._inventoryApp(search)
+            if app in inventory:
+                inventory[app][search['name']] = search
+        return inventory
 
     def deleteSearch(self, app, searchName):
         '''
@@ -308,7 +860,7 @@ class SplunkClient(object):
             searchName
         )
 
-        r = requests.delete(url, auth=self._creds, verify=self._verify)
+        r = self._session.delete(url)
 
         if r.status_code != 200:
             details = json.loads(r.text)['messages'][0]
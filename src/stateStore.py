@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import threading
+
+from datetime import datetime
+
+# Bump whenever the payload SADFACE renders for a given source changes,
+# so that state recorded by older versions is ignored.
+STATE_VERSION = 1
+# Splunk may report conf-backed entries as updated at the epoch, whatever
+# has been changed since. No real update is this old.
+EPOCH_YEAR = 1970
+
+
+def fingerprint(value):
+    '''
+    Returns: stable hash of any JSON serialisable value
+    '''
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()
+
+
+def knownUpdate(updated):
+    '''
+    Returns: True if Splunk's 'updated' timestamp for a search can be
+             relied on to change whenever the search does
+             False if it is missing, unreadable or at the epoch.
+    '''
+    if not isinstance(updated, str):
+        return False
+
+    try:
+        when = datetime.fromisoformat(updated.replace('Z', '+00:00'))
+    except ValueError:
+        return False
+
+    return when.year > EPOCH_YEAR
+
+
+class LocalStateStore(object):
+    '''
+    Keeps deploy state in a JSON file on the local filesystem.
+    '''
+
+    def __init__(self, path):
+        self._path = path
+
+    def load(self):
+        if not os.path.exists(self._path):
+            return {}
+
+        with open(self._path) as f:
+            return json.load(f)
+
+    def save(self, state):
+        with open(self._path, 'w') as f:
+            json.dump(state, f, sort_keys=True)
+
+
+class S3StateStore(object):
+    '''
+    Keeps deploy state in a JSON object in S3, for use from Lambda.
+    '''
+
+    def __init__(self, bucket, key):
+        import boto3
+
+        self._bucket = bucket
+        self._key = key
+        self._client = boto3.client('s3')
+
+    def load(self):
+        try:
+            response = self._client.get_object(
+                Bucket=self._bucket,
+                Key=self._key
+            )
+        except self._client.exceptions.NoSuchKey:
+            return {}
+
+        return json.loads(response['Body'].read())
+
+    def save(self, state):
+        self._client.put_object(
+            Bucket=self._bucket,
+            Key=self._key,
+            Body=json.dumps(state, sort_keys=True).encode('utf-8')
+        )
+
+
+def getStateStore(config, section='state'):
+    '''
+    Creates the state store described by a section of the general config,
+    such as general.state.
+
+    Returns: a state store, or None if the section is not configured
+    '''
+    stateConfig = config['general'].get(section)
+
+    if not stateConfig:
+        return None
+
+    if stateConfig['backend'] == 's3':
+        return S3StateStore(
+            bucket=stateConfig['bucket'],
+            key=stateConfig['key']
+        )
+    return LocalStateStore(stateConfig['path'])
+
+
+class DeployState(object):
+    '''
+    Fingerprints of each managed search as of its last deploy, used to
+    skip searches that have changed neither in code nor in Splunk.
+
+    Records for each search a hash of its source config, plus the
+    'updated' timestamp Splunk reported for it. Payloads are not hashed,
+    as a given source always renders the same payload (see
+    STATE_VERSION). Safe to record into from several threads at once.
+    '''
+
+    def __init__(self, store=None):
+        self._store = store
+        self._lock = threading.Lock()
+        self._searches = {}
+
+        if store is not None:
+            state = store.load()
+            if state.get('version') == STATE_VERSION:
+                self._searches = state.get('searches', {})
+
+    def _key(self, app, searchName):
+        return '{}/{}'.format(app, searchName)
+
+    def hasChanged(self, app, searchName, source):
+        '''
+        Returns: True if a search's source differs from when it was last
+                 deployed, or it has not been deployed before
+                 False if not.
+        '''
+        record = self._searches.get(self._key(app, searchName))
+
+        return record is None or record['source'] != source
+
+    def isEmpty(self):
+        '''
+        Returns: True if no search has been recorded, so none can be
+                 skipped
+                 False if not.
+        '''
+        return not self._searches
+
+    def isUnchanged(self, app, searchName, source, entry):
+        '''
+        Checks whether a search's source and its state in Splunk are both
+        as they were when last deployed. This assumes Splunk's 'updated'
+        timestamp moves whenever a search is edited, including in the UI.
+        Timestamps that can't be trusted to (see knownUpdate) are treated
+        as unknown, so the search's content is compared instead.
+
+        Returns: True if the search can safely be skipped
+                 False if not.
+        '''
+        record = self._searches.get(self._key(app, searchName))
+
+        if record is None or entry is None:
+            return False
+
+        if not knownUpdate(record['updated']):
+            return False
+
+        return (record['source'], record['updated']) == (
+            source,
+            entry.get('updated')
+        )
+
+    def record(self, app, searchName, source, updated=None):
+        '''
+        Records a search as deployed. If Splunk's timestamp for the search
+        is not known (because it was just changed), it is picked up on
+        the next run.
+        '''
+        with self._lock:
+            self._searches[self._key(app, searchName)] = {
+                'source': source,
+                'updated': updated
+            }
+
+    def export(self, searches):
+        '''
+        Returns: dict of the records for the given (app, search name) pairs,
+                 to hand to another DeployState's merge()
+        '''
+        keys = (self._key(app, searchName) for app, searchName in searches)
+        return {
+            key: self._searches[key] for key in keys if key in self._searches
+        }
+
+    def merge(self, records):
+        '''
+        Takes on records exported by another DeployState, such as one used
+        to deploy a shard of the content in another process.
+        '''
+        with self._lock:
+            self._searches.update(records)
+
+    def save(self, managed):
+        '''
+        Persists state for the given managed (app, search name) pairs,
+        dropping records for searches no longer managed.
+        '''
+        if self._store is None:
+            return
+
+        keys = set(self._key(app, searchName) for app, searchName in managed)
+        self._store.save({
+            'version': STATE_VERSION,
+            'searches': {
+                key: record for key, record in self._searches.items()
+                if key in keys
+            }
+        })
@@ -0,0 +1,191 @@
+import random
+import threading
+import time
+
+from email.utils import parsedate_to_datetime
+
+# Statuses worth sending the same request again for.
+RETRY_STATUSES = (429, 502, 503, 504)
+# Statuses with which Splunk signals it is overloaded. Splunk has not
+# acted on a request turned away with one of these, so even requests that
+# must not be sent twice can be retried after them.
+THROTTLE_STATUSES = (429, 503)
+DEFAULT_RETRY = {
+    'retries': 4,
+    'backoff': 0.5,
+    'max_backoff': 30
+}
+
+
+class RetryPolicy(object):
+    '''
+    Decides whether, and after how long, to retry a request to Splunk.
+    Waits grow exponentially with each attempt, with full jitter so that
+    parallel workers don't retry in lockstep, unless Splunk says how long
+    to wait with a Retry-After header.
+    '''
+
+    def __init__(self, retries=None, backoff=None, max_backoff=None):
+        if retries is None:
+            retries = DEFAULT_RETRY['retries']
+
+        self.retries = retries
+        self._backoff = backoff or DEFAULT_RETRY['backoff']
+        self._maxBackoff = max_backoff or DEFAULT_RETRY['max_backoff']
+
+    def shouldRetry(self, status, attempt, idempotent=True):
+        '''
+        Returns: True if a request that got the given status should be
+                 sent again. A gateway error (502, 504) may come after
+                 Splunk has acted on the request, so requests that are
+                 not idempotent are only retried when throttled.
+                 False if not.
+        '''
+        statuses = RETRY_STATUSES if idempotent else THROTTLE_STATUSES
+        return status in statuses and attempt < self.retries
+
+    def _retryAfter(self, value):
+        '''
+        Returns: seconds to wait from a Retry-After header, given either as
+                 seconds or as an HTTP date, or None if it can't be read
+        '''
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            pass
+
+        try:
+            return parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError, IndexError):
+            return None
+
+    def delay(self, attempt, retryAfter=None):
+        '''
+        Returns: seconds to wait before retrying, after the given number of
+                 earlier retries
+        '''
+        wait = self._retryAfter(retryAfter) if retryAfter else None
+
+        if wait is None:
+            wait = random.uniform(0, self._backoff * 2 ** attempt)
+
+        return min(max(wait, 0), self._maxBackoff)
+
+
+class AimdLimit(object):
+    '''
+    Additive increase / multiplicative decrease of how many requests may
+    be in flight to Splunk at once. The limit halves whenever Splunk
+    signals it is overloaded, then climbs back by one for every window
+    of requests that succeed. Requests already sent when the limit last
+    halved were turned away by the same overload, so their throttles
+    don't halve it again. Also counts retries and throttles, for the run
+    summary.
+
+    Not safe to use directly from several threads; see AdaptiveLimiter.
+    '''
+
+    def __init__(self, maximum, minimum=1):
+        self._max = maximum
+        self._min = minimum
+        self._limit = float(maximum)
+        self._inFlight = 0
+        # Requests started so far, and how many had been when the limit
+        # last halved.
+        self._sent = 0
+        self._decreasedAt = 0
+        self.retries = 0
+        self.throttled = 0
+
+    @property
+    def limit(self):
+        return max(self._min, int(self._limit))
+
+    def _hasCapacity(self):
+        return self._inFlight < self.limit
+
+    def _start(self):
+        '''
+        Returns: number identifying the request, in the order started
+        '''
+        self._inFlight += 1
+        self._sent += 1
+        return self._sent
+
+    def _record(self, status, retrying, sent=None):
+        if retrying:
+            self.retries += 1
+
+        if status in THROTTLE_STATUSES:
+            self.throttled += 1
+            if sent is None or sent > self._decreasedAt:
+                self._limit = max(self._min, self._limit / 2)
+                self._decreasedAt = self._sent
+        elif status < 500:
+            self._limit = min(self._max, self._limit + 1 / self._limit)
+
+    def stats(self):
+        '''
+        Returns: dict of the number of retries and throttled responses
+        '''
+        return {'retries': self.retries, 'throttled': self.throttled}
+
+
+class AdaptiveLimiter(AimdLimit):
+    '''
+    AimdLimit shared between threads. Use as a context manager around
+    each request, passing the number it gives on to record().
+    '''
+
+    def __init__(self, maximum, minimum=1):
+        super().__init__(maximum, minimum)
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        with self._condition:
+            self._condition.wait_for(self._hasCapacity)
+            return self._start()
+
+    def __exit__(self, *exc):
+        with self._condition:
+            self._inFlight -= 1
+            self._condition.notify_all()
+
+    def record(self, status, retrying=False, sent=None):
+        '''
+        Records Splunk's response to a request, adjusting the limit. sent
+        is the number the request was given on entering the limiter.
+        '''
+        with self._condition:
+            self._record(status, retrying, sent)
+            self._condition.notify_all()
+
+
+class AsyncAdaptiveLimiter(AimdLimit):
+    '''
+    AimdLimit shared between coroutines. Use as an async context manager
+    around each request, passing the number it gives on to record(). Must
+    be created inside the event loop using it.
+    '''
+
+    def __init__(self, maximum, minimum=1):
+        # Imported here so the sync client doesn't pay for asyncio.
+        import asyncio
+
+        super().__init__(maximum, minimum)
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(self._hasCapacity)
+            return self._start()
+
+    async def __aexit__(self, *exc):
+        async with self._condition:
+            self._inFlight -= 1
+            self._condition.notify_all()
+
+    async def record(self, status, retrying=False, sent=None):
+        async with self._condition:
+            self._record(status, retrying, sent)
+            self._condition.notify_all()
@@ -1,16 +1,40 @@
+import json
+import os
+
 from cerberus import Validator
-from benedict import benedict
+from functools import lru_cache
 
 from exceptions import ConfigValidateFailed
 
+SCHEMA_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'schemas'
+)
+SEARCH_SCHEMA = os.path.join(SCHEMA_DIR, 'search.json')
+
+
+@lru_cache(maxsize=None)
+def getValidator(schemafile, purge_unknown=False):
+    '''
+    Loads a schema and builds its validator, once per process. The
+    validator is reused for every document, so must not be shared
+    between threads.
+
+    The schema is kept as a plain dict, as Cerberus copies and walks it
+    on every validation.
+    Returns: Cerberus validator for the schema
+    '''
+    with open(schemafile) as f:
+        schema = json.load(f)
+    return Validator(schema, purge_unknown=purge_unknown)
+
 
 def getValidSearch(config):
     '''
     Validates a search definition, removing unknown values
     Returns: Validated document after purge
     '''
-    schema = benedict.from_json('src/schemas/search.json')
-    v = Validator(schema, purge_unknown=True)
+    v = getValidator(SEARCH_SCHEMA, purge_unknown=True)
     validated = {}
     for searchname, search in config.items():
         if not (v.validate(search)):
@@ -25,13 +49,42 @@ def getValidSearch(config):
     return validated
 
 
+@lru_cache(maxsize=None)
+def getProfileValidator():
+    '''
+    Builds a validator for action profiles, which hold the same list of
+    actions as a search would, once per process.
+    Returns: Cerberus validator for a profile's actions
+    '''
+    with open(SEARCH_SCHEMA) as f:
+        rule = json.load(f)['actions']
+    rule.pop('excludes', None)
+    return Validator({'actions': rule})
+
+
+def getValidProfile(name, actions):
+    '''
+    Validates the actions of an action profile
+    Returns: Validated actions
+    '''
+    v = getProfileValidator()
+    if not (v.validate({'actions': actions})):
+        raise ConfigValidateFailed(
+            "Validation of action profile '{}' failed! Error(s): {}".format(
+                name,
+                v.errors['actions']
+            )
+        )
+
+    return v.document['actions']
+
+
 def validateConfig(config, schemafile):
     '''
     Validates a search definition, removing unknown values
     Returns: Validated document after purge
     '''
-    schema = benedict.from_json(schemafile)
-    v = Validator(schema)
+    v = getValidator(schemafile)
     if not (v.validate(config)):
         raise ConfigValidateFailed(
             "Validation of SAD config failed! Error(s): {}".format(
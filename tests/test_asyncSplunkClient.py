@@ -0,0 +1,414 @@
+import aiohttp
+import asyncio
+import json
+import unittest
+import asyncSplunkClient
+
+from asyncSplunkClient import AsyncSplunkClient
+from deadline import Deadline
+from throttle import AsyncAdaptiveLimiter, RetryPolicy
+
+from exceptions import SplunkConnectFailed, SplunkGetFailed
+from exceptions import SplunkValidateFailed, SplunkUpdateFailed
+from exceptions import DeadlineExceeded
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+
+VALID_SCONFIG = {
+    'search': 'index=*',
+    'description': 'Test',
+    'cron_schedule': '* * * * *',
+    'is_scheduled': 1,
+    'severity': 'High',
+    'lookback': '24h',
+    'actions': [{'Add to Triggered Alerts': None}]
+}
+
+RESPONSE = '''{
+    "messages": [
+        {
+            "type": "test",
+            "text": "This is a test."
+        }
+    ],
+    "entry": [
+        {
+            "name": "test",
+            "content": {
+                "search": "index=*",
+                "description": "Test",
+                "alert.track": 1
+            }
+        }
+    ]
+}'''
+
+
+def makeClient(*responses):
+    client = AsyncSplunkClient(
+        host='splunk.internal',
+        port=8089,
+        username='michael.j.fox',
+        password='TeenWolf2021'
+    )
+    client._baseUrl = ''
+    client._limiter = AsyncAdaptiveLimiter(10)
+    client._retryPolicy = RetryPolicy()
+    client._request = AsyncMock(side_effect=list(responses))
+    return client
+
+
+class TestInitAsyncClient(unittest.IsolatedAsyncioTestCase):
+
+    @patch.object(asyncSplunkClient.AsyncSplunkClient, 'getServerInfo')
+    @patch.object(asyncSplunkClient.AsyncSplunkClient, '_login')
+    async def test_connect(self, mk_login, mk_list):
+        mk_login.return_value = 'abc123'
+        client = await AsyncSplunkClient.connect(
+            host='splunk.internal',
+            port=8089,
+            username='michael.j.fox',
+            password='TeenWolf2021',
+            pool={'size': 4}
+        )
+
+        self.assertIsInstance(client, AsyncSplunkClient)
+        assert client._session.connector.limit == 4
+        assert client._authorization == 'Splunk abc123'
+        await client.close()
+
+    @patch.object(asyncSplunkClient.AsyncSplunkClient, 'getServerInfo')
+    @patch.object(asyncSplunkClient.AsyncSplunkClient, '_login')
+    async def test_connectToken(self, mk_login, mk_list):
+        client = await AsyncSplunkClient.connect(
+            host='splunk.internal',
+            port=8089,
+            token='DeLorean88'
+        )
+
+        assert client._authorization == 'Bearer DeLorean88'
+        mk_login.assert_not_awaited()
+        await client.close()
+
+    @patch.object(asyncSplunkClient.AsyncSplunkClient, 'close')
+    async def test_connectDeadline(self, mk_close):
+        with self.assertRaises(DeadlineExceeded):
+            await AsyncSplunkClient.connect(
+                host='splunk.internal',
+                port=8089,
+                username='michael.j.fox',
+                password='TeenWolf2021',
+                deadline=Deadline(0)
+            )
+
+        mk_close.assert_awaited_once()
+
+    @patch.object(asyncSplunkClient.AsyncSplunkClient, 'getServerInfo')
+    @patch.object(asyncSplunkClient.AsyncSplunkClient, '_login')
+    async def test_connectFail(self, mk_login, mk_info):
+        mk_info.side_effect = SplunkGetFailed
+
+        with self.assertRaises(SplunkConnectFailed):
+            await AsyncSplunkClient.connect(
+                host='splunk.internal',
+                port=8089,
+                username='michael.j.fox',
+                password='TeenWolf2021'
+            )
+
+    async def test_login(self):
+        for response in (
+            (401, '{"messages": [{"type": "WARN", "text": "Login failed"}]}'),
+            aiohttp.ClientConnectionError()
+        ):
+            client = makeClient()
+            client._send = AsyncMock(side_effect=[response])
+
+            with self.assertRaises(SplunkConnectFailed):
+                await client._login()
+
+        client._send = AsyncMock(return_value=(200, '{"sessionKey": "abc123"}'))
+        assert await client._login() == 'abc123'
+        assert client._send.call_args[1]['data']['password'] == 'TeenWolf2021'
+
+
+class TestAsyncSplunkAPI(unittest.IsolatedAsyncioTestCase):
+
+    async def test_searchExists(self):
+        for status, expected in ((200, True), (404, False)):
+            client = makeClient((status, ''))
+
+            assert await client._searchExists(app='test', searchName='test') == expected
+
+    async def test_deploySearch(self):
+        for status, suffix in ((200, '/test'), (201, '')):
+            client = makeClient((status, RESPONSE))
+            client._validateSearch = AsyncMock(return_value=(True, ''))
+            index = {'test': {}} if status == 200 else {}
+
+            result = await client.deploySearch('test', 'test', VALID_SCONFIG, index=index)
+
+            assert result == status
+            url = client._request.call_args[0][1]
+            assert url == '/servicesNS/admin/test/saved/searches{}?output_mode=json'.format(suffix)
+
+    async def test_deployPayloadNoneOmitted(self):
+        client = makeClient((201, RESPONSE))
+        client._validateSearch = AsyncMock(return_value=(True, ''))
+        searchconfig = dict(VALID_SCONFIG, actions=[
+            {'Send email': {'Subject': 'Alert'}}
+        ])
+        payload = client.renderPayload(searchconfig)
+        assert payload['action.email.to'] is None
+
+        await client.deployPayload('test', 'test', payload, index={})
+
+        data = client._request.call_args[1]['data']
+        assert 'action.email.to' not in data
+        assert data['action.email.subject'] == 'Alert'
+        assert 'None' not in data.values()
+
+    async def test_deployFailed(self):
+        client = makeClient((200, ''), (404, RESPONSE))
+
+        with self.assertRaises(SplunkUpdateFailed):
+            await client.deploySearch('test', 'test', VALID_SCONFIG)
+
+    async def test_validateFailedDeploy(self):
+        client = makeClient((201, RESPONSE))
+        client._validateSearch = AsyncMock(return_value=(False, ''))
+
+        with self.assertRaises(SplunkValidateFailed):
+            await client.deploySearch('test', 'test', VALID_SCONFIG, index={})
+
+    async def test_validateSuccess(self):
+        client = makeClient((200, RESPONSE))
+
+        result = await client._validateSearch(
+            'test', 'test', {'search': 'index=*', 'alert.track': '1'}
+        )
+        assert result == (True, '')
+
+    async def test_validateFailed(self):
+        for response, searchName, expected in (
+            ((404, RESPONSE), 'test', 'Search does not exist!'),
+            ((200, RESPONSE), 'test2', 'Search name does not match!')
+        ):
+            client = makeClient(response)
+
+            result, error = await client._validateSearch('test', searchName, {})
+            self.assertFalse(result)
+            assert error == expected
+
+    async def test_validateFromResponse(self):
+        client = makeClient()
+
+        result = await client._validateSearch(
+            'test', 'test', {'search': 'index=*'}, response=RESPONSE
+        )
+        assert result == (True, '')
+        client._request.assert_not_awaited()
+
+    async def test_validateResponseFallback(self):
+        client = makeClient((200, RESPONSE))
+
+        result = await client._validateSearch(
+            'test', 'test', {'search': 'index=*'}, response='{"entry": []}'
+        )
+        assert result == (True, '')
+        client._request.assert_awaited_once()
+
+    async def test_validateFailedGet(self):
+        client = makeClient((500, RESPONSE))
+
+        with self.assertRaises(SplunkGetFailed):
+            await client._validateSearch('test', 'test', {})
+
+    async def test_listSearches(self):
+        client = makeClient((200, RESPONSE), (200, RESPONSE))
+
+        assert [name async for name in client.listSearches(app='test')] == ['test']
+        index = await client.getSearchIndex(app='test')
+        assert index['test']['content']['search'] == 'index=*'
+
+    async def test_listSearchesFail(self):
+        client = makeClient((404, RESPONSE))
+
+        with self.assertRaises(SplunkGetFailed):
+            async for _ in client.listSearches(app='test'):
+                pass
+
+    async def test_listSearchesPaged(self):
+        client = makeClient(*[
+            (200, json.dumps({
+                'paging': {'total': 3},
+                'entry': [{'name': name, 'content': {}} for name in names]
+            }))
+            for names in (['a', 'b'], ['c'])
+        ])
+
+        with patch.object(asyncSplunkClient, 'PAGE_SIZE', 2):
+            names = [name async for name in client.listSearches(app='test')]
+
+        assert names == ['a', 'b', 'c']
+        offsets = [
+            dict(c[1]['params'])['offset'] for c in client._request.await_args_list
+        ]
+        assert offsets == [0, 2]
+
+    async def test_getInventory(self):
+        client = makeClient((200, json.dumps({'entry': [
+            {'name': 'a', 'acl': {'app': 'app1', 'sharing': 'app'}},
+            {'name': 'b', 'acl': {'app': 'app2', 'sharing': 'user', 'owner': 'bob'}},
+            {'name': 'c', 'acl': {'app': 'other', 'sharing': 'app'}}
+        ]})))
+
+        inventory = await client.getInventory(['app1', 'app2'])
+
+        assert inventory == {
+            'app1': {'a': {'name': 'a', 'acl': {'app': 'app1', 'sharing': 'app'}}},
+            'app2': {}
+        }
+        assert client._request.call_args[0][1] == '/servicesNS/-/-/saved/searches'
+        assert ('search', 'eai:acl.app="app1" OR eai:acl.app="app2"') in (
+            client._request.call_args[1]['params']
+        )
+
+    async def test_getSearch(self):
+        client = makeClient(
+            (200, json.dumps({'entry': [{'name': 'a'}]})),
+            (404, RESPONSE),
+            (500, RESPONSE)
+        )
+
+        assert await client.getSearch('app', 'a') == {'name': 'a'}
+        assert client._request.call_args[0][1] == '/servicesNS/admin/app/saved/searches/a'
+        assert await client.getSearch('app', 'b') is None
+        with self.assertRaises(SplunkGetFailed):
+            await client.getSearch('app', 'c')
+
+    async def test_getServerInfo(self):
+        client = makeClient(
+            (200, '{"entry": [{"content": {"version": "9.1.0"}}]}'),
+            (401, RESPONSE)
+        )
+
+        assert await client.getServerInfo() == {'version': '9.1.0'}
+        assert client._request.call_args[0][1] == '/services/server/info'
+        with self.assertRaises(SplunkGetFailed):
+            await client.getServerInfo()
+
+    async def test_deleteSearch(self):
+        client = makeClient((200, ''), (404, RESPONSE))
+
+        self.assertIsNone(await client.deleteSearch(app='test', searchName='test'))
+        with self.assertRaises(SplunkUpdateFailed):
+            await client.deleteSearch(app='test', searchName='test')
+
+    async def test_requestReauthenticate(self):
+        client = makeClient()
+        del client._request
+        client._authLock = asyncio.Lock()
+        client._authorization = 'Splunk expired'
+        client._send = AsyncMock(side_effect=[
+            (401, ''),
+            (200, '{"sessionKey": "new"}'),
+            (200, '{}')
+        ])
+
+        assert await client._request('GET', '/test') == (200, '{}')
+        assert client._authorization == 'Splunk new'
+        assert client._send.await_args_list[1][0][1] == '/services/auth/login'
+
+        client._token = 'DeLorean88'
+        client._send = AsyncMock(return_value=(401, ''))
+        assert await client._request('GET', '/test') == (401, '')
+        client._send.assert_awaited_once()
+
+    @patch.object(asyncSplunkClient.asyncio, 'sleep')
+    async def test_sendRetry(self, mk_sleep):
+        client = makeClient()
+        responses = []
+        for status, headers in ((503, {'Retry-After': '2'}), (429, {}), (200, {})):
+            response = MagicMock()
+            response.status = status
+            response.headers = headers
+            response.text = AsyncMock(return_value='{}')
+            responses.append(response)
+        client._session = MagicMock()
+        client._session.request.return_value.__aenter__.side_effect = responses
+
+        assert await client._send('GET', '/test') == (200, '{}')
+        assert client._session.request.call_count == 3
+        assert mk_sleep.await_args_list[0][0][0] == 2
+        assert client.requestStats() == {'retries': 2, 'throttled': 2}
+
+    @patch.object(asyncSplunkClient.asyncio, 'sleep')
+    async def test_sendCreate(self, mk_sleep):
+        client = makeClient()
+        responses = []
+        for status in (429, 504, 201):
+            response = MagicMock()
+            response.status = status
+            response.headers = {}
+            response.text = AsyncMock(return_value='{}')
+            responses.append(response)
+        client._session = MagicMock()
+        client._session.request.return_value.__aenter__.side_effect = responses
+
+        url = '/servicesNS/admin/app/saved/searches?output_mode=json'
+        assert await client._send('POST', url) == (504, '{}')
+        assert client._session.request.call_count == 2
+
+    @patch.object(asyncSplunkClient.asyncio, 'sleep')
+    async def test_sendDeadline(self, mk_sleep):
+        client = makeClient()
+        response = MagicMock()
+        response.status = 503
+        response.headers = {'Retry-After': '10'}
+        response.text = AsyncMock(return_value='{}')
+        client._session = MagicMock()
+        client._session.request.return_value.__aenter__.return_value = response
+        client.setDeadline(Deadline(5))
+
+        assert await client._send('GET', '/test') == (503, '{}')
+        mk_sleep.assert_not_awaited()
+        timeout = client._session.request.call_args[1]['timeout']
+        assert 4 < timeout.total <= 5
+
+        client.setDeadline(Deadline(0))
+        with self.assertRaises(DeadlineExceeded):
+            await client._send('GET', '/test')
+
+    async def test_sendTimeout(self):
+        client = makeClient()
+        client._session = MagicMock()
+        client._session.request.return_value.__aenter__.side_effect = (
+            asyncio.TimeoutError()
+        )
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await client._send('GET', '/test')
+
+        # The deadline passed while waiting on Splunk.
+        deadline = MagicMock()
+        deadline.timeout.return_value = 0.01
+        deadline.expired.return_value = True
+        client.setDeadline(deadline)
+        with self.assertRaises(DeadlineExceeded):
+            await client._send('GET', '/test')
+
+    async def test_request(self):
+        client = makeClient()
+        del client._request
+        response = MagicMock()
+        response.status = 200
+        response.text = AsyncMock(return_value='{}')
+        client._session = MagicMock()
+        client._session.close = AsyncMock()
+        client._session.request.return_value.__aenter__.return_value = response
+
+        assert await client._request('GET', '/test') == (200, '{}')
+        assert client._session.request.call_args[1]['headers'] == {}
+        await client.close()
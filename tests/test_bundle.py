@@ -0,0 +1,80 @@
+import bundle
+import json
+import os
+import tempfile
+import unittest
+
+from unittest.mock import MagicMock
+
+from stateStore import fingerprint
+
+SEARCH_CONFIG = {
+    'is_scheduled': 'True',
+    'description': 'Test search for validation',
+    'search': 'index=*',
+    'severity': 'High',
+    'lookback': '-1h',
+    'cron_schedule': '* * * * *',
+    'actions': [{'OpsGenie': None}]
+}
+
+
+class TestBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, bundle.BUNDLE_FILE)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_compileSearch(self):
+        compiled = bundle.compileSearch(SEARCH_CONFIG)
+
+        assert set(compiled) == set(SEARCH_CONFIG) | {bundle.COMPILED}
+        assert compiled[bundle.COMPILED]['source'] == fingerprint(SEARCH_CONFIG)
+        assert compiled[bundle.COMPILED]['payload']['actions'] == 'opsgenie'
+        assert bundle.COMPILED not in SEARCH_CONFIG
+
+    def test_compileLoadBundle(self):
+        searches = [('app', 'Test Search', SEARCH_CONFIG)]
+
+        assert bundle.compileBundle(['app', 'other'], searches, self.path) == 1
+        apps, loaded = bundle.loadBundle(self.path)
+
+        assert apps == ['app', 'other']
+        assert [s[:2] for s in loaded] == [('app', 'Test Search')]
+        assert bundle.searchSource(loaded[0][2]) == fingerprint(SEARCH_CONFIG)
+
+    def test_loadBundleMissing(self):
+        assert bundle.loadBundle(self.path) is None
+
+    def test_loadBundleOtherVersion(self):
+        with open(self.path, 'w') as f:
+            json.dump({'version': 0, 'apps': [], 'searches': []}, f)
+
+        assert bundle.loadBundle(self.path) is None
+
+    def test_loadBundleStale(self):
+        searches = [('app', 'Test Search', SEARCH_CONFIG)]
+        bundle.compileBundle(['app'], searches, self.path, 'abc')
+
+        assert bundle.loadBundle(self.path, 'abc')[0] == ['app']
+        assert bundle.loadBundle(self.path) is not None
+
+        with self.assertLogs('sad', 'WARNING') as logs:
+            assert bundle.loadBundle(self.path, 'def') is None
+        assert 'content has changed' in logs.output[0]
+
+    def test_searchPayload(self):
+        splunk = MagicMock()
+        compiled = bundle.compileSearch(SEARCH_CONFIG)
+
+        assert bundle.searchPayload(splunk, compiled) == compiled[bundle.COMPILED]['payload']
+        splunk.renderPayload.assert_not_called()
+
+        bundle.searchPayload(splunk, SEARCH_CONFIG)
+        splunk.renderPayload.assert_called_once_with(SEARCH_CONFIG)
+
+    def test_searchSource(self):
+        assert bundle.searchSource(SEARCH_CONFIG) == fingerprint(SEARCH_CONFIG)
@@ -0,0 +1,83 @@
+import unittest
+
+from checkpoint import Checkpoint, contentRevision
+
+from unittest.mock import MagicMock
+
+
+SEARCHES = [
+    ('app', 'one', {'search': 'index=one'}),
+    ('app', 'two', {'search': 'index=two'})
+]
+
+
+def makeStore(journal=None):
+    store = MagicMock()
+    store.load.return_value = journal or {}
+    return store
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def test_contentRevision(self):
+        changed = [SEARCHES[0], ('app', 'two', {'search': 'index=2'})]
+
+        assert contentRevision(SEARCHES) == contentRevision(list(SEARCHES))
+        assert contentRevision(SEARCHES) != contentRevision(changed)
+
+    def test_resume(self):
+        store = makeStore({'revision': 'abc', 'completed': ['app/one']})
+        checkpoint = Checkpoint(store, 'abc')
+
+        assert checkpoint.resumed == 1
+        assert checkpoint.isCompleted('app', 'one')
+        assert not checkpoint.isCompleted('app', 'two')
+
+    def test_otherRevision(self):
+        store = makeStore({'revision': 'abc', 'completed': ['app/one']})
+        checkpoint = Checkpoint(store, 'def')
+
+        assert checkpoint.resumed == 0
+        assert not checkpoint.isCompleted('app', 'one')
+
+    def test_flushInterval(self):
+        store = makeStore()
+        checkpoint = Checkpoint(store, 'abc', interval=2)
+
+        checkpoint.complete('app', 'one')
+        store.save.assert_not_called()
+        checkpoint.complete('app', 'two')
+        store.save.assert_called_once_with({
+            'revision': 'abc',
+            'completed': ['app/one', 'app/two']
+        })
+
+        # Nothing new to write.
+        checkpoint.flush()
+        assert store.save.call_count == 1
+
+    def test_flushFailed(self):
+        store = makeStore()
+        store.save.side_effect = OSError('Disk full')
+        checkpoint = Checkpoint(store, 'abc')
+        checkpoint.complete('app', 'one')
+
+        with self.assertLogs('sad', level='WARNING'):
+            checkpoint.flush()
+
+    def test_clear(self):
+        store = makeStore({'revision': 'abc', 'completed': ['app/one']})
+        checkpoint = Checkpoint(store, 'abc')
+
+        checkpoint.clear()
+
+        store.save.assert_called_once_with({})
+        assert not checkpoint.isCompleted('app', 'one')
+
+    def test_noStore(self):
+        checkpoint = Checkpoint()
+        checkpoint.complete('app', 'one')
+        checkpoint.flush()
+        checkpoint.clear()
+
+        assert checkpoint.resumed == 0
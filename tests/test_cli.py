@@ -16,4 +16,24 @@ class TestCli(unittest.TestCase):
     @patch.object(sys, 'argv', ['sadface.py','deploy'])
     def test_parseargs(self):
         result = cli.parseArgs(['deploy'])
-        assert result.command == 'deploy'
\ No newline at end of file
+        assert result.command == 'deploy'
+
+    @patch.object(sys, 'argv', ['sadface.py','deploy', '--workers', '4'])
+    def test_parseargsWorkers(self):
+        result = cli.parseArgs(['deploy'])
+        assert result.workers == 4
+
+    @patch.object(sys, 'argv', ['sadface.py','validate', '--since', 'auto'])
+    def test_parseargsSince(self):
+        result = cli.parseArgs(['deploy', 'validate'])
+        assert result.since == 'auto'
+
+    @patch.object(sys, 'argv', ['sadface.py','deploy', '--deadline', '12.5'])
+    def test_parseargsDeadline(self):
+        result = cli.parseArgs(['deploy'])
+        assert result.deadline == 12.5
+
+    @patch.object(sys, 'argv', ['sadface.py','deploy', '--shards', '4'])
+    def test_parseargsShards(self):
+        result = cli.parseArgs(['deploy'])
+        assert result.shards == 4
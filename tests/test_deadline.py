@@ -0,0 +1,36 @@
+import time
+import unittest
+
+from deadline import Deadline
+from exceptions import DeadlineExceeded
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_none(self):
+        deadline = Deadline()
+
+        self.assertIsNone(deadline.remaining())
+        self.assertFalse(deadline.expired())
+        assert deadline.timeout(30) == 30
+        self.assertTrue(deadline.allows(3600))
+
+    def test_remaining(self):
+        deadline = Deadline(10)
+
+        assert 9 < deadline.remaining() <= 10
+        self.assertFalse(deadline.expired())
+        assert deadline.timeout(3) == 3
+        assert 9 < deadline.timeout(30) <= 10
+        self.assertTrue(deadline.allows(5))
+        self.assertFalse(deadline.allows(15))
+
+    def test_expired(self):
+        deadline = Deadline(0.01)
+        time.sleep(0.02)
+
+        assert deadline.remaining() == 0
+        self.assertTrue(deadline.expired())
+        self.assertFalse(deadline.allows(0))
+        with self.assertRaises(DeadlineExceeded):
+            deadline.timeout(30)
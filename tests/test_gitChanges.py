@@ -0,0 +1,104 @@
+import gitChanges
+import os
+import subprocess
+import tempfile
+import unittest
+
+from exceptions import GitChangesFailed
+
+from unittest.mock import patch
+
+SEARCH_YAML = '''{name}:
+  description: Test search for validation
+'''
+
+
+class TestGitChanges(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.git('init', '-q', '-b', 'main')
+        self.git('config', 'user.email', 'test@test.com')
+        self.git('config', 'user.name', 'test')
+
+        # Mirror the repo layout, where content is a symlink into src.
+        os.makedirs('src/content')
+        os.symlink('src/content/', 'content')
+        self.write('app1', 'keep.yaml', 'Keep')
+        self.write('app1', 'change.yaml', 'Old Name')
+        self.write('app2', 'delete.yaml', 'Deleted')
+        self.write('app3', 'other.yaml', 'Other')
+        with open('src/content/README.md', 'w') as f:
+            f.write('Not a search')
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', 'base')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def git(self, *args):
+        subprocess.run(['git'] + list(args), check=True)
+
+    def write(self, app, file, name):
+        path = os.path.join('src', 'content', app, 'searches')
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, file), 'w') as f:
+            f.write(SEARCH_YAML.format(name=name))
+
+    def test_noChanges(self):
+        assert gitChanges.changedContent('HEAD') == (set(), set(), {})
+
+    def test_changedContent(self):
+        self.write('app1', 'change.yaml', 'New Name')
+        os.remove('src/content/app2/searches/delete.yaml')
+        self.git('commit', '-q', '-a', '-m', 'change')
+        self.write('app4', 'new.yaml', 'Untracked')
+        with open('src/content/README.md', 'w') as f:
+            f.write('Still not a search')
+
+        apps, files, previous = gitChanges.changedContent('HEAD~1')
+
+        assert apps == {'app1', 'app2', 'app4'}
+        assert files == {
+            os.path.join('content', 'app1', 'searches', 'change.yaml'),
+            os.path.join('content', 'app4', 'searches', 'new.yaml')
+        }
+        assert previous == {'app1': {'Old Name'}, 'app2': {'Deleted'}}
+
+    def test_changedProfiles(self):
+        with open('src/content/app1/actions.yaml', 'w') as f:
+            f.write('Default: []')
+
+        apps, files, previous = gitChanges.changedContent('HEAD')
+
+        assert apps == {'app1'}
+        assert files == {
+            os.path.join('content', 'app1', 'searches', 'change.yaml'),
+            os.path.join('content', 'app1', 'searches', 'keep.yaml')
+        }
+        assert previous == {}
+
+    def test_resolveAuto(self):
+        self.git('checkout', '-q', '-b', 'feature')
+        self.write('app1', 'keep.yaml', 'Kept')
+        self.git('commit', '-q', '-a', '-m', 'feature')
+        base = subprocess.run(
+            ['git', 'rev-parse', 'main'],
+            stdout=subprocess.PIPE,
+            universal_newlines=True
+        ).stdout.strip()
+
+        with patch.object(gitChanges, 'baseBranch', return_value='main'):
+            assert gitChanges.resolveRef('auto') == base
+
+        assert gitChanges.resolveRef('v1.0') == 'v1.0'
+
+    def test_baseBranchDefault(self):
+        assert gitChanges.baseBranch() == gitChanges.DEFAULT_BASE
+
+    def test_badRef(self):
+        with self.assertRaises(GitChangesFailed):
+            gitChanges.changedContent('no-such-ref')
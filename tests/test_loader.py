@@ -0,0 +1,214 @@
+import loader
+import os
+import tempfile
+import unittest
+
+from exceptions import ConfigValidateFailed
+
+from unittest.mock import patch
+
+from nose2.tools import params
+
+SEARCH_YAML = '''{name}:
+  description: Test search for validation
+  search: index=*
+  severity: High
+  lookback: -1h
+  cron_schedule: '* * * * *'
+  actions:
+    - Add to Triggered Alerts:
+'''
+
+PROFILE_YAML = '''{name}:
+  description: Test search using a profile
+  search: index=*
+  severity: High
+  lookback: -1h
+  cron_schedule: '* * * * *'
+  action_profile: {profile}
+'''
+
+ACTIONS_YAML = '''Page:
+  - Add to Triggered Alerts:
+  - OpsGenie:
+'''
+
+BAD_YAML = '''{name}:
+  description: Missing its search
+  severity: High
+  lookback: -1h
+  cron_schedule: '* * * * *'
+  actions:
+    - Add to Triggered Alerts:
+'''
+
+
+class TestLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.patcher = patch.object(loader, 'CONTENT_DIR', self.tmp.name)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmp.cleanup()
+
+    def writeProfiles(self, app, content):
+        path = os.path.join(self.tmp.name, app)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'actions.yaml'), 'w') as f:
+            f.write(content)
+
+    def writeSearch(self, app, file, content):
+        path = os.path.join(self.tmp.name, app, 'searches')
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, file), 'w') as f:
+            f.write(content)
+
+    def test_exampleContent(self):
+        self.patcher.stop()
+        content = loader.loadContent(['splunk_enterprise_on_docker'])
+        self.patcher.start()
+
+        assert [c[2] for c in content] == ['Example Search']
+
+    @params(1, 2)
+    def test_loadContentOrdered(self, workers):
+        self.writeSearch('b_app', 'b.yaml', SEARCH_YAML.format(name='B1'))
+        self.writeSearch('b_app', 'a.yaml', SEARCH_YAML.format(name='A2') + SEARCH_YAML.format(name='A1'))
+        self.writeSearch('a_app', 'z.yaml', SEARCH_YAML.format(name='Z1'))
+
+        with patch.object(loader, 'MIN_PARALLEL_FILES', 1):
+            content = loader.loadContent(workers=workers)
+
+        assert [(c[0], c[2]) for c in content] == [
+            ('a_app', 'Z1'), ('b_app', 'A2'), ('b_app', 'A1'), ('b_app', 'B1')
+        ]
+        assert content[0][3]['severity'] == 'High'
+
+    def test_loadContentAllErrors(self):
+        self.writeSearch('app', 'good.yaml', SEARCH_YAML.format(name='Good'))
+        self.writeSearch('app', 'bad1.yaml', BAD_YAML.format(name='Bad 1'))
+        self.writeSearch('app', 'bad2.yaml', BAD_YAML.format(name='Bad 2') + SEARCH_YAML.format(name='Fine'))
+        self.writeSearch('app', 'broken.yaml', 'Broken: [')
+        self.writeSearch('app', 'empty.yaml', '')
+
+        with self.assertRaises(ConfigValidateFailed) as ctx:
+            loader.loadContent()
+
+        message = str(ctx.exception)
+        assert message.startswith('4 invalid search definition(s)!')
+        assert "'Bad 1'" in message and "'Bad 2'" in message
+        assert 'broken.yaml: Could not load file!' in message
+        assert 'empty.yaml: No searches defined!' in message
+
+    def test_loadContentNotMapping(self):
+        self.writeSearch('app', 'list.yaml', 'Bad:\n  - x\n')
+        self.writeSearch('app', 'null.yaml', 'Other: null\n' + SEARCH_YAML.format(name='Fine'))
+        self.writeSearch('app', 'bad.yaml', BAD_YAML.format(name='Bad 1'))
+
+        with self.assertRaises(ConfigValidateFailed) as ctx:
+            loader.loadContent()
+
+        message = str(ctx.exception)
+        assert message.startswith('3 invalid search definition(s)!')
+        assert "Search 'Bad' must be a mapping" in message
+        assert "Search 'Other' must be a mapping" in message
+        assert "'Bad 1'" in message
+
+    @patch.object(loader, 'ProcessPoolExecutor')
+    def test_loadContentNoProcesses(self, mk_pool):
+        mk_pool.side_effect = OSError('Function not implemented')
+        self.writeSearch('app', 'good.yaml', SEARCH_YAML.format(name='Good'))
+
+        with patch.object(loader, 'MIN_PARALLEL_FILES', 1):
+            content = loader.loadContent(workers=2)
+
+        assert [c[2] for c in content] == ['Good']
+
+    def test_loadContentFiles(self):
+        self.writeSearch('app', 'a.yaml', SEARCH_YAML.format(name='A'))
+        self.writeSearch('app', 'b.yaml', BAD_YAML.format(name='B'))
+        wanted = os.path.join(self.tmp.name, 'app', 'searches', 'a.yaml')
+
+        content = loader.loadContent(['app'], files={wanted})
+
+        assert [c[2] for c in content] == ['A']
+
+    def test_contentDigest(self):
+        self.writeSearch('app', 'a.yaml', SEARCH_YAML.format(name='A'))
+        digest = loader.contentDigest()
+
+        assert loader.contentDigest() == digest
+
+        # Unparsed, so even invalid content is hashed.
+        self.writeSearch('app', 'b.yaml', 'Broken: [')
+        assert loader.contentDigest() not in (digest, None)
+
+        self.writeSearch('app', 'b.yaml', '')
+        changed = loader.contentDigest()
+        self.writeProfiles('app', ACTIONS_YAML)
+        assert loader.contentDigest() != changed
+
+        # The same bytes under another name are other content.
+        os.rename(
+            os.path.join(self.tmp.name, 'app'),
+            os.path.join(self.tmp.name, 'other')
+        )
+        assert loader.contentDigest() != changed
+
+        with patch.object(loader, 'CONTENT_DIR', os.path.join(self.tmp.name, 'missing')):
+            assert loader.contentDigest() is None
+
+    def test_searchNames(self):
+        self.writeSearch('app', 'a.yaml', SEARCH_YAML.format(name='A'))
+        self.writeSearch('app', 'b.yaml', BAD_YAML.format(name='B'))
+        self.writeSearch('app', 'empty.yaml', '')
+
+        assert loader.searchNames(['app', 'other']) == {'app': {'A', 'B'}, 'other': set()}
+
+    def test_loadProfiles(self):
+        self.writeProfiles('app', ACTIONS_YAML + 'Broken:\n  - Bad Action:\n')
+
+        profiles, errors = loader.loadProfiles('app')
+
+        assert list(profiles) == ['Page']
+        key, actions = profiles['Page']
+        assert key.startswith('app/Page@')
+        assert actions == [
+            {'Add to Triggered Alerts': None},
+            {'OpsGenie': None}
+        ]
+        assert len(errors) == 1 and "'Broken'" in errors[0]
+        assert loader.loadProfiles('other') == ({}, [])
+
+    def test_loadContentProfiles(self):
+        self.writeProfiles('app', ACTIONS_YAML)
+        self.writeSearch('app', 'a.yaml', (
+            PROFILE_YAML.format(name='A', profile='Page')
+            + PROFILE_YAML.format(name='B', profile='Page')
+        ))
+        self.writeSearch('app', 'b.yaml', SEARCH_YAML.format(name='C'))
+        wanted = {os.path.join(self.tmp.name, 'app', 'searches', 'a.yaml')}
+
+        content = loader.loadContent(['app'], files=wanted)
+        a, b = (c[3] for c in content)
+
+        assert a['action_profile'] == b['action_profile']
+        assert a['action_profile'].startswith('app/Page@')
+        assert a['actions'] is b['actions']
+        assert 'action_profile' not in loader.loadContent(['app'])[2][3]
+
+    @params(
+        (PROFILE_YAML.format(name='A', profile='Missing'), 'unknown action profile'),
+        (SEARCH_YAML.format(name='A') + '  action_profile: Page\n', 'must not be present')
+    )
+    def test_loadContentProfilesFail(self, content, message):
+        self.writeProfiles('app', 'Page:\n  - OpsGenie:\n')
+        self.writeSearch('app', 'a.yaml', content)
+
+        with self.assertRaises(ConfigValidateFailed) as ctx:
+            loader.loadContent(['app'])
+
+        assert message in str(ctx.exception)
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import time
+import unittest
+
+import reconcile
+
+from deadline import Deadline
+from exceptions import DeadlineExceeded, SplunkUpdateFailed
+from reconcile import AppPlan
+
+from unittest.mock import AsyncMock, MagicMock
+
+
+class TestPlan(unittest.TestCase):
+
+    def test_appPlan(self):
+        plan = AppPlan(
+            desired=['new', 'existing'],
+            actual=['existing', 'removed', 'stray'],
+            removed=['removed', 'never deployed']
+        )
+
+        assert plan.create == {'new'}
+        assert plan.update == {'existing'}
+        assert plan.unmanaged == {'removed', 'stray'}
+        assert plan.delete == set()
+
+    def test_appPlanRemoveUnmanaged(self):
+        plan = AppPlan(['existing'], ['existing', 'removed', 'stray'],
+                       removed=['removed'], removeUnmanaged=True)
+
+        assert plan.unmanaged == {'stray'}
+        assert plan.delete == {'removed', 'stray'}
+
+    def test_plan(self):
+        managed = [('alpha', 'one'), ('alpha', 'two'), ('beta', 'three')]
+        indexes = {
+            'alpha': {'one': {}, 'stray': {}},
+            'beta': {'stray': {}},
+            'gamma': {}
+        }
+
+        plans = reconcile.plan(managed, indexes, {}, ['beta'])
+
+        assert sorted(plans) == ['alpha', 'beta', 'gamma']
+        assert plans['alpha'].create == {'two'}
+        assert plans['alpha'].delete == set()
+        assert plans['beta'].delete == {'stray'}
+        assert reconcile.deletions(plans) == [('beta', 'stray')]
+
+    def test_planLarge(self):
+        names = ['Search {}'.format(n) for n in range(20000)]
+        indexes = {'app': {name: {} for name in names[1000:]}}
+
+        plans = reconcile.plan([('app', name) for name in names[:19000]], indexes)
+
+        assert len(plans['app'].create) == 1000
+        assert len(plans['app'].update) == 18000
+        assert len(plans['app'].unmanaged) == 1000
+
+
+class TestExecuteDeletions(unittest.TestCase):
+
+    def test_outcomes(self):
+        splunk = MagicMock()
+        splunk.deleteSearch.side_effect = self.raiseFor({
+            'broken': SplunkUpdateFailed('Oops'),
+            'late': DeadlineExceeded()
+        })
+
+        outcomes = reconcile.executeDeletions(
+            splunk,
+            [('app', 'fine'), ('app', 'broken'), ('app', 'late')],
+            2,
+            Deadline()
+        )
+
+        assert [o['outcome'] for o in outcomes] == ['deleted', 'failed', 'skipped']
+        assert outcomes[0] == {
+            'app': 'app', 'search': 'fine', 'action': 'delete',
+            'outcome': 'deleted', 'error': None
+        }
+        assert 'Oops' in outcomes[1]['error']
+
+    def raiseFor(self, errors):
+        def delete(app, searchName):
+            if searchName in errors:
+                raise errors[searchName]
+        return delete
+
+    def test_deadline(self):
+        splunk = MagicMock()
+
+        outcomes = reconcile.executeDeletions(
+            splunk, [('app', 'one')], 2, Deadline(0)
+        )
+
+        assert outcomes[0]['outcome'] == 'skipped'
+        splunk.deleteSearch.assert_not_called()
+
+    def test_none(self):
+        assert reconcile.executeDeletions(MagicMock(), [], 2, Deadline()) == []
+
+    def test_bounded(self):
+        lock = threading.Lock()
+        inFlight = []
+        peak = []
+
+        def delete(app, searchName):
+            with lock:
+                inFlight.append(1)
+                peak.append(len(inFlight))
+            time.sleep(0.01)
+            with lock:
+                inFlight.pop()
+
+        splunk = MagicMock()
+        splunk.deleteSearch.side_effect = delete
+
+        outcomes = reconcile.executeDeletions(
+            splunk, [('app', str(n)) for n in range(12)], 3, Deadline()
+        )
+
+        assert len(outcomes) == 12
+        assert 1 < max(peak) <= 3
+
+
+class TestExecuteDeletionsAsync(unittest.IsolatedAsyncioTestCase):
+
+    async def test_outcomes(self):
+        splunk = MagicMock()
+        splunk.deleteSearch = AsyncMock(side_effect=[
+            None, SplunkUpdateFailed('Oops'), DeadlineExceeded()
+        ])
+
+        outcomes = await reconcile.executeDeletionsAsync(
+            splunk,
+            [('app', 'fine'), ('app', 'broken'), ('app', 'late')],
+            asyncio.Semaphore(1),
+            Deadline()
+        )
+
+        assert [o['outcome'] for o in outcomes] == ['deleted', 'failed', 'skipped']
+
+        outcomes = await reconcile.executeDeletionsAsync(
+            splunk, [('app', 'one')], asyncio.Semaphore(1), Deadline(0)
+        )
+        assert outcomes[0]['outcome'] == 'skipped'
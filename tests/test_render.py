@@ -0,0 +1,87 @@
+import copy
+import render
+import unittest
+
+from nose2.tools import params
+
+DETAILS = {
+    'description': 'Test search',
+    'search': 'index=main | stats count by index',
+    'severity': 'Critical',
+    'lookback': '-1h',
+    'cron_schedule': '* * * * *',
+    'actions': [{'OpsGenie': None}],
+    'cyber': {
+        'technique': 'T1000',
+        'tactic': 'Impact'
+    }
+}
+
+
+class TestRender(unittest.TestCase):
+
+    def test_renderSearch(self):
+        details = copy.deepcopy(DETAILS)
+
+        result = render.renderSearch('Test Search', details)
+
+        assert result == {
+            'is_scheduled': 'True',
+            'description': 'Test search',
+            'search': (
+                'index=main | stats count by index | eval '
+                'technique="T1000", tactic="Impact", '
+                'Detection="Test Search", Severity="Critical"'
+            ),
+            'severity': 'Critical',
+            'lookback': '-1h',
+            'cron_schedule': '* * * * *',
+            'actions': [{'OpsGenie': None}]
+        }
+        assert details == DETAILS
+
+    def test_renderSearchNoCyber(self):
+        details = copy.deepcopy(DETAILS)
+        details.pop('cyber')
+
+        result = render.renderSearch('Test Search', details)
+
+        assert result['search'] == 'index=main | stats count by index'
+        assert 'cyber' not in result
+
+    @params(
+        ('Dad "jokes"', r'"Dad \"jokes\""'),
+        ('C:\\temp\\', r'"C:\\temp\\"'),
+        ('a | delete', '"a | delete"'),
+        (5, '"5"')
+    )
+    def test_quoteValue(self, value, expected):
+        assert render.quoteValue(value) == expected
+
+    @params(
+        ('Detection', 'Detection'),
+        ('mitre.tactic', "'mitre.tactic'"),
+        ("it's", "'it\\'s'")
+    )
+    def test_quoteField(self, name, expected):
+        assert render.quoteField(name) == expected
+
+    def test_renderSplEscapes(self):
+        result = render.renderSpl(
+            'index=main',
+            (('Detection', 'Say "hi"'), ('Severity', 'High'))
+        )
+
+        assert result == (
+            'index=main | eval Detection="Say \\"hi\\"", Severity="High"'
+        )
+
+    def test_renderSplCached(self):
+        render.renderSpl.cache_clear()
+
+        first = render.renderSpl('index=main', (('Severity', 'High'),))
+        second = render.renderSpl('index=main', (('Severity', 'High'),))
+
+        assert first is second
+        assert render.renderSpl.cache_info().hits == 1
+        assert render.renderSpl('index=main') == 'index=main'
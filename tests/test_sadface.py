@@ -1,14 +1,25 @@
+import asyncSplunkClient
+import asyncio
+import copy
+import json
+import loader
 import sadface
 import unittest
 import os
+import subprocess
 import sys
+import tempfile
+import time
 import validator
 
-from unittest.mock import MagicMock, patch
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock, call, patch
 
 from nose2.tools import params
 
-from exceptions import ConfigLoadSecretsFailed
+from exceptions import ConfigLoadSecretsFailed, DeadlineExceeded
+from exceptions import SplunkUpdateFailed
+from stateStore import fingerprint
 
 TEST_SEARCH = {
     'Test Search': {
@@ -67,22 +78,40 @@ GOOD_CONFIG_ENV = {
 
 SECRETS_MGR_RESPONSE = {"user": "test", "pass": "pass123"}
 
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+# Slow to import, so only imported when a run needs them, never at Lambda
+# cold start.
+HEAVY_MODULES = [
+    'boto3', 'botocore', 'aiohttp', 'asyncio', 'benedict', 'json_logging'
+]
+
+
+def loadedFile(searches):
+    '''
+    Stands in for loader.loadFile, validating the given searches (or
+    those returned for the file, if given a function).
+    '''
+    def load(file):
+        source = searches(file) if callable(searches) else searches
+        return validator.getValidSearch(source), []
+    return load
+
 class TestSadFace(unittest.TestCase):
 
-    @patch.object(sadface, 'os')
-    @patch.object(sadface, 'glob')
-    @patch.object(sadface, 'benedict')
-    def test_validate(self, mk_benedict, mk_glob, mk_os):
+    @patch.object(loader, 'os')
+    @patch.object(loader, 'glob')
+    @patch.object(loader, 'loadFile')
+    def test_validate(self, mk_load, mk_glob, mk_os):
         mk_os.listdir = MagicMock(return_value=['testapp'])
         mk_glob.glob = MagicMock(return_value=['testfile'])
-        mk_benedict.from_yaml = MagicMock(return_value=TEST_SEARCH)
+        mk_load.side_effect = loadedFile(TEST_SEARCH)
         
         assert sadface.validate() == True
 
     @patch.object(sadface, 'validator')
-    @patch.object(sadface, 'boto3')
+    @patch('boto3.client')
     @patch.object(sadface, 'json')
-    @patch.object(sadface, 'benedict')
+    @patch('benedict.benedict')
     def test_loadConfigOK(self, mk_benedict, mk_json, mk_boto, mk_valid):
         mk_benedict.from_yaml = MagicMock(return_value=GOOD_CONFIG_SM)
         mk_json.loads = MagicMock(return_value=SECRETS_MGR_RESPONSE)
@@ -92,7 +121,7 @@ class TestSadFace(unittest.TestCase):
 
     @patch.object(sadface, 'os')
     @patch.object(sadface, 'validator')
-    @patch.object(sadface, 'benedict')
+    @patch('benedict.benedict')
     def test_loadConfigOKEnv(self, mk_benedict, mk_valid, mk_os):
         mk_benedict.from_yaml = MagicMock(return_value=GOOD_CONFIG_ENV)
         mk_valid.validateConfig = MagicMock()
@@ -101,7 +130,7 @@ class TestSadFace(unittest.TestCase):
 
     @patch.object(sadface, 'os')
     @patch.object(sadface, 'validator')
-    @patch.object(sadface, 'benedict')
+    @patch('benedict.benedict')
     def test_loadConfigFailedEnv(self, mk_benedict, mk_valid, mk_os):
         mk_benedict.from_yaml = MagicMock(return_value=GOOD_CONFIG_ENV)
         mk_valid.validateConfig = MagicMock()
@@ -110,52 +139,833 @@ class TestSadFace(unittest.TestCase):
         with self.assertRaises(ConfigLoadSecretsFailed):
             sadface.loadConfig()
 
+    @patch.object(sadface, 'os')
+    @patch.object(sadface, 'validator')
+    @patch('benedict.benedict')
+    def test_loadConfigTokenEnv(self, mk_benedict, mk_valid, mk_os):
+        config = copy.deepcopy(GOOD_CONFIG_ENV)
+        config['splunk']['secrets']['env_vars'] = {'token': 'SPLUNK_TOKEN'}
+        mk_benedict.from_yaml = MagicMock(return_value=config)
+        mk_os.getenv.side_effect = {'SPLUNK_TOKEN': 'DeLorean88'}.get
+
+        result = sadface.loadConfig()
+
+        assert result['splunk']['token'] == 'DeLorean88'
+        assert sadface.splunkSettings(result, 1)['token'] == 'DeLorean88'
+
+    @patch.object(sadface, 'os')
+    @patch.object(sadface, 'validator')
+    @patch('boto3.client')
+    @patch('benedict.benedict')
+    def test_loadConfigTokenSMFallback(self, mk_benedict, mk_boto, mk_valid, mk_os):
+        config = copy.deepcopy(GOOD_CONFIG_SM)
+        config['splunk']['secrets'] = {
+            'order': ['secrets_manager', 'env_vars'],
+            'secrets_manager': {'secret': 'dummy', 'token': 'token'},
+            'env_vars': {'token': 'SPLUNK_TOKEN'}
+        }
+        mk_benedict.from_yaml = MagicMock(return_value=config)
+        mk_boto.return_value.get_secret_value.return_value = {
+            'SecretString': '{"user": "test"}'
+        }
+        mk_os.getenv.side_effect = {'SPLUNK_TOKEN': 'DeLorean88'}.get
+
+        assert sadface.loadConfig()['splunk']['token'] == 'DeLorean88'
+
     @patch.object(sadface, 'validator')
-    @patch.object(sadface, 'boto3')
+    @patch('boto3.client')
     @patch.object(sadface, 'json')
-    @patch.object(sadface, 'benedict')
+    @patch('benedict.benedict')
     def test_loadConfigSMfail(self, mk_benedict, mk_json, mk_boto, mk_valid):
         mk_benedict.from_yaml = MagicMock(return_value=GOOD_CONFIG_SM)
         mk_json.loads = MagicMock(return_value=SECRETS_MGR_RESPONSE)
-        mk_boto.client.side_effect = Exception
+        mk_boto.side_effect = Exception
         mk_valid.validateConfig = MagicMock()
 
         with self.assertRaises(ConfigLoadSecretsFailed):
             sadface.loadConfig()
 
-    @patch.object(sadface, 'os')
-    @patch.object(sadface, 'glob')
-    @patch.object(sadface, 'benedict')
+    @patch.object(loader, 'os')
+    @patch.object(loader, 'glob')
+    @patch.object(loader, 'loadFile')
     @patch.object(sadface, 'SplunkClient')
     @patch.object(sadface, 'loadConfig')
-    def test_deployOK(self, mk_ldcfg, mk_splunk, mk_benedict, mk_glob, mk_os):
+    def test_deployOK(self, mk_ldcfg, mk_splunk, mk_load, mk_glob, mk_os):
+        mk_ldcfg.return_value = GOOD_CONFIG_SM
         mk_os.listdir = MagicMock(return_value=['testapp'])
         mk_glob.glob = MagicMock(return_value=['testfile'])
-        mk_benedict.from_yaml = MagicMock(return_value=TEST_SEARCH)
+        mk_load.side_effect = loadedFile(TEST_SEARCH)
+        mk_splunk.return_value.getInventory.return_value = {'testapp': {'Test Search': {}}}
+        mk_splunk.return_value.searchMatches.return_value = True
 
-        assert sadface.deploy() == None
+        assert sadface.deploy() == {
+            'unchanged': 1, 'updated': 0, 'created': 0, 'deleted': 0,
+            'retries': 0, 'throttled': 0, 'skipped': 0, 'resumed': 0
+        }
+        mk_splunk.return_value.deployPayload.assert_not_called()
 
-    @patch.object(sadface, 'os')
-    @patch.object(sadface, 'glob')
-    @patch.object(sadface, 'benedict')
+    @patch.object(loader, 'os')
+    @patch.object(loader, 'glob')
+    @patch.object(loader, 'loadFile')
     @patch.object(sadface.SplunkClient, '__init__')
-    @patch.object(sadface.SplunkClient, 'listSearches')
-    @patch.object(sadface.SplunkClient, 'deploySearch')
+    @patch.object(sadface.SplunkClient, 'getInventory')
+    @patch.object(sadface.SplunkClient, 'deployPayload')
+    @patch.object(sadface.SplunkClient, 'deleteSearch')
+    @patch.object(sadface.SplunkClient, 'setDeadline')
+    @patch.object(sadface.SplunkClient, 'requestStats')
     @patch.object(sadface, 'loadConfig')
-    def test_deployExisting(self, mk_ldcfg, mk_ds, mk_list, mk_splunk, mk_benedict, mk_glob, mk_os):
+    def test_deployExisting(self, mk_ldcfg, mk_stats, mk_setdl, mk_del, mk_dp, mk_inventory, mk_splunk, mk_load, mk_glob, mk_os):
         mk_ldcfg.return_value = GOOD_CONFIG_SM
+        mk_stats.return_value = {'retries': 0, 'throttled': 0}
         mk_splunk.return_value = None
-        mk_list.return_value = ['Something else', 'Test Search']
+        mk_inventory.return_value = {'testapp': {
+            'Something else': {'content': {}},
+            'Test Search': {'content': {'search': 'index=*'}}
+        }}
+        mk_os.listdir = MagicMock(return_value=['testapp'])
+        mk_glob.glob = MagicMock(return_value=['testfile'])
+        mk_load.side_effect = loadedFile(TEST_SEARCH)
+        mk_dp.return_value = 200
+
+        assert sadface.deploy() == {
+            'unchanged': 0, 'updated': 1, 'created': 0, 'deleted': 1,
+            'retries': 0, 'throttled': 0, 'skipped': 0, 'resumed': 0
+        }
+        mk_del.assert_called_once_with(app='testapp', searchName='Something else')
+
+    @patch.object(loader, 'os')
+    @patch.object(loader, 'glob')
+    @patch.object(loader, 'loadFile')
+    @patch.object(sadface, 'SplunkClient')
+    @patch.object(sadface, 'loadConfig')
+    def test_deployConcurrent(self, mk_ldcfg, mk_splunk, mk_load, mk_glob, mk_os):
+        mk_ldcfg.return_value = GOOD_CONFIG_SM
+        mk_os.listdir = MagicMock(return_value=['testapp', 'otherapp'])
+        mk_glob.glob = MagicMock(return_value=['file1', 'file2'])
+        mk_load.side_effect = loadedFile(lambda file: {
+            '{} {}'.format(file, n): dict(TEST_SEARCH['Test Search'], cyber=dict(TEST_SEARCH['Test Search']['cyber']))
+            for n in range(25)
+        })
+        splunk = mk_splunk.return_value
+        splunk.getInventory.side_effect = lambda apps: {
+            app: {'file1 0': {}, 'Unmanaged': {}} for app in apps
+        }
+        splunk.searchMatches.side_effect = lambda app, name, payload, index: name in index
+        splunk.deployPayload.return_value = 201
+        splunk.requestStats.side_effect = [
+            {'retries': 3, 'throttled': 1},
+            {'retries': 7, 'throttled': 2}
+        ]
+
+        result = sadface.deploy(workers=8)
+
+        assert result == {
+            'unchanged': 2, 'updated': 0, 'created': 98, 'deleted': 1,
+            'retries': 4, 'throttled': 1, 'skipped': 0, 'resumed': 0
+        }
+        assert mk_splunk.call_args[1]['pool']['size'] == 8
+        splunk.deleteSearch.assert_called_once_with(app='testapp', searchName='Unmanaged')
+
+    @patch.object(loader, 'os')
+    @patch.object(loader, 'glob')
+    @patch.object(loader, 'loadFile')
+    @patch.object(sadface, 'SplunkClient')
+    @patch.object(sadface, 'loadConfig')
+    def test_deployDeleteFailed(self, mk_ldcfg, mk_splunk, mk_load, mk_glob, mk_os):
+        mk_ldcfg.return_value = GOOD_CONFIG_SM
+        mk_os.listdir = MagicMock(return_value=['testapp'])
+        mk_glob.glob = MagicMock(return_value=['testfile'])
+        mk_load.side_effect = loadedFile(TEST_SEARCH)
+        splunk = mk_splunk.return_value
+        splunk.getInventory.return_value = {'testapp': {
+            'Test Search': {}, 'Stray 1': {}, 'Stray 2': {}
+        }}
+        splunk.searchMatches.return_value = True
+        splunk.requestStats.return_value = {'retries': 0, 'throttled': 0}
+
+        def deleteSearch(app, searchName):
+            if searchName == 'Stray 1':
+                raise DeadlineExceeded()
+            if searchName == 'Stray 2':
+                raise SplunkUpdateFailed('Oops')
+        splunk.deleteSearch.side_effect = deleteSearch
+
+        with self.assertLogs('sad', level='WARNING') as logs:
+            result = sadface.deploy(workers=2)
+
+        assert result['deleted'] == 0
+        assert result['skipped'] == 1
+        assert splunk.deleteSearch.call_count == 2
+        assert "2 searches in app 'testapp' not being managed!" in '\n'.join(logs.output)
+        assert "'Stray 2' in app 'testapp' could not be deleted!" in '\n'.join(logs.output)
+
+    @patch.object(loader, 'os')
+    @patch.object(loader, 'glob')
+    @patch.object(loader, 'loadFile')
+    @patch.object(asyncSplunkClient.AsyncSplunkClient, 'connect')
+    @patch.object(sadface, 'loadConfig')
+    def test_deployAsync(self, mk_ldcfg, mk_connect, mk_load, mk_glob, mk_os):
+        mk_ldcfg.return_value = GOOD_CONFIG_SM
+        mk_os.listdir = MagicMock(return_value=['testapp', 'otherapp'])
+        mk_glob.glob = MagicMock(return_value=['file1'])
+        mk_load.side_effect = loadedFile(lambda file: {
+            'Search {}'.format(n): dict(TEST_SEARCH['Test Search'], cyber=dict(TEST_SEARCH['Test Search']['cyber']))
+            for n in range(10)
+        })
+        splunk = MagicMock()
+        splunk.getInventory = AsyncMock(side_effect=lambda apps: {
+            app: {'Search 1': {}, 'Unmanaged': {}} for app in apps
+        })
+        splunk.searchMatches.side_effect = lambda app, name, payload, index: name == 'Search 1'
+        splunk.deployPayload = AsyncMock(return_value=201)
+        splunk.deleteSearch = AsyncMock()
+        splunk.close = AsyncMock()
+        mk_connect.return_value = splunk
+
+        result = asyncio.run(sadface.deployAsync(workers=3))
+
+        assert result == {
+            'unchanged': 2, 'updated': 0, 'created': 18, 'deleted': 1,
+            'retries': 0, 'throttled': 0, 'skipped': 0, 'resumed': 0
+        }
+        assert mk_connect.call_args[1]['pool']['size'] == 3
+        splunk.deleteSearch.assert_awaited_once_with(app='testapp', searchName='Unmanaged')
+        splunk.close.assert_awaited_once()
+
+    @patch.object(loader, 'os')
+    @patch.object(loader, 'glob')
+    @patch.object(loader, 'loadFile')
+    @patch.object(asyncSplunkClient.AsyncSplunkClient, 'connect')
+    @patch.object(sadface, 'loadConfig')
+    def test_deployAsyncFailureJournalled(self, mk_ldcfg, mk_connect, mk_load, mk_glob, mk_os):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, 'checkpoint.json')
+        config = copy.deepcopy(GOOD_CONFIG_SM)
+        config['general']['checkpoint'] = {'backend': 'local', 'path': path}
+        mk_ldcfg.return_value = config
+        mk_os.listdir = MagicMock(return_value=['testapp'])
+        mk_glob.glob = MagicMock(return_value=['file1'])
+        mk_load.side_effect = loadedFile({
+            'Search {}'.format(n): dict(TEST_SEARCH['Test Search'], cyber=dict(TEST_SEARCH['Test Search']['cyber']))
+            for n in range(10)
+        })
+        splunk = MagicMock()
+        splunk.getInventory = AsyncMock(return_value={'testapp': {}})
+        splunk.searchMatches.return_value = False
+        splunk.close = AsyncMock()
+        deployed = []
+
+        # Searches finishing alongside the failure are still journalled.
+        async def deployPayload(app, searchname, payload, index):
+            if searchname == 'Search 5':
+                raise SplunkUpdateFailed('Bad request!')
+            deployed.append('testapp/' + searchname)
+            return 201
+        splunk.deployPayload = deployPayload
+        mk_connect.return_value = splunk
+
+        with self.assertRaises(SplunkUpdateFailed):
+            asyncio.run(sadface.deployAsync(workers=3))
+
+        with open(path) as f:
+            journal = json.load(f)
+        assert sorted(journal['completed']) == sorted(deployed)
+        assert len(deployed) > 5
+
+    @params(
+        ([], []),
+        (['testapp'], ['Manual', 'Old Search'])
+    )
+    @patch.object(sadface.gitChanges, 'changedContent')
+    @patch.object(loader, 'searchNames')
+    @patch.object(loader, 'loadContent')
+    @patch.object(sadface, 'SplunkClient')
+    @patch.object(sadface, 'loadConfig')
+    def test_deploySince(self, removeUnmanaged, deleted, mk_ldcfg, mk_splunk, mk_load, mk_names, mk_changed):
+        mk_ldcfg.return_value = dict(GOOD_CONFIG_SM, general={
+            'remove_unmanaged': removeUnmanaged,
+            'warn_unmanaged': True
+        })
+        mk_changed.return_value = (
+            {'testapp'},
+            {'content/testapp/searches/changed.yaml'},
+            {'testapp': {'Test Search', 'Old Search'}}
+        )
+        mk_load.return_value = [(
+            'testapp',
+            'content/testapp/searches/changed.yaml',
+            'Test Search',
+            validator.getValidSearch(TEST_SEARCH)['Test Search']
+        )]
+        mk_names.return_value = {'testapp': {'Test Search', 'Unchanged Search'}}
+        splunk = mk_splunk.return_value
+        splunk.getInventory.return_value = {'testapp': {
+            'Test Search': {}, 'Unchanged Search': {}, 'Old Search': {}, 'Manual': {}
+        }}
+        splunk.searchMatches.return_value = False
+        splunk.deployPayload.return_value = 200
+
+        result = sadface.deploy(since='HEAD~1')
+
+        assert result == {
+            'unchanged': 0, 'updated': 1, 'created': 0, 'deleted': len(deleted),
+            'retries': 0, 'throttled': 0, 'skipped': 0, 'resumed': 0
+        }
+        mk_load.assert_called_once_with(
+            ['testapp'], files={'content/testapp/searches/changed.yaml'}
+        )
+        splunk.getInventory.assert_called_once_with(['testapp'])
+        assert sorted(
+            c[1]['searchName'] for c in splunk.deleteSearch.call_args_list
+        ) == deleted
+
+    @patch.object(sadface.gitChanges, 'changedContent')
+    @patch.object(loader, 'loadContent')
+    def test_validateSince(self, mk_load, mk_changed):
+        mk_changed.return_value = ({'app'}, {'content/app/searches/x.yaml'}, {})
+        mk_load.return_value = []
+
+        self.assertTrue(sadface.validate(since='auto'))
+        mk_changed.assert_called_once_with('auto', loader.CONTENT_DIR)
+        mk_load.assert_called_once_with(['app'], files={'content/app/searches/x.yaml'})
+
+    @patch.object(loader, 'contentDigest', return_value='abc')
+    @patch.object(sadface, 'loadSearches')
+    @patch.object(sadface.bundle, 'loadBundle')
+    def test_selectContentCompiled(self, mk_bundle, mk_load, mk_digest):
+        searches = [('app', 'search', {})]
+        mk_bundle.return_value = (['app'], searches)
+
+        assert sadface.selectContent(compiled=True) == (['app'], searches, {}, {})
+        mk_bundle.assert_called_once_with(sadface.bundle.BUNDLE_FILE, 'abc')
+        mk_load.assert_not_called()
+
+        mk_bundle.return_value = None
+        with patch.object(loader, 'listApps', return_value=['app']):
+            sadface.selectContent(compiled=True)
+        mk_load.assert_called_once_with(['app'])
+
+    @patch.object(loader, 'contentDigest', return_value='abc')
+    @patch.object(sadface.bundle, 'compileBundle', return_value=1)
+    @patch.object(sadface, 'loadSearches')
+    @patch.object(loader, 'listApps', return_value=['app'])
+    def test_compileContent(self, mk_apps, mk_load, mk_compile, mk_digest):
+        self.assertTrue(sadface.compileContent('bundle.json'))
+        mk_compile.assert_called_once_with(
+            ['app'], mk_load.return_value, 'bundle.json', 'abc'
+        )
+
+    def test_deploySearchCached(self):
+        splunk = MagicMock()
+        searchconfig = {'search': 'index=*'}
+        state = sadface.DeployState()
+        state.record('app', 'search', fingerprint(searchconfig), '2021-01-01')
+
+        result = sadface.deploySearch(
+            splunk, 'app', 'search', searchconfig,
+            {'search': {'updated': '2021-01-01'}}, state
+        )
+
+        assert result == 'unchanged'
+        splunk.renderPayload.assert_not_called()
+
+    def test_deploySearchRecordsState(self):
+        splunk = MagicMock()
+        splunk.searchMatches.return_value = True
+        searchconfig = {'search': 'index=*'}
+        state = sadface.DeployState()
+        index = {'search': {'updated': '2021-01-01'}}
+
+        sadface.deploySearch(splunk, 'app', 'search', searchconfig, index, state)
+
+        assert state.isUnchanged('app', 'search', fingerprint(searchconfig), index['search'])
+
+    def test_fetchInventory(self):
+        splunk = MagicMock()
+        state = sadface.DeployState()
+        searches = [
+            ('app', 'kept', {'search': 'index=1'}),
+            ('app', 'changed', {'search': 'index=2'}),
+            ('app', 'gone', {'search': 'index=3'}),
+            ('app', 'new', {'search': 'index=4'})
+        ]
+
+        # Nothing recorded, so content is needed for everything.
+        assert sadface.fetchInventory(splunk, ['app'], searches, state, 2) == splunk.getInventory.return_value
+        splunk.getInventory.assert_called_once_with(['app'])
+
+        for _, name, searchconfig in searches[:3]:
+            state.record('app', name, fingerprint(searchconfig), '2021-01-01T00:00:00+00:00')
+        splunk.getInventory.reset_mock()
+        splunk.getInventory.return_value = {'app': {
+            'kept': {'name': 'kept', 'updated': '2021-01-01T00:00:00+00:00'},
+            'changed': {'name': 'changed', 'updated': '2021-01-02T00:00:00+00:00'},
+            'gone': {'name': 'gone', 'updated': '2021-01-02T00:00:00+00:00'}
+        }}
+        splunk.getSearch.side_effect = lambda app, name: None if name == 'gone' else {'name': name, 'content': {}}
+
+        indexes = sadface.fetchInventory(splunk, ['app'], searches, state, 2)
+
+        splunk.getInventory.assert_called_once_with(['app'], fields=['name'])
+        assert sorted(c[0] for c in splunk.getSearch.call_args_list) == [('app', 'changed'), ('app', 'gone')]
+        assert indexes == {'app': {
+            'kept': {'name': 'kept', 'updated': '2021-01-01T00:00:00+00:00'},
+            'changed': {'name': 'changed', 'content': {}}
+        }}
+
+    @patch.object(sadface, 'MAX_CONTENT_FETCHES', 1)
+    def test_fetchInventoryManyMisses(self):
+        splunk = MagicMock()
+        state = sadface.DeployState()
+        state.record('app', 'other', 'abc', '2021-01-01T00:00:00+00:00')
+        splunk.getInventory.return_value = {'app': {'one': {}, 'two': {}}}
+        searches = [('app', 'one', {}), ('app', 'two', {})]
+
+        sadface.fetchInventory(splunk, ['app'], searches, state, 2)
+
+        assert splunk.getInventory.call_args_list == [
+            call(['app'], fields=['name']), call(['app'])
+        ]
+        splunk.getSearch.assert_not_called()
+
+    def test_fetchInventoryAsync(self):
+        splunk = MagicMock()
+        splunk.getInventory = AsyncMock(return_value={'app': {'one': {'updated': '2021-01-02T00:00:00+00:00'}}})
+        splunk.getSearch = AsyncMock(return_value={'name': 'one', 'content': {}})
+        state = sadface.DeployState()
+        state.record('app', 'one', 'abc', '2021-01-01T00:00:00+00:00')
+
+        indexes = asyncio.run(sadface.fetchInventoryAsync(
+            splunk, ['app'], [('app', 'one', {})], state, asyncio.Semaphore(2)
+        ))
+
+        assert indexes == {'app': {'one': {'name': 'one', 'content': {}}}}
+        splunk.getSearch.assert_awaited_once_with('app', 'one')
+
+    def test_deploySearchDeadline(self):
+        splunk = MagicMock()
+        searchconfig = {'search': 'index=*'}
+        state = sadface.DeployState()
+
+        result = sadface.deploySearch(
+            splunk, 'app', 'search', searchconfig, {}, state,
+            sadface.Deadline(0)
+        )
+        assert result == 'skipped'
+        splunk.renderPayload.assert_not_called()
+
+        splunk.searchMatches.return_value = False
+        splunk.deployPayload.side_effect = DeadlineExceeded()
+        result = sadface.deploySearch(
+            splunk, 'app', 'search', searchconfig, {}, state,
+            sadface.Deadline(10)
+        )
+        assert result == 'skipped'
+        assert state.hasChanged('app', 'search', fingerprint(searchconfig))
+
+    def test_prioritise(self):
+        state = sadface.DeployState()
+        searches = [
+            ('app', name, {'search': name, 'severity': severity})
+            for name, severity in (
+                ('low', 'Low'),
+                ('high', 'High'),
+                ('critical', 'Critical'),
+                ('criticalDeployed', 'Critical'),
+                ('highDeployed', 'High'),
+                ('medium', 'Medium')
+            )
+        ]
+        for _, name, searchconfig in searches:
+            if name.endswith('Deployed'):
+                state.record('app', name, fingerprint(searchconfig))
+
+        assert [name for _, name, _ in sadface.prioritise(searches, state)] == [
+            'critical', 'criticalDeployed', 'high', 'medium', 'low',
+            'highDeployed'
+        ]
+
+    @patch.object(loader, 'os')
+    @patch.object(loader, 'glob')
+    @patch.object(loader, 'loadFile')
+    @patch.object(sadface, 'SplunkClient')
+    @patch.object(sadface, 'loadConfig')
+    def test_deployDeadline(self, mk_ldcfg, mk_splunk, mk_load, mk_glob, mk_os):
+        mk_ldcfg.return_value = GOOD_CONFIG_SM
         mk_os.listdir = MagicMock(return_value=['testapp'])
         mk_glob.glob = MagicMock(return_value=['testfile'])
-        mk_benedict.from_yaml = MagicMock(return_value=TEST_SEARCH)
-        mk_ds.return_value = 200
+        mk_load.side_effect = loadedFile(TEST_SEARCH)
+        splunk = mk_splunk.return_value
+        splunk.getInventory.return_value = {'testapp': {'Unmanaged': {}}}
+        splunk.requestStats.return_value = {'retries': 0, 'throttled': 0}
+
+        with self.assertLogs('sad', level='WARNING') as logs:
+            result = sadface.deploy(deadline=0)
 
-        assert sadface.deploy() == None
+        assert result == {
+            'unchanged': 0, 'updated': 0, 'created': 0, 'deleted': 0,
+            'retries': 0, 'throttled': 0, 'skipped': 2, 'resumed': 0
+        }
+        assert 'Deadline reached' in '\n'.join(logs.output)
+        splunk.deployPayload.assert_not_called()
+        splunk.deleteSearch.assert_not_called()
+        assert splunk.setDeadline.call_args[0][0].expired()
+
+    @patch.object(loader, 'os')
+    @patch.object(loader, 'glob')
+    @patch.object(loader, 'loadFile')
+    @patch.object(sadface, 'SplunkClient')
+    @patch.object(sadface, 'loadConfig')
+    def test_deployDeadlineConnecting(self, mk_ldcfg, mk_splunk, mk_load, mk_glob, mk_os):
+        mk_ldcfg.return_value = GOOD_CONFIG_SM
+        mk_os.listdir = MagicMock(return_value=['testapp'])
+        mk_glob.glob = MagicMock(return_value=['testfile'])
+        mk_load.side_effect = loadedFile(TEST_SEARCH)
+        skipped = {
+            'unchanged': 0, 'updated': 0, 'created': 0, 'deleted': 0,
+            'retries': 0, 'throttled': 0, 'skipped': 1, 'resumed': 0
+        }
+
+        # Out of time logging in.
+        mk_splunk.side_effect = DeadlineExceeded('Deadline reached!')
+        assert sadface.deploy(deadline=5) == skipped
+        assert not mk_splunk.call_args[1]['deadline'].expired()
+
+        # Out of time listing what's in Splunk.
+        mk_splunk.side_effect = None
+        splunk = mk_splunk.return_value
+        splunk.requestStats.return_value = {'retries': 0, 'throttled': 0}
+        splunk.getInventory.side_effect = DeadlineExceeded('Deadline reached!')
+        assert sadface.deploy(deadline=5) == skipped
+        splunk.deployPayload.assert_not_called()
+
+    @patch.object(loader, 'os')
+    @patch.object(loader, 'glob')
+    @patch.object(loader, 'loadFile')
+    @patch.object(sadface, 'SplunkClient')
+    @patch.object(sadface, 'loadConfig')
+    def test_deployFailureCancels(self, mk_ldcfg, mk_splunk, mk_load, mk_glob, mk_os):
+        mk_ldcfg.return_value = GOOD_CONFIG_SM
+        mk_os.listdir = MagicMock(return_value=['testapp'])
+        mk_glob.glob = MagicMock(return_value=['testfile'])
+        mk_load.side_effect = loadedFile({
+            'Search {}'.format(n): dict(TEST_SEARCH['Test Search'], cyber=dict(TEST_SEARCH['Test Search']['cyber']))
+            for n in range(100)
+        })
+        splunk = mk_splunk.return_value
+        splunk.getInventory.return_value = {'testapp': {}}
+        splunk.searchMatches.return_value = False
+
+        def deployPayload(app, searchname, payload, index):
+            if searchname == 'Search 1':
+                raise SplunkUpdateFailed('Bad request!')
+            time.sleep(0.01)
+            return 201
+        splunk.deployPayload.side_effect = deployPayload
+
+        with self.assertRaises(SplunkUpdateFailed):
+            sadface.deploy(workers=2)
+
+        # The searches still queued behind the failure are never sent.
+        assert splunk.deployPayload.call_count < 20
+
+    @patch.object(loader, 'os')
+    @patch.object(loader, 'glob')
+    @patch.object(loader, 'loadFile')
+    @patch.object(sadface, 'SplunkClient')
+    @patch.object(sadface, 'loadConfig')
+    def test_deployFailureJournalled(self, mk_ldcfg, mk_splunk, mk_load, mk_glob, mk_os):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, 'checkpoint.json')
+        config = copy.deepcopy(GOOD_CONFIG_SM)
+        config['general']['checkpoint'] = {'backend': 'local', 'path': path}
+        mk_ldcfg.return_value = config
+        mk_os.listdir = MagicMock(return_value=['testapp'])
+        mk_glob.glob = MagicMock(return_value=['testfile'])
+        mk_load.side_effect = loadedFile({
+            'Search {}'.format(n): dict(TEST_SEARCH['Test Search'], cyber=dict(TEST_SEARCH['Test Search']['cyber']))
+            for n in range(40)
+        })
+        splunk = mk_splunk.return_value
+        splunk.getInventory.return_value = {'testapp': {}}
+        splunk.searchMatches.return_value = False
+        deployed = []
+
+        # The failure comes back while other searches are still running.
+        def deployPayload(app, searchname, payload, index):
+            if searchname == 'Search 10':
+                raise SplunkUpdateFailed('Bad request!')
+            time.sleep(0.02)
+            deployed.append('testapp/' + searchname)
+            return 201
+        splunk.deployPayload.side_effect = deployPayload
+
+        with self.assertRaises(SplunkUpdateFailed):
+            sadface.deploy(workers=4)
+
+        with open(path) as f:
+            journal = json.load(f)
+        assert sorted(journal['completed']) == sorted(deployed)
+        assert len(deployed) > 10
+
+    @patch.object(loader, 'os')
+    @patch.object(loader, 'glob')
+    @patch.object(loader, 'loadFile')
+    @patch.object(sadface, 'SplunkClient')
+    @patch.object(sadface, 'loadConfig')
+    def test_deployResume(self, mk_ldcfg, mk_splunk, mk_load, mk_glob, mk_os):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        config = copy.deepcopy(GOOD_CONFIG_SM)
+        config['general']['checkpoint'] = {
+            'backend': 'local',
+            'path': os.path.join(tmp.name, 'checkpoint.json')
+        }
+        mk_ldcfg.return_value = config
+        mk_os.listdir = MagicMock(return_value=['testapp'])
+        mk_glob.glob = MagicMock(return_value=['testfile'])
+        mk_load.side_effect = loadedFile({
+            'Search {}'.format(n): dict(TEST_SEARCH['Test Search'], cyber=dict(TEST_SEARCH['Test Search']['cyber']))
+            for n in range(10)
+        })
+        splunk = mk_splunk.return_value
+        splunk.getInventory.return_value = {'testapp': {}}
+        splunk.searchMatches.return_value = False
+        splunk.requestStats.return_value = {'retries': 0, 'throttled': 0}
+
+        # Splunk goes down part way through the first run.
+        deployed = []
+        def deployPayload(app, searchname, payload, index):
+            if searchname == 'Search 3':
+                raise SplunkUpdateFailed('Splunk is down!')
+            deployed.append(searchname)
+            return 201
+        splunk.deployPayload.side_effect = deployPayload
+
+        with self.assertRaises(SplunkUpdateFailed):
+            sadface.deploy(workers=1)
+
+        splunk.deployPayload.reset_mock(side_effect=True)
+        splunk.deployPayload.return_value = 201
+        result = sadface.deploy(workers=1)
+
+        # Any search already running when Search 3 failed is resumed too.
+        assert len(deployed) >= 3
+        assert result['resumed'] == len(deployed)
+        assert result['created'] == 10 - len(deployed)
+        assert 'Search 0' not in [
+            c[0][1] for c in splunk.deployPayload.call_args_list
+        ]
+
+        # A completed run starts the next one afresh.
+        splunk.deployPayload.reset_mock()
+        result = sadface.deploy(workers=1)
+        assert result['resumed'] == 0
+        assert splunk.deployPayload.call_count == 10
+
+    @patch.object(loader, 'os')
+    @patch.object(loader, 'glob')
+    @patch.object(loader, 'loadFile')
+    @patch.object(sadface, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    @patch.object(sadface, 'SplunkClient')
+    @patch.object(sadface, 'loadConfig')
+    def test_deployShards(self, mk_ldcfg, mk_splunk, mk_load, mk_glob, mk_os):
+        config = copy.deepcopy(GOOD_CONFIG_SM)
+        config['general']['shards'] = {'count': 2, 'by': 'search'}
+        mk_ldcfg.return_value = config
+        mk_os.listdir = MagicMock(return_value=['testapp'])
+        mk_glob.glob = MagicMock(return_value=['testfile'])
+        mk_load.side_effect = loadedFile({
+            'Search {}'.format(n): dict(TEST_SEARCH['Test Search'], cyber=dict(TEST_SEARCH['Test Search']['cyber']))
+            for n in range(20)
+        })
+        splunk = mk_splunk.return_value
+        splunk.getInventory.return_value = {'testapp': {
+            'Search 0': {}, 'Search 1': {}, 'Unmanaged': {}
+        }}
+        splunk.searchMatches.side_effect = lambda app, name, payload, index: name in index
+        splunk.deployPayload.return_value = 201
+        splunk.requestStats.return_value = {'retries': 0, 'throttled': 0}
+
+        result = sadface.deploy(workers=2, shards=4)
+
+        assert result == {
+            'unchanged': 2, 'updated': 0, 'created': 18, 'deleted': 1,
+            'retries': 0, 'throttled': 0, 'skipped': 0, 'resumed': 0
+        }
+        # The coordinator plus one client for each non-empty shard.
+        assert mk_splunk.call_count == 5
+        # Searches deployed by any shard are managed, not deleted.
+        splunk.deleteSearch.assert_called_once_with(app='testapp', searchName='Unmanaged')
+
+    @patch.object(sadface, 'SplunkClient')
+    def test_deployShard(self, mk_splunk):
+        splunk = mk_splunk.return_value
+        splunk.searchMatches.return_value = False
+        splunk.deployPayload.side_effect = lambda app, name, payload, index: 200 if name in index else 201
+        splunk.requestStats.side_effect = [
+            {'retries': 1, 'throttled': 1},
+            {'retries': 3, 'throttled': 1}
+        ]
+        searches = [
+            ('app', 'one', {'search': 'index=1', 'severity': 'Low'}),
+            ('app', 'two', {'search': 'index=2', 'severity': 'Low'})
+        ]
+        indexes = {'app': {'one': {'name': 'one'}}}
+
+        outcome = sadface.deployShard(GOOD_CONFIG_ENV, searches, indexes, 2, deadline=10)
+
+        assert sorted(outcome['results']) == [
+            ('app', 'one', 'updated'), ('app', 'two', 'created')
+        ]
+        assert sorted(outcome['state']) == ['app/one', 'app/two']
+        assert outcome['stats'] == {'retries': 2, 'throttled': 0}
+        splunk.deleteSearch.assert_not_called()
+        # The inventory comes from the coordinator.
+        splunk.getInventory.assert_not_called()
+
+    def test_triage(self):
+        splunk = MagicMock()
+        splunk.searchMatches.side_effect = lambda app, name, payload, index: name == 'one'
+        state = sadface.DeployState()
+        searches = [
+            ('app', 'one', {'search': 'index=1'}),
+            ('app', 'two', {'search': 'index=2'}),
+            ('app', 'new', {'search': 'index=3'})
+        ]
+        indexes = {'app': {
+            'one': {'name': 'one', 'updated': '2021-01-01T00:00:00+00:00', 'content': {}},
+            'two': {'name': 'two', 'updated': '2021-01-01T00:00:00+00:00', 'content': {}},
+            'Unmanaged': {'name': 'Unmanaged'}
+        }}
+
+        unchanged, changed = sadface.triage(splunk, searches, indexes, state)
+
+        assert unchanged == [('app', 'one', 'unchanged')]
+        assert changed == searches[1:]
+        assert state.isUnchanged('app', 'one', fingerprint(searches[0][2]), indexes['app']['one'])
+
+        # Shards only hear which of their searches exist.
+        assert sadface.shardIndexes(changed, indexes) == {'app': {'two': {'name': 'two'}}}
+
+    @patch('boto3.client')
+    @patch.object(sadface, 'invokeShard')
+    def test_submitShardsLambda(self, mk_invoke, mk_boto):
+        mk_invoke.return_value = {'results': []}
+        settings = {'count': 2, 'by': 'app', 'dispatch': 'lambda', 'function': 'sad'}
+        content = [
+            ('app', 'one', {'search': 'index=1'}),
+            ('app', 'done', {'search': 'index=2'}),
+            ('other', 'two', {'search': 'index=3'})
+        ]
+        shards = [[content[0]], [content[2]]]
+        indexes = {'app': {}, 'other': {'two': {'name': 'two', 'content': {}}}}
+
+        with ThreadPoolExecutor() as executor:
+            futures = sadface.submitShards(
+                executor, GOOD_CONFIG_ENV, settings, shards, indexes, content,
+                3, sadface.Deadline(10)
+            )
+            assert [f.result() for f in futures] == [{'results': []}] * 2
+
+        function, payload = mk_invoke.call_args_list[1][0][1:]
+        assert function == 'sad'
+        # Positions in the content, not the searches themselves.
+        assert payload['shard']['searches'] == [2]
+        assert payload['shard']['revision'] == sadface.shardRevision(content)
+        assert payload['shard']['indexes'] == {'other': {'two': {'name': 'two'}}}
+        assert payload['shard']['workers'] == 3
+        assert 9 < payload['shard']['deadline'] <= 10
+
+    @params(
+        (5, 5),
+        (20, 8),
+        (None, 8)
+    )
+    @patch.object(sadface, 'selectContent')
+    @patch.object(sadface, 'warmConfig')
+    @patch.object(sadface, 'deployShard')
+    def test_lambdaHandlerShard(self, deadline, expected, mk_shard, mk_warm, mk_select):
+        mk_shard.return_value = {'results': [], 'state': {}, 'stats': {}}
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = 10000
+        content = [('app', 'one', {'search': 'index=1'}), ('app', 'two', {'search': 'index=2'})]
+        mk_select.return_value = (['app'], content, {}, {})
+        indexes = {'app': {}}
+
+        result = sadface.lambda_handler(
+            {'shard': {
+                'revision': sadface.shardRevision(content),
+                'searches': [1],
+                'indexes': indexes,
+                'workers': 2,
+                'deadline': deadline
+            }},
+            context
+        )
+
+        assert result['statusCode'] == 200
+        mk_select.assert_called_once_with(compiled=True)
+        # Never past the end of this invocation.
+        mk_shard.assert_called_once_with(
+            mk_warm.return_value, [content[1]], indexes, 2,
+            deadline=expected, reuse=True
+        )
+
+    @patch.object(sadface, 'selectContent')
+    @patch.object(sadface, 'warmConfig')
+    @patch.object(sadface, 'deployShard')
+    def test_lambdaHandlerShardOtherContent(self, mk_shard, mk_warm, mk_select):
+        mk_select.return_value = (['app'], [('app', 'one', {'search': 'index=1'})], {}, {})
+
+        result = sadface.lambda_handler(
+            {'shard': {'revision': 'other', 'searches': [0], 'indexes': {}}},
+            {}
+        )
+
+        assert result['statusCode'] == 500
+        assert 'ShardDeployFailed' in result['body']
+        mk_shard.assert_not_called()
+
+    @params(
+        (15000, 13),
+        (1500, 0),
+        (None, None)
+    )
+    def test_remainingTime(self, millis, expected):
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = millis
+        if millis is None:
+            context = {}
+
+        assert sadface.remainingTime(context) == expected
+
+    @patch.object(sadface, 'deploy')
+    def test_lambdaHandlerDeadline(self, mk_deploy):
+        mk_deploy.return_value = {}
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = 10000
+
+        sadface.lambda_handler({}, context)
+
+        mk_deploy.assert_called_once_with(reuse=True, deadline=8, compiled=True)
+
+    @patch.object(sadface, 'deployAsync')
+    @patch.object(sadface, 'deploy')
+    def test_lambdaHandlerAsync(self, mk_deploy, mk_deployAsync):
+        mk_deployAsync.return_value = {'unchanged': 1}
+        result = sadface.lambda_handler({'async': True}, {})
+
+        assert result['statusCode'] == 200
+        mk_deployAsync.assert_awaited_once()
+        mk_deploy.assert_not_called()
 
     @patch.object(sadface, 'deploy')
     @patch.object(sadface, 'loadConfig')
     def test_lambdaHandlerOKDebug(self, mk_ldcfg, mk_deploy):
+        mk_deploy.return_value = {}
         result = sadface.lambda_handler({'debug': True}, {})
     
         assert result['statusCode'] == 200
@@ -163,19 +973,113 @@ class TestSadFace(unittest.TestCase):
     @patch.object(sadface, 'deploy')
     @patch.object(sadface, 'loadConfig')
     def test_lambdaHandlerOK(self, mk_ldcfg, mk_deploy):
+        mk_deploy.return_value = {'unchanged': 1}
         result = sadface.lambda_handler({}, {})
     
         assert result['statusCode'] == 200
 
     def test_lambdaHandlerFail(self):
+        sadface.WARM['config'] = GOOD_CONFIG_SM
         result = sadface.lambda_handler({'debug': True}, {})
         assert result['statusCode'] == 500
+        self.assertIsNone(sadface.WARM['config'])
 
-    @patch.object(sadface, 'os')
-    @patch.object(sadface, 'glob')
-    @patch.object(sadface, 'benedict')
+    @patch.object(sadface, 'deploy')
+    def test_lambdaHandlerReuse(self, mk_deploy):
+        mk_deploy.return_value = {}
+        sadface.lambda_handler({}, {})
+
+        mk_deploy.assert_called_once_with(reuse=True, deadline=None, compiled=True)
+
+    @patch.object(sadface, 'time')
+    @patch.object(sadface, 'SplunkClient')
+    @patch.object(sadface, 'loadConfig')
+    def test_warmReuse(self, mk_ldcfg, mk_splunk, mk_time):
+        sadface.resetWarm()
+        config = copy.deepcopy(GOOD_CONFIG_SM)
+        config['splunk']['secrets']['ttl'] = 60
+        mk_ldcfg.return_value = config
+        mk_time.monotonic.return_value = 1000
+        settings = sadface.splunkSettings(config, 1)
+
+        assert sadface.warmConfig() is config
+        client = sadface.warmClient(settings)
+        mk_time.monotonic.return_value = 1059
+        assert sadface.warmConfig() is config
+        assert sadface.warmClient(settings) is client
+        assert mk_ldcfg.call_count == 1
+        assert mk_splunk.call_count == 1
+
+        # A different worker count needs a bigger pool, so a new client.
+        sadface.warmClient(sadface.splunkSettings(config, 20))
+        assert mk_splunk.call_count == 2
+
+        # Once the TTL runs out, secrets are loaded and logged in again.
+        mk_time.monotonic.return_value = 1060
+        sadface.warmConfig()
+        sadface.warmClient(sadface.splunkSettings(config, 20))
+        assert mk_ldcfg.call_count == 2
+        assert mk_splunk.call_count == 3
+        sadface.resetWarm()
+
+    @patch.object(loader, 'os')
+    @patch.object(loader, 'glob')
+    @patch.object(loader, 'loadFile')
     @patch.object(sadface, 'SplunkClient')
     @patch.object(sadface, 'loadConfig')
     @patch.object(sys, 'argv', ['sadface.py','deploy', '--debug'])
-    def test_deployCLI(self, mk_ldcfg, mk_splunk, mk_benedict, mk_glob, mk_os):
+    def test_deployCLI(self, mk_ldcfg, mk_splunk, mk_load, mk_glob, mk_os):
+        mk_ldcfg.return_value = GOOD_CONFIG_SM
         assert sadface.main() == None
+
+    @patch.object(sadface, 'compileContent')
+    def test_mainCompile(self, mk_compile):
+        with patch.object(sys, 'argv', ['sadface.py', 'compile', '--nojson']):
+            sadface.main()
+
+        mk_compile.assert_called_once_with('src/bundle.json')
+
+    @params(True, False)
+    @patch.object(sadface, 'validate')
+    @patch.object(sadface.cli, 'banner')
+    @patch.object(sadface, 'sys')
+    def test_mainBanner(self, tty, mk_sys, mk_banner, mk_validate):
+        mk_sys.stdout.isatty.return_value = tty
+
+        with patch.object(sys, 'argv', ['sadface.py', 'validate', '--nojson']):
+            sadface.main()
+
+        assert mk_banner.called == tty
+
+
+class TestColdStart(unittest.TestCase):
+    '''
+    Guards the Lambda cold start, by importing sadface in a fresh
+    interpreter as Lambda does.
+    '''
+
+    def importSadface(self):
+        '''
+        Returns: names of the modules loaded by importing sadface
+        '''
+        result = subprocess.run(
+            [
+                sys.executable, '-c',
+                'import sadface, sys; print(" ".join(sys.modules))'
+            ],
+            cwd=SRC_DIR,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True
+        )
+        return set(result.stdout.split())
+
+    def test_lazyImports(self):
+        modules = self.importSadface()
+
+        assert modules.isdisjoint(HEAVY_MODULES), (
+            'Importing sadface loaded {}.'.format(
+                ', '.join(sorted(modules.intersection(HEAVY_MODULES)))
+            )
+        )
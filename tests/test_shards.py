@@ -0,0 +1,84 @@
+import io
+import json
+import unittest
+
+from shards import invokeShard, partition, shardIndex
+from exceptions import ShardDeployFailed
+
+from unittest.mock import MagicMock
+
+from nose2.tools import params
+
+
+SEARCHES = [
+    (app, 'Search {}'.format(n), {'search': 'index={}'.format(n)})
+    for app in ('alpha', 'beta', 'gamma')
+    for n in range(20)
+]
+
+
+def makeClient(statusCode, body, functionError=None):
+    response = {
+        'Payload': io.BytesIO(json.dumps({
+            'statusCode': statusCode,
+            'body': json.dumps(body)
+        }).encode('utf-8'))
+    }
+    if functionError:
+        response['FunctionError'] = functionError
+    client = MagicMock()
+    client.invoke.return_value = response
+    return client
+
+
+class TestShards(unittest.TestCase):
+
+    @params('app', 'search')
+    def test_shardIndex(self, by):
+        index = shardIndex('alpha', 'Search 1', 4, by)
+
+        assert 0 <= index < 4
+        assert shardIndex('alpha', 'Search 1', 4, by) == index
+
+    def test_partitionByApp(self):
+        shards = partition(SEARCHES, 8, 'app')
+
+        assert sum(len(shard) for shard in shards) == len(SEARCHES)
+        for shard in shards:
+            assert shard
+            # Whole apps, in their original order.
+            for app in set(search[0] for search in shard):
+                assert [s for s in shard if s[0] == app] == [
+                    s for s in SEARCHES if s[0] == app
+                ]
+
+    def test_partitionBySearch(self):
+        shards = partition(SEARCHES, 4, 'search')
+
+        assert len(shards) == 4
+        assert sorted(s[1] + s[0] for shard in shards for s in shard) == sorted(
+            s[1] + s[0] for s in SEARCHES
+        )
+        assert all(len(set(s[0] for s in shard)) > 1 for shard in shards)
+
+    def test_partitionOne(self):
+        assert partition(SEARCHES, 1) == [SEARCHES]
+        assert partition([], 4) == []
+
+    def test_invokeShard(self):
+        outcome = {'results': [['alpha', 'Search 1', 'created']]}
+        client = makeClient(200, outcome)
+
+        assert invokeShard(client, 'sadface', {'shard': {}}) == outcome
+        assert client.invoke.call_args[1]['FunctionName'] == 'sadface'
+        assert client.invoke.call_args[1]['InvocationType'] == 'RequestResponse'
+
+    @params(
+        (500, {'Error': 'Oops'}, None),
+        (200, {}, 'Unhandled')
+    )
+    def test_invokeShardFailed(self, statusCode, body, functionError):
+        client = makeClient(statusCode, body, functionError)
+
+        with self.assertRaises(ShardDeployFailed):
+            invokeShard(client, 'sadface', {'shard': {}})
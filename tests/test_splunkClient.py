@@ -1,11 +1,19 @@
+import io
 import unittest
 import json
+import requests
 import splunkClient
+import threading
+import time
 from requests import Response
+from requests.adapters import BaseAdapter
 
+from deadline import Deadline
 from splunkClient import SplunkClient
+from throttle import AdaptiveLimiter, RetryPolicy
 
 from exceptions import ConfigValidateFailed, SplunkConnectFailed
+from exceptions import DeadlineExceeded
 from exceptions import SplunkGetFailed, SplunkValidateFailed, SplunkUpdateFailed
 
 from unittest.mock import MagicMock, patch
@@ -33,10 +41,200 @@ BAD_SCONFIG = {
     'actions': [{'Add to Triggered Alerts': None}]
 }
 
+class FakeAdapter(BaseAdapter):
+    '''
+    Transport adapter standing in for Splunk, which rejects any session
+    key other than the current one.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.sessionKey = 'old'
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append((request.url, request.headers.get('Authorization')))
+        r = Response()
+        r.request = request
+        r.raw = io.BytesIO()
+
+        if request.url.endswith(splunkClient.LOGIN_API):
+            self.sessionKey = 'new'
+            r.status_code = 200
+            r._content = json.dumps({'sessionKey': 'new'}).encode('utf-8')
+        elif request.headers.get('Authorization') == 'Splunk {}'.format(self.sessionKey):
+            r.status_code = 200
+            r._content = b'{"entry": []}'
+        else:
+            r.status_code = 401
+            r._content = b'{"messages": [{"type": "WARN", "text": "call not properly authenticated"}]}'
+        return r
+
+    def close(self):
+        pass
+
+
+class TestRetryAdapter(unittest.TestCase):
+
+    def makeResponse(self, status, retryAfter=None):
+        r = Response()
+        r.status_code = status
+        r._content = b'{}'
+        if retryAfter:
+            r.headers['Retry-After'] = retryAfter
+        return r
+
+    @patch.object(splunkClient, 'time')
+    @patch.object(splunkClient.HTTPAdapter, 'send')
+    def test_retry(self, mk_send, mk_time):
+        mk_send.side_effect = [
+            self.makeResponse(503, retryAfter='2'),
+            self.makeResponse(429, retryAfter='3'),
+            self.makeResponse(200)
+        ]
+        limiter = AdaptiveLimiter(4)
+        adapter = splunkClient.RetryAdapter(limiter, RetryPolicy())
+
+        r = adapter.send(MagicMock(), timeout=5)
+
+        assert r.status_code == 200
+        assert mk_send.call_count == 3
+        assert mk_send.call_args[1] == {'timeout': 5}
+        assert [c[0][0] for c in mk_time.sleep.call_args_list] == [2, 3]
+        assert limiter.stats() == {'retries': 2, 'throttled': 2}
+        assert limiter.limit == 2
+
+    @patch.object(splunkClient, 'time')
+    @patch.object(splunkClient.HTTPAdapter, 'send')
+    def test_retryExhausted(self, mk_send, mk_time):
+        mk_send.side_effect = [self.makeResponse(502), self.makeResponse(502)]
+        limiter = AdaptiveLimiter(4)
+        adapter = splunkClient.RetryAdapter(limiter, RetryPolicy(retries=1))
+
+        assert adapter.send(MagicMock()).status_code == 502
+        assert mk_send.call_count == 2
+        assert limiter.stats() == {'retries': 1, 'throttled': 0}
+
+    @params(
+        ('POST', 'https://splunk:8089/servicesNS/admin/app/saved/searches?output_mode=json', False),
+        ('POST', '/servicesNS/admin/app/saved/searches/', False),
+        ('POST', '/servicesNS/admin/app/saved/searches/Existing?output_mode=json', True),
+        ('GET', '/servicesNS/admin/app/saved/searches', True),
+        ('POST', '/services/auth/login', True)
+    )
+    def test_isIdempotent(self, method, url, expected):
+        assert splunkClient.isIdempotent(method, url) == expected
+
+    @patch.object(splunkClient, 'time')
+    @patch.object(splunkClient.HTTPAdapter, 'send')
+    def test_retryCreate(self, mk_send, mk_time):
+        mk_send.side_effect = [
+            self.makeResponse(503),
+            self.makeResponse(502),
+            self.makeResponse(201)
+        ]
+        adapter = splunkClient.RetryAdapter(AdaptiveLimiter(4), RetryPolicy())
+        request = MagicMock(method='POST', url='/servicesNS/admin/app/saved/searches')
+
+        # Splunk may have created the search before the gateway gave up.
+        assert adapter.send(request).status_code == 502
+        assert mk_send.call_count == 2
+
+    @patch.object(splunkClient.HTTPAdapter, 'send')
+    def test_timeout(self, mk_send):
+        mk_send.return_value = self.makeResponse(200)
+        adapter = splunkClient.RetryAdapter(AdaptiveLimiter(4), RetryPolicy())
+
+        adapter.send(MagicMock(), timeout=None)
+        assert mk_send.call_args[1]['timeout'] == splunkClient.DEFAULT_TIMEOUT
+
+        adapter.deadline = Deadline(2)
+        adapter.send(MagicMock(), timeout=None)
+        assert 1 < mk_send.call_args[1]['timeout'] <= 2
+
+    @patch.object(splunkClient.HTTPAdapter, 'send')
+    def test_deadlinePassed(self, mk_send):
+        adapter = splunkClient.RetryAdapter(AdaptiveLimiter(4), RetryPolicy())
+        adapter.deadline = Deadline(0)
+
+        with self.assertRaises(DeadlineExceeded):
+            adapter.send(MagicMock())
+        mk_send.assert_not_called()
+
+    @patch.object(splunkClient.HTTPAdapter, 'send')
+    def test_deadlineTimeout(self, mk_send):
+        adapter = splunkClient.RetryAdapter(AdaptiveLimiter(4), RetryPolicy())
+        adapter.deadline = Deadline(0.01)
+
+        def timeout(request, **kwargs):
+            time.sleep(kwargs['timeout'])
+            raise requests.Timeout()
+        mk_send.side_effect = timeout
+
+        with self.assertRaises(DeadlineExceeded):
+            adapter.send(MagicMock())
+
+        adapter.deadline = Deadline()
+        mk_send.side_effect = requests.Timeout()
+        with self.assertRaises(requests.Timeout):
+            adapter.send(MagicMock())
+
+    @patch.object(splunkClient.HTTPAdapter, 'send')
+    def test_connectDeadline(self, mk_send):
+        with self.assertRaises(DeadlineExceeded):
+            SplunkClient(
+                host='splunk.internal',
+                port=8089,
+                username='michael.j.fox',
+                password='TeenWolf2021',
+                deadline=Deadline(0)
+            )
+
+        # The login itself is bounded, not just the calls after it.
+        mk_send.assert_not_called()
+
+    @patch.object(splunkClient, 'time')
+    @patch.object(splunkClient.HTTPAdapter, 'send')
+    def test_retryPastDeadline(self, mk_send, mk_time):
+        mk_send.return_value = self.makeResponse(503, retryAfter='10')
+        limiter = AdaptiveLimiter(4)
+        adapter = splunkClient.RetryAdapter(limiter, RetryPolicy())
+        adapter.deadline = Deadline(5)
+
+        assert adapter.send(MagicMock()).status_code == 503
+        assert mk_send.call_count == 1
+        mk_time.sleep.assert_not_called()
+        assert limiter.stats() == {'retries': 0, 'throttled': 1}
+
+    @patch.object(splunkClient.SplunkClient, 'getServerInfo')
+    @patch.object(splunkClient.SplunkClient, '_login')
+    def test_sessionAdapter(self, mk_login, mk_info):
+        client = SplunkClient(
+            host="splunk.internal",
+            port=8089,
+            token="DeLorean88",
+            pool={'size': 6},
+            retry={'retries': 2}
+        )
+        adapter = client._session.get_adapter('https://splunk.internal:8089')
+
+        self.assertIsInstance(adapter, splunkClient.RetryAdapter)
+        assert adapter._policy.retries == 2
+        assert adapter._limiter.limit == 6
+        assert adapter._timeout == splunkClient.DEFAULT_TIMEOUT
+        assert client.requestStats() == {'retries': 0, 'throttled': 0}
+
+        deadline = Deadline(10)
+        client.setDeadline(deadline)
+        assert adapter.deadline is deadline
+
+
 class TestInitClient(unittest.TestCase):
 
-    @patch.object(splunkClient.SplunkClient, 'listSearches')
-    def test_initClient(self, mk_list):
+    @patch.object(splunkClient.SplunkClient, 'getServerInfo')
+    @patch.object(splunkClient.SplunkClient, '_login')
+    def test_initClient(self, mk_login, mk_list):
+        mk_login.return_value = 'abc123'
         client = SplunkClient(
             host="splunk.internal",
             port=8089,
@@ -44,21 +242,126 @@ class TestInitClient(unittest.TestCase):
             password="TeenWolf2021"
         )
         assert type(client) == SplunkClient
+        assert client._session.headers['Authorization'] == 'Splunk abc123'
+        self.assertIsNone(client._session.auth)
+
+    @patch.object(splunkClient.SplunkClient, 'getServerInfo')
+    @patch.object(splunkClient.SplunkClient, '_login')
+    def test_initClientToken(self, mk_login, mk_list):
+        client = SplunkClient(
+            host="splunk.internal",
+            port=8089,
+            token="DeLorean88"
+        )
+        assert client._session.headers['Authorization'] == 'Bearer DeLorean88'
+        mk_login.assert_not_called()
+
+    @patch.object(splunkClient.SplunkClient, 'getServerInfo')
+    @patch.object(splunkClient.SplunkClient, '_login')
+    def test_initClientPool(self, mk_login, mk_list):
+        mk_login.return_value = 'abc123'
+        client = SplunkClient(
+            host="splunk.internal",
+            port=8089,
+            username="michael.j.fox",
+            password="TeenWolf2021",
+            pool={'size': 4, 'keep_alive': False}
+        )
+        adapter = client._session.get_adapter('https://splunk.internal:8089')
+
+        assert adapter._pool_maxsize == 4
+        assert client._session.headers['Connection'] == 'close'
+
+    @patch.object(splunkClient.SplunkClient, '__init__')
+    def test_login(self, mk_init):
+        mk_init.return_value = None
+        r = MagicMock()
+        r.status_code = 200
+        r.text = '{"sessionKey": "abc123"}'
+
+        client = SplunkClient()
+        client._baseUrl = ''
+        client._creds = ("michael.j.fox", "TeenWolf2021")
+        client._session = MagicMock()
+        client._session.post.return_value = r
+
+        assert client._login() == 'abc123'
+        assert client._session.post.call_args[0][0] == '/services/auth/login'
+        assert client._session.post.call_args[1]['data']['username'] == 'michael.j.fox'
+
+    @params(
+        MagicMock(status_code=401, text='{"messages": [{"type": "WARN", "text": "Login failed"}]}'),
+        requests.ConnectionError('Name or service not known')
+    )
+    @patch.object(splunkClient.SplunkClient, '__init__')
+    def test_loginFail(self, response, mk_init):
+        mk_init.return_value = None
+
+        client = SplunkClient()
+        client._baseUrl = ''
+        client._creds = ("michael.j.fox", "TeenWolf2021")
+        client._session = MagicMock()
+        client._session.post.side_effect = [response]
+
+        with self.assertRaises(SplunkConnectFailed):
+            client._login()
+
+    @patch.object(splunkClient.SplunkClient, '__init__')
+    def test_reauthenticate(self, mk_init):
+        mk_init.return_value = None
 
-    @patch.object(splunkClient.SplunkClient, 'listSearches')
-    def test_testConnSucceed(self, mk_list):
+        client = SplunkClient()
+        client._baseUrl = 'https://splunk.internal:8089'
+        client._creds = ("michael.j.fox", "TeenWolf2021")
+        client._token = None
+        client._verify = True
+        client._authLock = threading.Lock()
+        client._session = client._createSession(None)
+        adapter = FakeAdapter()
+        client._session.mount('https://', adapter)
+        client._session.headers['Authorization'] = 'Splunk expired'
+
+        assert list(client.listSearches('test')) == []
+        assert client._session.headers['Authorization'] == 'Splunk new'
+        assert [auth for _, auth in adapter.sent] == [
+            'Splunk expired', 'Splunk expired', 'Splunk new'
+        ]
+        assert adapter.sent[1][0].endswith('/services/auth/login')
+
+        assert list(client.listSearches('test')) == []
+        assert len(adapter.sent) == 4
+
+    @patch.object(splunkClient.SplunkClient, 'getServerInfo')
+    def test_testConnSucceed(self, mk_info):
         assert SplunkClient._testConnection(SplunkClient) == None
+        mk_info.assert_called_once_with()
 
     @patch.object(splunkClient.SplunkClient, '__init__')
-    @patch.object(splunkClient.SplunkClient, 'listSearches')
-    def test_testConnFail(self, mk_list, mk_init):
+    @patch.object(splunkClient.SplunkClient, 'getServerInfo')
+    def test_testConnFail(self, mk_info, mk_init):
         mk_init.return_value = None
-        mk_list.side_effect = SplunkGetFailed
+        mk_info.side_effect = SplunkGetFailed
         client = SplunkClient()
 
         with self.assertRaises(SplunkConnectFailed):
             client._testConnection()
 
+    @patch.object(splunkClient.SplunkClient, '__init__')
+    def test_getServerInfo(self, mk_init):
+        mk_init.return_value = None
+        ok = MagicMock(status_code=200, text='{"entry": [{"content": {"version": "9.1.0"}}]}')
+        denied = MagicMock(status_code=401, text='{"messages": [{"type": "WARN", "text": "Unauthorized"}]}')
+
+        client = SplunkClient()
+        client._baseUrl = ''
+        client._session = MagicMock()
+        client._session.get.side_effect = [ok, denied]
+
+        assert client.getServerInfo() == {'version': '9.1.0'}
+        assert client._session.get.call_args[0][0] == '/services/server/info'
+        with self.assertRaises(SplunkGetFailed):
+            client.getServerInfo()
+
 class TestMapActions(unittest.TestCase):
 
     @params(
@@ -129,6 +432,51 @@ class TestMapActions(unittest.TestCase):
             'action.email.content_type': 'plain'
         }
 
+    @patch.dict(SplunkClient._renderedProfiles, clear=True)
+    @patch.object(splunkClient.SplunkClient, '__init__')
+    def test_mapActionsProfile(self, mk_init):
+        mk_init.return_value = None
+        client = SplunkClient()
+        actionList = [{'OpsGenie': None}, {'Add to Triggered Alerts': None}]
+
+        with patch.object(
+            SplunkClient,
+            '_renderActions',
+            wraps=client._renderActions
+        ) as mk_render:
+            first = client._mapActions(actionList, 'app/Page@1')
+            second = SplunkClient()._mapActions(actionList, 'app/Page@1')
+            client._mapActions(actionList, 'app/Page@2')
+            client._mapActions(actionList)
+
+        assert first is second
+        assert first == {
+            'actions': 'opsgenie',
+            'action.opsgenie': 1,
+            'alert.track': 1
+        }
+        assert mk_render.call_count == 3
+
+    @patch.object(splunkClient.SplunkClient, '__init__')
+    def test_renderPayloadProfile(self, mk_init):
+        mk_init.return_value = None
+        client = SplunkClient()
+        searchConfig = {
+            'search': 'index=*',
+            'description': 'Test',
+            'cron_schedule': '* * * * *',
+            'is_scheduled': 'True',
+            'severity': 'High',
+            'lookback': '-1h',
+            'actions': [{'OpsGenie': None}],
+            'action_profile': 'app/Page@1'
+        }
+
+        with patch.object(SplunkClient, '_mapActions', return_value={}) as mk_map:
+            client.renderPayload(searchConfig)
+
+        mk_map.assert_called_once_with([{'OpsGenie': None}], 'app/Page@1')
+
     @params(
         [{'Bad Action': None}],
         [{'Send email': None}]
@@ -166,6 +514,20 @@ class TestMapActions(unittest.TestCase):
 
         assert act == ['email', 'opsgenie']
 
+    @params(
+        ({'test': {'content': {'actions': 'email, opsgenie', 'alert.track': 1}}}, True),
+        ({'test': {'content': {'actions': 'opsgenie', 'alert.track': 1}}}, False),
+        ({'test': {'content': {'actions': 'email, opsgenie'}}}, False),
+        ({}, False)
+    )
+    @patch.object(splunkClient.SplunkClient, '__init__')
+    def test_searchMatches(self, index, expected, mk_init):
+        mk_init.return_value = None
+        client = SplunkClient()
+        payload = {'actions': 'opsgenie, email', 'alert.track': '1'}
+
+        assert client.searchMatches('test', 'test', payload, index) == expected
+
     def test_compareActions(self):
         result = SplunkClient._compareActions(SplunkClient, '1, 2', '2, 1')
 
@@ -197,82 +559,72 @@ class TestSplunkAPI(unittest.TestCase):
         }'''
         status_code = 0
 
-    @patch.object(splunkClient, 'requests')
     @patch.object(splunkClient.SplunkClient, '__init__')
-    def test_searchExists(self, mk_init, mk_req):
+    def test_searchExists(self, mk_init):
         mk_init.return_value = None
 
         client = SplunkClient()
         client._baseUrl = ''
-        client._creds = ''
-        client._verify = False
+        client._session = MagicMock()
 
         client._searchExists(searchName='test', app='test')
 
-    @patch.object(splunkClient, 'requests')
     @patch.object(splunkClient.SplunkClient, '__init__')
-    def test_deployNewSearch(self, mk_init, mk_req):
+    def test_deployNewSearch(self, mk_init):
         mk_init.return_value = None
         r = self.SplunkResponse
         r.status_code = 200
-        splunkClient.requests.post.return_value = r
 
         client = SplunkClient()
         client._baseUrl = ''
-        client._creds = ''
-        client._verify = False
+        client._session = MagicMock()
+        client._session.post.return_value = r
         client._validateSearch = MagicMock(return_value=(True,''))
         client._searchExists = MagicMock(return_value=False)
         
         client.deploySearch(searchName='test', app='test', searchConfig=VALID_SCONFIG)
 
-    @patch.object(splunkClient, 'requests')
     @patch.object(splunkClient.SplunkClient, '__init__')
-    def test_deployFailed(self, mk_init, mk_req):
+    def test_deployFailed(self, mk_init):
         mk_init.return_value = None
         r = self.SplunkResponse
         r.status_code = 404
-        splunkClient.requests.post.return_value = r
 
         client = SplunkClient()
         client._baseUrl = ''
-        client._creds = ''
-        client._verify = False
+        client._session = MagicMock()
+        client._session.post.return_value = r
         client._validateSearch = MagicMock(return_value=(True,'{}'))
         client._searchExists = MagicMock(return_value=False)
         
         with self.assertRaises(SplunkUpdateFailed):
             client.deploySearch(searchName='test', app='test', searchConfig=VALID_SCONFIG)
 
-    @patch.object(splunkClient, 'requests')
     @patch.object(splunkClient.SplunkClient, '__init__')
-    def test_updateSearch(self, mk_init, mk_req):
+    def test_updateSearch(self, mk_init):
         mk_init.return_value = None
         r = self.SplunkResponse
         r.status_code = 200
-        splunkClient.requests.post.return_value = r
 
         client = SplunkClient()
         client._baseUrl = ''
-        client._creds = ''
-        client._verify = False
+        client._session = MagicMock()
+        client._session.post.return_value = r
         client._validateSearch = MagicMock(return_value=(True,''))
         client._searchExists = MagicMock(return_value=True)
         
         client.deploySearch(searchName='test', app='test', searchConfig=VALID_SCONFIG)
 
-    @patch.object(splunkClient, 'requests')
     @patch.object(splunkClient.SplunkClient, '__init__')
-    def test_validateSuccess(self, mk_init, mk_req):
+    def test_validateSuccess(self, mk_init):
         mk_init.return_value = None
         r = self.SplunkResponse
         r.status_code = 200
-        splunkClient.requests.get.return_value = r
 
         client = SplunkClient()
         client._baseUrl = ''
-        client._creds = ''
-        client._verify = False
+        client._session = MagicMock()
+        client._session.get.return_value = r
         client._searchExists = MagicMock(return_value=True)
         client._compareActions = MagicMock(return_value=True)
         result, error = client._validateSearch(searchName='test', app='test', searchConfig=VALID_SCONFIG)
@@ -280,55 +632,85 @@ class TestSplunkAPI(unittest.TestCase):
         assert result == True
         assert error == ''
 
-    @patch.object(splunkClient, 'requests')
     @patch.object(splunkClient.SplunkClient, '__init__')
-    def test_validateFailedNotExists(self, mk_init, mk_req):
+    def test_validateFromResponse(self, mk_init):
+        mk_init.return_value = None
+
+        client = SplunkClient()
+        client._baseUrl = ''
+        client._session = MagicMock()
+        result, error = client._validateSearch(
+            searchName='test',
+            app='test',
+            searchConfig={'search': 'index=*', 'description': 'Test'},
+            response=self.SplunkResponse.text
+        )
+
+        self.assertTrue(result)
+        client._session.get.assert_not_called()
+
+    @params('', '{"entry": [{"name": "test", "content": {}}]}', 'not json')
+    @patch.object(splunkClient.SplunkClient, '__init__')
+    def test_validateResponseFallback(self, response, mk_init):
         mk_init.return_value = None
         r = self.SplunkResponse
         r.status_code = 200
-        splunkClient.requests.get.return_value = r
 
         client = SplunkClient()
         client._baseUrl = ''
-        client._creds = ''
-        client._verify = False
-        client._searchExists = MagicMock(return_value=False)
+        client._session = MagicMock()
+        client._session.get.return_value = r
+        result, error = client._validateSearch(
+            searchName='test',
+            app='test',
+            searchConfig={'search': 'index=*'},
+            response=response
+        )
+
+        self.assertTrue(result)
+        client._session.get.assert_called_once()
+
+    @patch.object(splunkClient.SplunkClient, '__init__')
+    def test_validateFailedNotExists(self, mk_init):
+        mk_init.return_value = None
+        r = self.SplunkResponse
+        r.status_code = 404
+
+        client = SplunkClient()
+        client._baseUrl = ''
+        client._session = MagicMock()
+        client._session.get.return_value = r
 
         result, error = client._validateSearch(searchName='test', app='test', searchConfig=VALID_SCONFIG)
         assert result == False
         assert error == 'Search does not exist!'
 
-    @patch.object(splunkClient, 'requests')
     @patch.object(splunkClient.SplunkClient, '__init__')
-    def test_validateFailed404(self, mk_init, mk_req):
+    def test_validateFailedGet(self, mk_init):
         mk_init.return_value = None
         r = self.SplunkResponse
-        r.status_code = 404
-        splunkClient.requests.get.return_value = r
+        r.status_code = 500
 
         client = SplunkClient()
         client._baseUrl = ''
-        client._creds = ''
-        client._verify = False
-        client._searchExists = MagicMock(return_value=True)
+        client._session = MagicMock()
+        client._session.get.return_value = r
 
         with self.assertRaises(
             (SplunkGetFailed)
         ):
             client._validateSearch(searchName='test', app='test', searchConfig=VALID_SCONFIG)
 
-    @patch.object(splunkClient, 'requests')
     @patch.object(splunkClient.SplunkClient, '__init__')
-    def test_validateFailedDiffName(self, mk_init, mk_req):
+    def test_validateFailedDiffName(self, mk_init):
         mk_init.return_value = None
         r = self.SplunkResponse
         r.status_code = 200
-        splunkClient.requests.get.return_value = r
 
         client = SplunkClient()
         client._baseUrl = ''
-        client._creds = ''
-        client._verify = False
+        client._session = MagicMock()
+        client._session.get.return_value = r
         client._searchExists = MagicMock(return_value=True)
         client._compareActions = MagicMock(return_value=True)
 
@@ -336,36 +718,32 @@ class TestSplunkAPI(unittest.TestCase):
         assert result == False
         assert error == 'Search name does not match!'
 
-    @patch.object(splunkClient, 'requests')
     @patch.object(splunkClient.SplunkClient, '__init__')
-    def test_validateFailedDiffValue(self, mk_init, mk_req):
+    def test_validateFailedDiffValue(self, mk_init):
         mk_init.return_value = None
         r = self.SplunkResponse
         r.status_code = 200
-        splunkClient.requests.get.return_value = r
 
         client = SplunkClient()
         client._baseUrl = ''
-        client._creds = ''
-        client._verify = False
+        client._session = MagicMock()
+        client._session.get.return_value = r
         client._searchExists = MagicMock(return_value=True)
     
         result,error = client._validateSearch(searchName='test', app='test', searchConfig=BAD_SCONFIG)
         assert result == False
         assert error == "Validation of search 'test' in app 'test' failed! Field description has unexpected value Test (expected Something else)."
 
-    @patch.object(splunkClient, 'requests')
     @patch.object(splunkClient.SplunkClient, '__init__')
-    def test_validateFailedDeploy(self, mk_init, mk_req):
+    def test_validateFailedDeploy(self, mk_init):
         mk_init.return_value = None
         r = self.SplunkResponse
         r.status_code = 200
-        splunkClient.requests.post.return_value = r
 
         client = SplunkClient()
         client._baseUrl = ''
-        client._creds = ''
-        client._verify = False
+        client._session = MagicMock()
+        client._session.post.return_value = r
         client._validateSearch = MagicMock(return_value=(False,''))
         client._searchExists = MagicMock(return_value=False)
 
@@ -374,66 +752,200 @@ class TestSplunkAPI(unittest.TestCase):
         ):
             client.deploySearch(searchName='test', app='test', searchConfig=VALID_SCONFIG)
 
-    @patch.object(splunkClient, 'requests')
     @patch.object(splunkClient.SplunkClient, '__init__')
-    def test_listSearchesSuccess(self, mk_init, mk_req):
+    def test_listSearchesSuccess(self, mk_init):
         mk_init.return_value = None
         r = self.SplunkResponse
         r.status_code = 200
-        splunkClient.requests.get.return_value = r
 
         client = SplunkClient()
         client._baseUrl = ''
-        client._creds = ''
-        client._verify = False
+        client._session = MagicMock()
+        client._session.get.return_value = r
         result = client.listSearches(app='test')
-        assert result == ['test']
+        assert list(result) == ['test']
+        assert ('f', 'name') in client._session.get.call_args[1]['params']
+
+    @patch.object(splunkClient.SplunkClient, '__init__')
+    def test_getSearchIndex(self, mk_init):
+        mk_init.return_value = None
+        r = self.SplunkResponse
+        r.status_code = 200
+
+        client = SplunkClient()
+        client._baseUrl = ''
+        client._session = MagicMock()
+        client._session.get.return_value = r
+        result = client.getSearchIndex(app='test')
+
+        assert list(result) == ['test']
+        assert result['test']['content']['search'] == 'index=*'
+        assert client._session.get.call_count == 1
+        assert ('f', 'action.*') in client._session.get.call_args[1]['params']
+
+    @patch.object(splunkClient.SplunkClient, '__init__')
+    def test_listSearchesPaged(self, mk_init):
+        mk_init.return_value = None
+        pages = []
+        for names in (['a', 'b'], ['c', 'd'], ['e']):
+            r = MagicMock()
+            r.status_code = 200
+            r.text = json.dumps({
+                'paging': {'total': 5},
+                'entry': [{'name': name, 'content': {}} for name in names]
+            })
+            pages.append(r)
+
+        client = SplunkClient()
+        client._baseUrl = ''
+        client._session = MagicMock()
+        client._session.get.side_effect = pages
+
+        with patch.object(splunkClient, 'PAGE_SIZE', 2):
+            searches = client.listSearches(app='test')
+            assert next(searches) == 'a'
+            assert client._session.get.call_count == 1
+            assert list(searches) == ['b', 'c', 'd', 'e']
+
+        offsets = [
+            dict(c[1]['params'])['offset'] for c in client._session.get.call_args_list
+        ]
+        assert offsets == [0, 2, 4]
+
+    @patch.object(splunkClient.SplunkClient, '__init__')
+    def test_getInventory(self, mk_init):
+        mk_init.return_value = None
+        r = MagicMock()
+        r.status_code = 200
+        r.text = json.dumps({'entry': [
+            {'name': 'a', 'acl': {'app': 'app1', 'sharing': 'app', 'owner': 'nobody'}},
+            {'name': 'b', 'acl': {'app': 'app2', 'sharing': 'global', 'owner': 'bob'}},
+            {'name': 'c', 'acl': {'app': 'app1', 'sharing': 'user', 'owner': 'admin'}},
+            {'name': 'd', 'acl': {'app': 'app1', 'sharing': 'user', 'owner': 'bob'}},
+            {'name': 'e', 'acl': {'app': 'search', 'sharing': 'app', 'owner': 'nobody'}}
+        ]})
+
+        client = SplunkClient()
+        client._baseUrl = ''
+        client._session = MagicMock()
+        client._session.get.return_value = r
+
+        inventory = client.getInventory(['app1', 'app2', 'app3'])
+
+        assert {app: sorted(index) for app, index in inventory.items()} == {
+            'app1': ['a', 'c'], 'app2': ['b'], 'app3': []
+        }
+        assert client._session.get.call_count == 1
+        assert client._session.get.call_args[0][0] == '/servicesNS/-/-/saved/searches'
+        params = client._session.get.call_args[1]['params']
+        assert [value for key, value in params if key == 'search'] == [
+            'eai:acl.app="app1" OR eai:acl.app="app2" OR eai:acl.app="app3"'
+        ]
+        assert client.getInventory([]) == {}
+        assert client._session.get.call_count == 1
+
+        client.getInventory(['app1'], fields=splunkClient.NAME_FIELDS)
+        params = client._session.get.call_args[1]['params']
+        assert [value for key, value in params if key == 'f'] == ['name']
+
+    @patch.object(splunkClient.SplunkClient, '__init__')
+    def test_getSearch(self, mk_init):
+        mk_init.return_value = None
+        found = MagicMock(status_code=200, text=json.dumps({'entry': [{'name': 'a'}]}))
+        missing = MagicMock(status_code=404)
+        failed = MagicMock(status_code=500, text=json.dumps({
+            'messages': [{'type': 'ERROR', 'text': 'Broken'}]
+        }))
+
+        client = SplunkClient()
+        client._baseUrl = ''
+        client._session = MagicMock()
+        client._session.get.side_effect = [found, missing, failed]
+
+        assert client.getSearch('app', 'a') == {'name': 'a'}
+        assert client._session.get.call_args[0][0] == '/servicesNS/admin/app/saved/searches/a'
+        params = client._session.get.call_args[1]['params']
+        assert [value for key, value in params if key == 'f'] == splunkClient.INDEX_FIELDS
+        assert client.getSearch('app', 'b') is None
+        with self.assertRaises(SplunkGetFailed):
+            client.getSearch('app', 'c')
+
+    @params(
+        ({'entry': [{'name': 'a'}, {'name': 'b'}], 'paging': {'total': 2}}, None),
+        ({'entry': [{'name': 'a'}, {'name': 'b'}], 'paging': {'total': 3}}, 2),
+        ({'entry': [{'name': 'a'}, {'name': 'b'}]}, 2),
+        ({'entry': [{'name': 'a'}]}, None),
+        ({}, None)
+    )
+    @patch.object(splunkClient.SplunkClient, '__init__')
+    def test_nextPage(self, body, expected, mk_init):
+        mk_init.return_value = None
+        client = SplunkClient()
+
+        _, offset = client._nextPage(body, 0, 2)
+        assert offset == expected
+
+    @params(
+        ({'test': {}}, '/servicesNS/admin/test/saved/searches/test?output_mode=json'),
+        ({}, '/servicesNS/admin/test/saved/searches?output_mode=json')
+    )
+    @patch.object(splunkClient.SplunkClient, '__init__')
+    def test_deployWithIndex(self, index, expectedUrl, mk_init):
+        mk_init.return_value = None
+        r = self.SplunkResponse
+        r.status_code = 200
+
+        client = SplunkClient()
+        client._baseUrl = ''
+        client._session = MagicMock()
+        client._session.post.return_value = r
+        client._validateSearch = MagicMock(return_value=(True,''))
+        client._searchExists = MagicMock()
+
+        client.deploySearch(searchName='test', app='test', searchConfig=VALID_SCONFIG, index=index)
+
+        client._searchExists.assert_not_called()
+        assert client._session.post.call_args[0][0] == expectedUrl
 
-    @patch.object(splunkClient, 'requests')
     @patch.object(splunkClient.SplunkClient, '__init__')
-    def test_listSearchesFail(self, mk_init, mk_req):
+    def test_listSearchesFail(self, mk_init):
         mk_init.return_value = None
         r = self.SplunkResponse
         r.status_code = 404
-        splunkClient.requests.get.return_value = r
 
         client = SplunkClient()
         client._baseUrl = ''
-        client._creds = ''
-        client._verify = False
+        client._session = MagicMock()
+        client._session.get.return_value = r
 
         with self.assertRaises(
             (SplunkGetFailed)
         ):
-            client.listSearches(app='test')
+            list(client.listSearches(app='test'))
 
-    @patch.object(splunkClient, 'requests')
     @patch.object(splunkClient.SplunkClient, '__init__')
-    def test_deleteSearchSuccess(self, mk_init, mk_req):
+    def test_deleteSearchSuccess(self, mk_init):
         mk_init.return_value = None
         r = self.SplunkResponse
         r.status_code = 200
-        splunkClient.requests.delete.return_value = r
 
         client = SplunkClient()
         client._baseUrl = ''
-        client._creds = ''
-        client._verify = False
+        client._session = MagicMock()
+        client._session.delete.return_value = r
         result = client.deleteSearch(app='test', searchName='test')
         assert result == None
 
-    @patch.object(splunkClient, 'requests')
     @patch.object(splunkClient.SplunkClient, '__init__')
-    def test_deleteSearchFail(self, mk_init, mk_req):
+    def test_deleteSearchFail(self, mk_init):
         mk_init.return_value = None
         r = self.SplunkResponse
         r.status_code = 404
-        splunkClient.requests.delete.return_value = r
 
         client = SplunkClient()
         client._baseUrl = ''
-        client._creds = ''
-        client._verify = False
+        client._session = MagicMock()
+        client._session.delete.return_value = r
         with self.assertRaises(
             (SplunkUpdateFailed)
         ):
@@ -0,0 +1,160 @@
+import os
+import stateStore
+import tempfile
+import unittest
+
+from stateStore import DeployState, LocalStateStore, S3StateStore
+from stateStore import fingerprint, getStateStore
+
+from unittest.mock import MagicMock, patch
+
+from nose2.tools import params
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def test_fingerprintStable(self):
+        assert fingerprint({'a': 1, 'b': [1, 2]}) == fingerprint({'b': [1, 2], 'a': 1})
+
+    def test_fingerprintDiffers(self):
+        assert fingerprint({'a': 1}) != fingerprint({'a': 2})
+
+
+class TestStores(unittest.TestCase):
+
+    def test_localStore(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = LocalStateStore(os.path.join(tmp, 'state.json'))
+
+            assert store.load() == {}
+            store.save({'version': 1})
+            assert store.load() == {'version': 1}
+
+    @patch('boto3.client')
+    def test_s3Store(self, mk_boto):
+        client = mk_boto.return_value
+        client.get_object.return_value = {'Body': MagicMock(read=MagicMock(return_value=b'{"version": 1}'))}
+        store = S3StateStore(bucket='bucket', key='state.json')
+
+        assert store.load() == {'version': 1}
+        store.save({'version': 1})
+        client.put_object.assert_called_once_with(
+            Bucket='bucket', Key='state.json', Body=b'{"version": 1}'
+        )
+
+    @patch('boto3.client')
+    def test_s3StoreMissing(self, mk_boto):
+        client = mk_boto.return_value
+        client.exceptions.NoSuchKey = KeyError
+        client.get_object.side_effect = KeyError
+        store = S3StateStore(bucket='bucket', key='state.json')
+
+        assert store.load() == {}
+
+    @params(
+        ({}, type(None)),
+        ({'state': {'backend': 'local', 'path': 'state.json'}}, LocalStateStore),
+        ({'state': {'backend': 's3', 'bucket': 'b', 'key': 'k'}}, S3StateStore)
+    )
+    @patch('boto3.client')
+    def test_getStateStore(self, general, expected, mk_boto):
+        assert type(getStateStore({'general': general})) == expected
+
+    def test_getStateStoreSection(self):
+        config = {'general': {
+            'state': {'backend': 'local', 'path': 'state.json'},
+            'checkpoint': {'backend': 'local', 'path': 'checkpoint.json'}
+        }}
+
+        assert getStateStore(config, 'checkpoint')._path == 'checkpoint.json'
+
+
+class TestDeployState(unittest.TestCase):
+
+    def test_unchanged(self):
+        state = DeployState()
+        state.record('app', 'search', 'abc', '2021-01-01')
+
+        assert state.isUnchanged('app', 'search', 'abc', {'updated': '2021-01-01'})
+        assert not state.isUnchanged('app', 'search', 'def', {'updated': '2021-01-01'})
+        assert not state.isUnchanged('app', 'search', 'abc', {'updated': '2021-01-02'})
+        assert not state.isUnchanged('app', 'search', 'abc', None)
+        assert not state.isUnchanged('app', 'other', 'abc', {'updated': '2021-01-01'})
+
+    def test_isEmpty(self):
+        state = DeployState()
+        assert state.isEmpty()
+
+        state.record('app', 'search', 'abc')
+        assert not state.isEmpty()
+
+    @params(
+        '1970-01-01T00:00:00+00:00',
+        '1969-12-31T16:00:00-08:00',
+        'yesterday',
+        ''
+    )
+    def test_unchangedUntrustedTimestamp(self, updated):
+        state = DeployState()
+        state.record('app', 'search', 'abc', updated)
+
+        # A search edited in the UI could still report the same timestamp.
+        assert not state.isUnchanged('app', 'search', 'abc', {'updated': updated})
+
+    @params(
+        ('2021-01-01T12:00:00+00:00', True),
+        ('2021-01-01T12:00:00Z', True),
+        ('1970-01-01T00:00:00Z', False),
+        ('not a date', False),
+        (None, False)
+    )
+    def test_knownUpdate(self, updated, expected):
+        assert stateStore.knownUpdate(updated) == expected
+
+    def test_hasChanged(self):
+        state = DeployState()
+        state.record('app', 'search', 'abc')
+
+        assert not state.hasChanged('app', 'search', 'abc')
+        assert state.hasChanged('app', 'search', 'def')
+        assert state.hasChanged('app', 'other', 'abc')
+
+    def test_exportMerge(self):
+        state = DeployState()
+        state.record('app', 'one', 'abc', '2021-01-01')
+        state.record('app', 'two', 'def')
+        other = DeployState()
+
+        other.merge(state.export([('app', 'one'), ('app', 'missing')]))
+
+        assert other.isUnchanged('app', 'one', 'abc', {'updated': '2021-01-01'})
+        assert other.hasChanged('app', 'two', 'def')
+
+    def test_unchangedUnknownTimestamp(self):
+        state = DeployState()
+        state.record('app', 'search', 'abc')
+
+        assert not state.isUnchanged('app', 'search', 'abc', {'updated': None})
+
+    def test_saveAndLoad(self):
+        store = MagicMock()
+        store.load.return_value = {}
+        state = DeployState(store)
+        state.record('app', 'search', 'abc', '2021-01-01')
+        state.record('app', 'removed', 'abc', '2021-01-01')
+        state.save([('app', 'search')])
+
+        saved = store.save.call_args[0][0]
+        assert list(saved['searches']) == ['app/search']
+
+        store.load.return_value = saved
+        assert DeployState(store).isUnchanged('app', 'search', 'abc', {'updated': '2021-01-01'})
+
+    def test_loadOtherVersion(self):
+        store = MagicMock()
+        store.load.return_value = {
+            'version': -1,
+            'searches': {'app/search': {'source': 'abc', 'updated': '2021-01-01'}}
+        }
+
+        assert not DeployState(store).isUnchanged('app', 'search', 'abc', {'updated': '2021-01-01'})
@@ -0,0 +1,199 @@
+import asyncio
+import threading
+import time
+import throttle
+import unittest
+
+from email.utils import formatdate
+
+from throttle import AdaptiveLimiter, AimdLimit, AsyncAdaptiveLimiter
+from throttle import RetryPolicy
+
+from unittest.mock import patch
+
+from nose2.tools import params
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    @params(
+        (503, 0, True),
+        (429, 3, True),
+        (502, 4, False),
+        (404, 0, False),
+        (200, 0, False)
+    )
+    def test_shouldRetry(self, status, attempt, expected):
+        assert RetryPolicy(retries=4).shouldRetry(status, attempt) == expected
+
+    @params(
+        (503, True),
+        (429, True),
+        (502, False),
+        (504, False)
+    )
+    def test_shouldRetryNotIdempotent(self, status, expected):
+        assert RetryPolicy(retries=4).shouldRetry(status, 0, False) == expected
+
+    def test_noRetries(self):
+        self.assertFalse(RetryPolicy(retries=0).shouldRetry(503, 0))
+
+    @params((0, 0.5), (1, 1.0), (3, 4.0), (10, 30))
+    @patch.object(throttle, 'random')
+    def test_delayBackoff(self, attempt, ceiling, mk_random):
+        mk_random.uniform.side_effect = lambda low, high: high
+
+        assert RetryPolicy().delay(attempt) == ceiling
+        assert mk_random.uniform.call_args[0][0] == 0
+
+    def test_delayJitter(self):
+        delays = set(RetryPolicy(backoff=1).delay(2) for _ in range(20))
+
+        assert len(delays) > 1
+        assert all(0 <= delay <= 4 for delay in delays)
+
+    @params(('7', 7), ('120', 30), ('-1', 0))
+    def test_delayRetryAfter(self, retryAfter, expected):
+        assert RetryPolicy().delay(0, retryAfter) == expected
+
+    def test_delayRetryAfterDate(self):
+        retryAfter = formatdate(time.time() + 10, usegmt=True)
+
+        assert 8 < RetryPolicy().delay(0, retryAfter) <= 10
+
+    @patch.object(throttle, 'random')
+    def test_delayRetryAfterInvalid(self, mk_random):
+        mk_random.uniform.return_value = 0.25
+
+        assert RetryPolicy().delay(0, 'soon') == 0.25
+
+
+class TestAimdLimit(unittest.TestCase):
+
+    def test_decrease(self):
+        limit = AimdLimit(8)
+
+        for expected in (4, 2, 1, 1):
+            limit._record(503, True)
+            assert limit.limit == expected
+
+        assert limit.stats() == {'retries': 4, 'throttled': 4}
+
+    def test_decreaseOncePerWindow(self):
+        limit = AimdLimit(8)
+        window = [limit._start() for _ in range(8)]
+
+        for sent in window:
+            limit._record(503, False, sent)
+        assert limit.limit == 4
+
+        # Requests sent after the decrease may halve it again.
+        limit._record(503, False, limit._start())
+        assert limit.limit == 2
+        assert limit.stats() == {'retries': 0, 'throttled': 9}
+
+    def test_increase(self):
+        limit = AimdLimit(8)
+        limit._record(429, True)
+
+        # Grows by about one for each window of successful requests.
+        for _ in range(4):
+            limit._record(200, False)
+        assert limit.limit == 4
+        limit._record(200, False)
+        assert limit.limit == 5
+
+        for _ in range(100):
+            limit._record(201, False)
+        assert limit.limit == 8
+
+    def test_serverError(self):
+        limit = AimdLimit(8)
+        limit._record(429, False)
+        limit._record(500, False)
+
+        assert limit.limit == 4
+        assert limit.stats() == {'retries': 0, 'throttled': 1}
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+
+    def test_boundsInFlight(self):
+        limiter = AdaptiveLimiter(2)
+        limiter.record(503)
+        lock = threading.Lock()
+        inFlight = []
+        peak = []
+
+        def request():
+            with limiter:
+                with lock:
+                    inFlight.append(1)
+                    peak.append(len(inFlight))
+                time.sleep(0.01)
+                with lock:
+                    inFlight.pop()
+
+        threads = [threading.Thread(target=request) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert max(peak) == 1
+
+    def test_burstThrottled(self):
+        limiter = AdaptiveLimiter(8)
+        sending = threading.Barrier(8)
+
+        def request():
+            with limiter as sent:
+                sending.wait()
+            limiter.record(503, True, sent)
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert limiter.limit == 4
+        assert limiter.stats() == {'retries': 8, 'throttled': 8}
+
+
+class TestAsyncAdaptiveLimiter(unittest.IsolatedAsyncioTestCase):
+
+    async def test_boundsInFlight(self):
+        limiter = AsyncAdaptiveLimiter(4)
+        await limiter.record(429, True)
+        inFlight = []
+        peak = []
+
+        async def request():
+            async with limiter:
+                inFlight.append(1)
+                peak.append(len(inFlight))
+                await asyncio.sleep(0.01)
+                inFlight.pop()
+
+        await asyncio.gather(*[request() for _ in range(8)])
+
+        assert max(peak) == 2
+        assert limiter.stats() == {'retries': 1, 'throttled': 1}
+
+    async def test_burstThrottled(self):
+        limiter = AsyncAdaptiveLimiter(8)
+        sending = asyncio.Event()
+
+        async def request():
+            async with limiter as sent:
+                await sending.wait()
+            await limiter.record(503, True, sent)
+
+        requests = [asyncio.create_task(request()) for _ in range(8)]
+        await asyncio.sleep(0.01)
+        sending.set()
+        await asyncio.gather(*requests)
+
+        assert limiter.limit == 4
+        assert limiter.stats() == {'retries': 8, 'throttled': 8}
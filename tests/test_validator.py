@@ -91,3 +91,17 @@ class TestValidator(unittest.TestCase):
             (ConfigValidateFailed)
         ):
             self.validator.validateConfig(BAD_CONFIG,'src/schemas/sad-config.json')
+
+    def test_validatorCached(self):
+        first = self.validator.getValidator(self.validator.SEARCH_SCHEMA, purge_unknown=True)
+        self.validator.getValidSearch(TEST_SEARCH)
+        self.validator.getValidSearch(TEST_SEARCH)
+        second = self.validator.getValidator(self.validator.SEARCH_SCHEMA, purge_unknown=True)
+
+        assert first is second
+
+    def test_validatorReuseIndependentDocs(self):
+        first = self.validator.getValidSearch(TEST_SEARCH)
+        second = self.validator.getValidSearch(TEST_SEARCH)
+
+        assert first['Test Search'] is not second['Test Search']